@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User, UserProfile
+from .models import User, UserProfile, OutgoingEmail
 from django.contrib.auth.admin import UserAdmin
 # Register your models here.
 
@@ -24,4 +24,15 @@ class CustomUserAdmin(UserAdmin):
     fieldsets = ()
 
 admin.site.register(User, CustomUserAdmin)
-admin.site.register(UserProfile)
\ No newline at end of file
+admin.site.register(UserProfile)
+
+
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    """
+    Shows the email outbox, so failed notifications can be inspected.
+    """
+    list_display = ('subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    readonly_fields = ('created_at', 'sent_at')
+
+admin.site.register(OutgoingEmail, OutgoingEmailAdmin)
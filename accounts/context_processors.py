@@ -1,24 +1,35 @@
 # from urllib.parse import uses_relative
-from accounts.models import UserProfile
+from accounts.models import User, UserProfile
 from vendor.models import Vendor
 from django.conf import settings
+from takeawaysite.lazy_context import lazy_context
+
+# The vendor and the user profile are only queried when a template reads them.
 
 def get_vendor(request):
-    try:
-        vendor = Vendor.objects.get(user=request.user)
-    except:
-        vendor = None
-    return dict(vendor=vendor)
+    if not request.user.is_authenticated or request.user.role != User.VENDOR:
+        return dict(vendor=None)
+
+    def load_vendor():
+        try:
+            return Vendor.objects.get(user=request.user)
+        except Vendor.DoesNotExist:
+            return None
+    return dict(vendor=lazy_context(request, 'vendor', load_vendor))
 
 def get_user_profile(request):
-    try:
-        user_profile = UserProfile.objects.get(user=request.user)
-    except:
-        user_profile = None
-    return dict(user_profile=user_profile)
+    if not request.user.is_authenticated:
+        return dict(user_profile=None)
+
+    def load_user_profile():
+        try:
+            return UserProfile.objects.get(user=request.user)
+        except UserProfile.DoesNotExist:
+            return None
+    return dict(user_profile=lazy_context(request, 'user_profile', load_user_profile))
 
 def get_google_api(request):
     return {'GOOGLE_API_KEY': settings.GOOGLE_API_KEY}
 
 def get_paypal_client_id(request):
-    return {'PAYPAL_CLIENT_ID': settings.PAYPAL_CLIENT_ID}
\ No newline at end of file
+    return {'PAYPAL_CLIENT_ID': settings.PAYPAL_CLIENT_ID}
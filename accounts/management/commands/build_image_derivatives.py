@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from takeawaysite.images import build_queued_derivatives
+
+
+class Command(BaseCommand):
+    help = 'Builds the resized WebP/JPEG copies of the newly uploaded images queued by the uploads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=20, help='Maximum number of images taken off the queue at once.')
+        parser.add_argument('--loop', action='store_true', help='Keep draining the queue instead of exiting when it is empty.')
+        parser.add_argument('--interval', type=float, default=2, help='Seconds to sleep between polls in --loop mode.')
+
+    def handle(self, *args, **options):
+        while True:
+            done, failed = build_queued_derivatives(options['batch_size'])
+            if done or failed:
+                self.stdout.write(f'Built the derivatives of {done} images, {failed} were not readable images.')
+            if done + failed == options['batch_size']:
+                # a full batch, there may be more queued images
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
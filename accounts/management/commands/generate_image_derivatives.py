@@ -0,0 +1,58 @@
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from accounts.models import UserProfile
+from menu.models import FoodItem
+from takeawaysite.images import delete_derivatives, derivative_names, derivatives_built, derivatives_for_name
+
+# (model, image field, derivatives field)
+IMAGE_FIELDS = (
+    (FoodItem, 'image', 'image_derivatives'),
+    (UserProfile, 'profile_picture', 'profile_picture_derivatives'),
+    (UserProfile, 'cover_photo', 'cover_photo_derivatives'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Builds the resized WebP/JPEG copies of the uploaded food, profile and cover images in a process pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Number of worker processes.')
+        parser.add_argument('--force', action='store_true', help='Rebuild the derivatives of images that already have them.')
+
+    def handle(self, *args, **options):
+        # image name -> [(model, pk, derivatives field, old derivatives)]
+        pending = defaultdict(list)
+        for model, field_name, derivatives_field in IMAGE_FIELDS:
+            rows = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+            for pk, name, derivatives in rows.values_list('pk', field_name, derivatives_field).iterator():
+                if options['force'] or (derivatives or {}).get('source') != name:
+                    pending[name].append((model, pk, derivatives_field, derivatives))
+
+        if not pending:
+            self.stdout.write('All images have their derivatives.')
+            return
+
+        # the workers only read and write media files, the database is updated from here
+        connections.close_all()
+        built = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as executor:
+            futures = [executor.submit(derivatives_for_name, name) for name in pending]
+            for future in as_completed(futures):
+                name, derivatives, error = future.result()
+                if error:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+                    continue
+                for model, pk, derivatives_field, old in pending[name]:
+                    delete_derivatives(old, keep=derivative_names(derivatives))
+                    model.objects.filter(pk=pk).update(**{derivatives_field: derivatives})
+                    derivatives_built.send(sender=model, pk=pk)
+                built += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Built the derivatives of {built} images, {failed} failed.'))
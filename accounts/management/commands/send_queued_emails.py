@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.outbox import deliver_queued_emails, MAX_ATTEMPTS
+
+
+class Command(BaseCommand):
+    help = 'Sends the queued emails of the outbox over one SMTP connection per batch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Maximum number of emails sent per connection.')
+        parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS, help='Attempts after which an email is marked as failed.')
+        parser.add_argument('--loop', action='store_true', help='Keep draining the outbox instead of exiting when it is empty.')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to sleep between polls in --loop mode.')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = deliver_queued_emails(options['batch_size'], options['max_attempts'])
+            if sent or failed:
+                self.stdout.write(f'Sent {sent} emails, {failed} failed.')
+            if sent + failed == options['batch_size']:
+                # a full batch, there may be more due emails
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
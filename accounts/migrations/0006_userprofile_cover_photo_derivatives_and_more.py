@@ -0,0 +1,23 @@
+# Generated by Django 5.0.3 on 2026-10-16 22:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_outgoingemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='cover_photo_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='profile_picture_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.3 on 2026-10-16 23:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_userprofile_cover_photo_derivatives_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageDerivativeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100)),
+                ('object_id', models.BigIntegerField()),
+                ('field_name', models.CharField(max_length=50)),
+                ('derivatives_field', models.CharField(max_length=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('model', 'object_id', 'field_name')},
+            },
+        ),
+    ]
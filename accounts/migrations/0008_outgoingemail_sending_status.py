@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-16 23:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_imagederivativejob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='outgoingemail',
+            name='status',
+            field=models.CharField(choices=[('Pending', 'Pending'), ('Sending', 'Sending'), ('Sent', 'Sent'), ('Failed', 'Failed')], default='Pending', max_length=10),
+        ),
+    ]
@@ -0,0 +1,80 @@
+"""
+Model mixins.
+"""
+import copy
+
+
+class FieldTrackerMixin:
+    """
+    Model mixin that remembers the values of some fields as they were loaded from
+    the database, so save() and the signal receivers can tell what changed without
+    reading the row again.
+
+    The values of tracked_fields are snapshotted when an instance is loaded and
+    after every save(). The post_save receivers run before the new snapshot is
+    taken, so has_changed() still compares with the previous values there.
+
+    Attributes:
+        tracked_fields (tuple): The names of the tracked fields.
+    """
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_tracked_fields()
+        return instance
+
+    def _snapshot_tracked_fields(self, names=None):
+        snapshot = self.__dict__.get('_tracked_initial', {}) if names is not None else {}
+        for name in self.tracked_fields:
+            if names is not None and name not in names:
+                continue
+            attname = self._meta.get_field(name).attname
+            # deferred fields are not in __dict__ and are not snapshotted
+            if attname in self.__dict__:
+                snapshot[name] = copy.deepcopy(self.__dict__[attname])
+        self._tracked_initial = snapshot
+
+    def initial_value(self, name):
+        """
+        Returns the value a tracked field had when the instance was loaded or last saved.
+
+        The row is only read when the field was deferred or the instance was not
+        loaded from the database.
+
+        Args:
+            name (str): The name of the tracked field.
+        """
+        snapshot = self.__dict__.get('_tracked_initial', {})
+        if name in snapshot:
+            return snapshot[name]
+        if self.pk is None:
+            return None
+        attname = self._meta.get_field(name).attname
+        return type(self)._base_manager.using(self._state.db).filter(pk=self.pk).values_list(attname, flat=True).first()
+
+    def has_changed(self, name):
+        """
+        Checks whether a tracked field has changed since the instance was loaded or last saved.
+        A field of an unsaved instance always counts as changed.
+
+        Args:
+            name (str): The name of the tracked field.
+        """
+        if self.pk is None:
+            return True
+        attname = self._meta.get_field(name).attname
+        return getattr(self, attname) != self.initial_value(name)
+
+    def changed_fields(self):
+        """
+        Returns the names of the tracked fields that have changed.
+        """
+        return [name for name in self.tracked_fields if self.has_changed(name)]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # with update_fields, the other fields still differ from the row
+        update_fields = kwargs.get('update_fields')
+        self._snapshot_tracked_fields(None if update_fields is None else set(update_fields))
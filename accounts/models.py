@@ -1,11 +1,14 @@
 import re
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
 from django.db.models.fields.related import OneToOneField
 
 from django.contrib.gis.db import models as gismodels
 from django.contrib.gis.geos import Point
 
+from .mixins import FieldTrackerMixin
+
 # Base User Manager will allow to edit the way how the users and super users are created.
 class UserManager(BaseUserManager):
     """
@@ -202,7 +205,7 @@ class User(AbstractBaseUser):
         return user_role
     
 
-class UserProfile(models.Model):
+class UserProfile(FieldTrackerMixin, models.Model):
     """
     User profile model.
 
@@ -213,6 +216,8 @@ class UserProfile(models.Model):
     user (OneToOneField): A one-to-one relationship with the User model.
     profile_picture (ImageField): The profile picture of the user.
     cover_photo (ImageField): The cover photo of the user.
+    profile_picture_derivatives (JSONField): The resized copies of the profile picture (see takeawaysite.images).
+    cover_photo_derivatives (JSONField): The resized copies of the cover photo.
     address (str): The address of the user.
     country (str): The country of the user.
     state (str): The state of the user.
@@ -227,12 +232,19 @@ class UserProfile(models.Model):
     Methods:
     __str__(): Returns the string representation of the user profile, which is the user's email.
     save(*args, **kwargs): Saves the user profile, setting the location point if latitude and longitude are provided.
+
+    The loaded location is remembered (see accounts.mixins.FieldTrackerMixin), so the
+    receivers copying it to the vendor only run when it has changed.
     """
+    tracked_fields = ('location',)
+
     # one user can have only one user profile - if we want many profiles (use ForeignKey)
     # on_delete option means when the user is deleted his profile also should be deleted
     user = OneToOneField(User, on_delete=models.CASCADE, blank=True, null=True)
     profile_picture = models.ImageField(upload_to='users/profile_pictures', blank=True, null=True)
     cover_photo = models.ImageField(upload_to='users/cover_photos', blank=True, null=True)
+    profile_picture_derivatives = models.JSONField(default=dict, blank=True, editable=False)
+    cover_photo_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     address = models.CharField(max_length=250, blank=True, null=True)
     country = models.CharField(max_length=15, blank=True, null=True)
     state = models.CharField(max_length=15, blank=True, null=True)
@@ -262,6 +274,97 @@ class UserProfile(models.Model):
         **kwargs: Arbitrary keyword arguments.
         """
         if self.latitude and self.longitude:
-            self.location = Point(float(self.longitude), float(self.latitude))
+            self.location = Point(float(self.longitude), float(self.latitude), srid=4326)
             return super(UserProfile, self).save(*args, **kwargs)
         return super(UserProfile, self).save(*args, **kwargs)
+
+
+class OutgoingEmail(models.Model):
+    """
+    Email outbox model.
+
+    Notification emails are rendered inside the request and stored here (in the same
+    transaction as the data they describe) instead of being sent over SMTP right away.
+    The send_queued_emails management command drains the outbox over one SMTP connection,
+    retrying failed messages with an exponential backoff (see accounts.outbox).
+
+    Attributes:
+    subject (str): The subject of the email.
+    body (str): The rendered body of the email.
+    from_email (str): The sender address.
+    to (list): The recipient addresses.
+    content_subtype (str): The content subtype of the body ('html' or 'plain').
+    status (str): Pending, Sending (claimed by a worker), Sent or Failed.
+    attempts (int): How many times sending was attempted.
+    last_error (str): The error of the last failed attempt.
+    next_attempt_at (datetime): The earliest time of the next attempt. While the email
+        is Sending, the end of the worker's lease, after which another worker takes it over.
+    created_at (datetime): The date and time when the email was queued.
+    sent_at (datetime): The date and time when the email was sent.
+    """
+    PENDING = 'Pending'
+    SENDING = 'Sending'
+    SENT = 'Sent'
+    FAILED = 'Failed'
+
+    STATUS = (
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    )
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField(default=list)
+    content_subtype = models.CharField(max_length=20, default='html')
+    status = models.CharField(max_length=10, choices=STATUS, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        """
+        Return the string representation of the email, which is its subject.
+        """
+        return self.subject
+
+
+class ImageDerivativeJob(models.Model):
+    """
+    Queue of the images whose resized copies have to be (re)built.
+
+    Saving a model with a new image queues a job in the same transaction (see
+    takeawaysite.images.queue_derivatives), and the build_image_derivatives management
+    command builds the derivatives outside of the request. Until then the templates
+    show the original image.
+
+    Attributes:
+    model (str): The label of the model, e.g. 'menu.fooditem'.
+    object_id (int): The primary key of the instance.
+    field_name (str): The name of the image field.
+    derivatives_field (str): The name of the JSON field holding the derivatives.
+    created_at (datetime): The date and time when the job was queued.
+    """
+    model = models.CharField(max_length=100)
+    object_id = models.BigIntegerField()
+    field_name = models.CharField(max_length=50)
+    derivatives_field = models.CharField(max_length=50)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('model', 'object_id', 'field_name')
+
+    def __str__(self):
+        """
+        Return the string representation of the job: the model, the instance and the field.
+        """
+        return f'{self.model} {self.object_id} {self.field_name}'
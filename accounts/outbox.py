@@ -0,0 +1,158 @@
+"""
+Email outbox.
+
+queue_email() stores a rendered email in the OutgoingEmail table. Because it is a
+plain insert, an email queued inside transaction.atomic() is only delivered if the
+transaction commits. deliver_queued_emails() (run by the send_queued_emails
+management command) sends the due emails over a single connection of the
+configured EMAIL_BACKEND and reschedules failures with an exponential backoff.
+
+A worker claims its batch in a short transaction, marking the emails as Sending
+for LEASE_DURATION, and sends them outside of any transaction, so a slow mail
+server holds no locks. Each result is written right after its email is sent. If
+the worker dies before that, the email is taken over by another worker once the
+lease has expired.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+# Delay before the first retry, doubled after every failed attempt.
+RETRY_BASE_DELAY = timedelta(minutes=1)
+MAX_ATTEMPTS = 5
+# How long a claimed batch belongs to its worker, longer than sending a batch takes.
+LEASE_DURATION = timedelta(minutes=10)
+
+
+def queue_email(mail_subject, message, to_email, from_email=None, content_subtype='html'):
+    """
+    Adds an email to the outbox.
+
+    Args:
+        mail_subject (str): The subject of the email.
+        message (str): The rendered body.
+        to_email (str or list): The recipient address(es).
+        from_email (str, optional): The sender. Defaults to DEFAULT_FROM_EMAIL.
+        content_subtype (str): The content subtype of the body.
+
+    Returns:
+        OutgoingEmail: The queued email.
+    """
+    if isinstance(to_email, str):
+        to_email = [to_email]
+    return OutgoingEmail.objects.create(
+        subject=mail_subject,
+        body=message,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(to_email),
+        content_subtype=content_subtype,
+    )
+
+
+def build_message(email, connection=None):
+    """
+    Builds the EmailMessage of a queued email.
+    """
+    mail = EmailMessage(email.subject, email.body, email.from_email, to=email.to, connection=connection)
+    mail.content_subtype = email.content_subtype
+    return mail
+
+
+def claim_due_emails(batch_size=50, max_attempts=MAX_ATTEMPTS, now=None):
+    """
+    Claims a batch of due emails for this worker.
+
+    The due emails are locked with SELECT ... FOR UPDATE SKIP LOCKED (where supported),
+    so concurrent workers claim different emails, and marked as Sending until the end
+    of the lease. Emails whose lease has expired (their worker died) are claimed again.
+
+    Args:
+        batch_size (int): The maximum number of emails claimed.
+        max_attempts (int): Emails of expired leases with this many attempts are not taken over.
+        now (datetime, optional): The current time.
+
+    Returns:
+        list: The claimed OutgoingEmail instances, with their attempt counted.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=OutgoingEmail.PENDING) | Q(status=OutgoingEmail.SENDING, attempts__lt=max_attempts),
+                next_attempt_at__lte=now,
+            )
+            .order_by('next_attempt_at', 'pk')[:batch_size]
+        )
+        for email in batch:
+            email.status = OutgoingEmail.SENDING
+            email.attempts += 1
+            email.next_attempt_at = now + LEASE_DURATION
+        OutgoingEmail.objects.bulk_update(batch, ['status', 'attempts', 'next_attempt_at'])
+    return batch
+
+
+def _record_sent(email):
+    email.status = OutgoingEmail.SENT
+    email.sent_at = timezone.now()
+    email.save(update_fields=['status', 'sent_at'])
+
+
+def _record_failure(email, error, now, max_attempts):
+    email.last_error = str(error)
+    if email.attempts >= max_attempts:
+        email.status = OutgoingEmail.FAILED
+    else:
+        email.status = OutgoingEmail.PENDING
+        email.next_attempt_at = now + RETRY_BASE_DELAY * 2 ** (email.attempts - 1)
+    email.save(update_fields=['status', 'last_error', 'next_attempt_at'])
+
+
+def deliver_queued_emails(batch_size=50, max_attempts=MAX_ATTEMPTS):
+    """
+    Sends one batch of due emails over a single connection.
+
+    The batch is claimed first (see claim_due_emails()), so several workers can drain
+    the outbox at the same time without sending an email twice.
+
+    Args:
+        batch_size (int): The maximum number of emails sent.
+        max_attempts (int): Attempts after which an email is marked as failed.
+
+    Returns:
+        tuple: The number of sent and of failed (rescheduled or given up) emails.
+    """
+    now = timezone.now()
+    batch = claim_due_emails(batch_size, max_attempts, now)
+    if not batch:
+        return 0, 0
+
+    sent = failed = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        # the server is not reachable, every email of the batch is retried later
+        for email in batch:
+            _record_failure(email, e, now, max_attempts)
+        return sent, len(batch)
+
+    try:
+        for email in batch:
+            try:
+                connection.send_messages([build_message(email, connection)])
+            except Exception as e:
+                _record_failure(email, e, now, max_attempts)
+                failed += 1
+            else:
+                _record_sent(email)
+                sent += 1
+    finally:
+        connection.close()
+    return sent, failed
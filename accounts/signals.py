@@ -1,5 +1,6 @@
 from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
+from takeawaysite.images import queue_derivatives
 from .models import User, UserProfile
 
 @receiver(post_save, sender=User)
@@ -16,28 +17,20 @@ def post_save_create_profile_receiver(sender, instance, created, **kwargs):
 
     Side Effects:
         - If a new User instance is created, a corresponding UserProfile instance is also created.
-        - If an existing User instance is saved, it attempts to save the associated UserProfile instance.
-        - If the UserProfile instance does not exist during update, it creates a new UserProfile instance.
+        - If an existing User instance is fully saved, the UserProfile instance is created if it does not exist.
+        - Saves of some fields only (update_fields, e.g. the last_login of a login) are skipped,
+          as the profile does not depend on any field of the user.
 
     Example:
         When a new user is registered:
         >>> user = User.objects.create(...)
         >>> # The above action triggers this signal and creates a UserProfile instance.
-
-        When an existing user is updated:
-        >>> user.save()
-        >>> # The above action triggers this signal and attempts to save the associated UserProfile.
     """
-    print(created)
     if created:
         UserProfile.objects.create(user=instance)
-    else:
-        try:
-            profile = UserProfile.objects.get(user=instance)
-            profile.save()
-        except UserProfile.DoesNotExist:
-            # Create the user profile if it does not exist
-            UserProfile.objects.create(user=instance)
+    elif kwargs.get('update_fields') is None:
+        # users created before the profiles were introduced
+        UserProfile.objects.get_or_create(user=instance)
 
 
 @receiver(pre_save, sender=User)
@@ -61,4 +54,19 @@ def pre_save_profile_receiver(sender, instance, **kwargs):
     """
     pass
 
-# post_save.connect(post_save_create_profile_receiver, sender=User)
\ No newline at end of file
+# post_save.connect(post_save_create_profile_receiver, sender=User)
+
+
+@receiver(post_save, sender=UserProfile)
+def profile_images_receiver(sender, instance, **kwargs):
+    """
+    Signal receiver that queues the building of the resized copies of the profile
+    picture and the cover photo after a new file has been uploaded (see takeawaysite.images).
+
+    Args:
+        sender (Model class): The model class that sent the signal (UserProfile in this case).
+        instance (UserProfile): The instance that was saved.
+        **kwargs: Additional keyword arguments.
+    """
+    queue_derivatives(instance, 'profile_picture', 'profile_picture_derivatives')
+    queue_derivatives(instance, 'cover_photo', 'cover_photo_derivatives')
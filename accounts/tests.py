@@ -1,3 +1,117 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from smtplib import SMTPException
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .models import OutgoingEmail
+from .outbox import LEASE_DURATION, MAX_ATTEMPTS, RETRY_BASE_DELAY, claim_due_emails, deliver_queued_emails, queue_email
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    """
+    Email backend whose server rejects every message.
+    """
+
+    def send_messages(self, email_messages):
+        raise SMTPException('451 Try again later')
+
+
+class OutboxTests(TestCase):
+
+    def test_an_email_is_queued_with_the_transaction(self):
+        with transaction.atomic():
+            queue_email('Order received', '<p>Thanks</p>', 'maria@example.com')
+
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            queue_email('Order cancelled', '<p>Sorry</p>', 'maria@example.com')
+            raise RuntimeError('the order was not saved')
+
+        self.assertEqual(list(OutgoingEmail.objects.values_list('subject', 'to')),
+                         [('Order received', ['maria@example.com'])])
+
+    def test_delivers_the_due_emails(self):
+        queue_email('First', '<p>1</p>', 'maria@example.com')
+        queue_email('Second', '<p>2</p>', ['ivan@example.com', 'elena@example.com'])
+        later = queue_email('Later', '<p>3</p>', 'maria@example.com')
+        OutgoingEmail.objects.filter(pk=later.pk).update(next_attempt_at=timezone.now() + timedelta(hours=1))
+
+        self.assertEqual(deliver_queued_emails(), (2, 0))
+
+        self.assertEqual([message.subject for message in mail.outbox], ['First', 'Second'])
+        self.assertEqual(mail.outbox[1].to, ['ivan@example.com', 'elena@example.com'])
+        self.assertEqual(mail.outbox[0].content_subtype, 'html')
+        self.assertEqual(OutgoingEmail.objects.filter(status=OutgoingEmail.SENT, attempts=1).count(), 2)
+        self.assertEqual(deliver_queued_emails(), (0, 0))
+
+    @override_settings(EMAIL_BACKEND='accounts.tests.FailingEmailBackend')
+    def test_failures_are_retried_with_a_growing_delay_until_max_attempts(self):
+        email = queue_email('Order received', '<p>Thanks</p>', 'maria@example.com')
+        now = timezone.now()
+
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            with mock.patch('accounts.outbox.timezone.now', return_value=now):
+                self.assertEqual(deliver_queued_emails(), (0, 1))
+            email.refresh_from_db()
+            self.assertEqual(email.attempts, attempt)
+            self.assertIn('451', email.last_error)
+            if attempt < MAX_ATTEMPTS:
+                self.assertEqual(email.status, OutgoingEmail.PENDING)
+                self.assertEqual(email.next_attempt_at, now + RETRY_BASE_DELAY * 2 ** (attempt - 1))
+                # not due before the delay has passed
+                self.assertEqual(claim_due_emails(now=email.next_attempt_at - timedelta(seconds=1)), [])
+                now = email.next_attempt_at
+
+        self.assertEqual(email.status, OutgoingEmail.FAILED)
+        self.assertEqual(claim_due_emails(now=now + timedelta(days=1)), [])
+
+    def test_a_claimed_email_is_taken_over_after_its_lease(self):
+        email = queue_email('Order received', '<p>Thanks</p>', 'maria@example.com')
+        now = timezone.now()
+
+        self.assertEqual(claim_due_emails(now=now), [email])
+        # the worker died before sending
+        self.assertEqual(claim_due_emails(now=now + LEASE_DURATION - timedelta(seconds=1)), [])
+        claimed = claim_due_emails(now=now + LEASE_DURATION)
+
+        self.assertEqual(claimed, [email])
+        self.assertEqual(claimed[0].attempts, 2)
+        self.assertEqual(claimed[0].status, OutgoingEmail.SENDING)
+
+
+class OutboxWorkersTests(TransactionTestCase):
+    """
+    Needs committed rows and a second connection, so it cannot run inside a TestCase transaction.
+    """
+
+    def test_a_worker_skips_the_emails_locked_by_another(self):
+        locked = queue_email('Locked', '<p>1</p>', 'maria@example.com')
+        queue_email('Free', '<p>2</p>', 'ivan@example.com')
+        claimed = threading.Event()
+        release = threading.Event()
+
+        def other_worker():
+            try:
+                with transaction.atomic():
+                    list(OutgoingEmail.objects.select_for_update().filter(pk=locked.pk))
+                    claimed.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=other_worker)
+        thread.start()
+        try:
+            self.assertTrue(claimed.wait(10))
+            self.assertEqual(deliver_queued_emails(), (1, 0))
+        finally:
+            release.set()
+            thread.join()
+
+        self.assertEqual([message.subject for message in mail.outbox], ['Free'])
+        self.assertEqual(OutgoingEmail.objects.get(pk=locked.pk).status, OutgoingEmail.PENDING)
@@ -4,8 +4,8 @@ from django.template.loader import render_to_string
 from django.utils.http import urlsafe_base64_encode
 from django.utils.encoding import force_bytes
 from django.contrib.auth.tokens import default_token_generator
-from django.core.mail import EmailMessage
 from django.conf import settings
+from .outbox import queue_email
 
 
 def detectUser(user):
@@ -30,7 +30,7 @@ def detectUser(user):
 
 def send_verification_email(request, user, mail_subject, email_template):
     """
-    Sends a verification email to the specified user.
+    Queues a verification email to the specified user.
 
     Args:
         request: The HTTP request object.
@@ -57,16 +57,17 @@ def send_verification_email(request, user, mail_subject, email_template):
         'token': default_token_generator.make_token(user), # Verification token generated by default_token_generator.
     })
     to_email = user.email
-    # Create the email object with a specified subject, message, sender, and recipient.
-    mail = EmailMessage(mail_subject, message, from_email, to=[to_email])
-    # Set the email content type as HTML.
-    mail.content_subtype = "html"
-    mail.send()
+    # Queue the HTML email with a specified subject, message, sender, and recipient.
+    # It is sent by the send_queued_emails worker, not inside the request.
+    queue_email(mail_subject, message, [to_email], from_email)
 
 
 def send_notification(mail_subject, mail_template, context):
     """
-    Sends a notification email using the specified template and context.
+    Queues a notification email using the specified template and context.
+
+    The email is rendered here and stored in the outbox; the send_queued_emails
+    worker delivers it, so SMTP latency does not add to the request.
 
     Args:
         mail_subject: The subject of the email.
@@ -84,6 +85,4 @@ def send_notification(mail_subject, mail_template, context):
         to_email.append(context['to_email'])
     else:
         to_email = context['to_email']
-    mail = EmailMessage(mail_subject, message, from_email, to=to_email)
-    mail.content_subtype = "html"
-    mail.send()
+    queue_email(mail_subject, message, to_email, from_email)
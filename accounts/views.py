@@ -12,9 +12,11 @@ from django.contrib.auth.tokens import default_token_generator
 # from django.template.defaultfilters import slugify
 from django.utils.text import slugify
 from vendor.models import Vendor
-from orders.models import Order
+from orders.feed import latest_event_id
+from orders.history import customer_orders, paginate_orders, vendor_orders
+from orders.revenue import vendor_revenue
 
-import datetime
+from django.utils import timezone
 
 # Create your views here.
 
@@ -260,8 +262,8 @@ def custDashboard(request):
     Returns:
         HttpResponse: The rendered template for the customer dashboard.
     """
-    orders = Order.objects.filter(user=request.user, is_ordered=True)
-    recent_orders = orders.order_by('-created_at')[:5]
+    orders = customer_orders(request.user)
+    recent_orders = paginate_orders(orders, page_size=5).orders
 
     context = {
         'orders': orders,
@@ -283,26 +285,22 @@ def vendorDashboard(request):
         HttpResponse: The rendered template for the vendor dashboard.
     """
     vendor = Vendor.objects.get(user=request.user)
-    orders = Order.objects.filter(vendors__in=[vendor.id], is_ordered=True).order_by('-created_at')
-    recent_orders = orders[:5]
-
-    # current month's revenue
-    current_month = datetime.datetime.now().month
-    current_month_orders = orders.filter(vendors__in=[vendor.id], created_at__month=current_month)
-    current_month_revenue = 0
-    for i in current_month_orders:
-        current_month_revenue += i.get_total_by_vendor()['grand_total']
-    
+    # the vendor's totals of every order are read from the OrderVendorTotal table
+    orders = vendor_orders(vendor)
+    recent_orders = paginate_orders(orders, page_size=5).orders
+
+    # current month's revenue (read from the daily revenue rollups)
+    first_day_of_month = timezone.localdate().replace(day=1)
+    current_month_revenue = vendor_revenue(vendor, since=first_day_of_month)['revenue']
 
     # total revenue
-    total_revenue = 0
-    for i in orders:
-        total_revenue += i.get_total_by_vendor()['grand_total']
+    total_revenue = vendor_revenue(vendor)['revenue']
 
     context = {
         'orders': orders,
         'orders_count': orders.count(),
         'recent_orders': recent_orders,
+        'last_event_id': latest_event_id(vendor),
         'total_revenue': total_revenue,
         'current_month_revenue': current_month_revenue,
     }
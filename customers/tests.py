@@ -1,3 +1,25 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from django.urls import reverse
+
+from takeawaysite.testing import QueryBudgetTestCase, create_food, create_user, create_vendor, place_paid_order
+
+
+class MyOrdersTests(QueryBudgetTestCase):
+
+    def test_my_orders_stays_within_its_budget(self):
+        pizza = create_food(create_vendor('pizzeria'), 'Margherita', Decimal('9.50'))
+        kebab = create_food(create_vendor('grill'), 'Kebab', Decimal('7.00'))
+        customer = create_user('maria')
+        self.client.force_login(customer)
+        orders = [
+            place_paid_order(self.client, customer, [(pizza, 1), (kebab, 2)], transaction_id=f'PAYID-{number}')
+            for number in range(3)
+        ]
+
+        response = self.client.get(reverse('customer_my_orders'))
+
+        self.assertWithinBudget(response, 'customer_my_orders')
+        for order in orders:
+            self.assertTrue(order.is_ordered)
+            self.assertContains(response, order.order_number)
@@ -6,5 +6,6 @@ urlpatterns = [
     path('', AccountViews.custDashboard, name='customer'),
     path('profile/', views.cprofile, name='cprofile'),
     path('my_orders/', views.my_orders, name='customer_my_orders'),
+    path('my_orders/page/', views.my_orders_page, name='customer_my_orders_page'),
     path('order_detail/<int:order_number>/', views.order_detail, name='order_detail'),
 ]
\ No newline at end of file
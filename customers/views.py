@@ -3,7 +3,11 @@ from django.contrib.auth.decorators import login_required
 from accounts.forms import UserProfileForm, UserInfoForm
 from accounts.models import UserProfile
 from django.contrib import messages
+from django.http import JsonResponse
+from django.template.loader import render_to_string
+from orders.history import customer_orders, order_json, paginate_orders
 from orders.models import Order, OrderedFood
+from takeawaysite.db_router import use_replica
 import simplejson as json
 
 # Create your views here.
@@ -42,20 +46,40 @@ def cprofile(request):
     }
     return render(request, 'customers/cprofile.html', context)
 
+@login_required(login_url='login')
+@use_replica
 def my_orders(request):
     """
-    View for displaying a list of customer orders.
+    View for displaying the first page of the customer's orders, newest first.
+    The next pages are loaded from my_orders_page() while scrolling.
 
     Returns:
         Renders the page with a list of customer orders.
     """
-    orders = Order.objects.filter(user=request.user, is_ordered=True).order_by('-created_at')
+    page = paginate_orders(customer_orders(request.user), request.GET.get('cursor'))
 
     context = {
-        'orders': orders,
+        'orders': page.orders,
+        'next_cursor': page.next_cursor,
     }
     return render(request, 'customers/my_orders.html', context)
 
+@login_required(login_url='login')
+@use_replica
+def my_orders_page(request):
+    """
+    Returns the next page of the customer's orders for the infinite scroll.
+
+    Returns:
+        JsonResponse: The rendered table rows ('html'), the orders and the 'next_cursor'.
+    """
+    page = paginate_orders(customer_orders(request.user), request.GET.get('cursor'))
+    return JsonResponse({
+        'html': render_to_string('includes/customer_order_rows.html', {'orders': page.orders}, request),
+        'orders': [order_json(order, order.total) for order in page.orders],
+        'next_cursor': page.next_cursor,
+    })
+
 def order_detail(request, order_number):
     """
     View for displaying details of a specific customer order.
@@ -20,9 +20,9 @@ class TaxAdmin(admin.ModelAdmin):
     Attributes:
         list_display (tuple): Specifies the fields to display in the list view
                               of the Tax model in the admin interface.
-                              Includes 'tax_type', 'tax_percentage', 'tax_value', and 'is_active'.
+                              Includes 'tax_type', 'tax_percentage', 'tax_value', 'per_vendor' and 'is_active'.
     """
-    list_display = ('tax_type', 'tax_percentage', 'tax_value', 'is_active')
+    list_display = ('tax_type', 'tax_percentage', 'tax_value', 'per_vendor', 'is_active')
 
 
 admin.site.register(Cart, CartAdmin)
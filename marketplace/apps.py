@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class MarketplaceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'marketplace'
+
+    # connect the tax cache, search index and menu cache invalidation signals
+    def ready(self):
+        import marketplace.signals
@@ -0,0 +1,324 @@
+"""
+Load benchmarks of the main views.
+
+Every scenario requests one view repeatedly as a generated customer or vendor
+(see marketplace.scale_data) and records the latency and the number of SQL
+queries of every request. The query count is read from the Server-Timing
+header of the instrumentation middleware (takeawaysite.instrumentation), so it
+works the same through the Django test client and against a running server.
+
+The results can be stored as a baseline JSON file and compared with a later
+run; compare() lists the scenarios that got slower or run more queries.
+"""
+import math
+import re
+import statistics
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from accounts.models import User
+from menu.models import FoodItem
+from orders.models import Order
+from vendor.models import Vendor
+from .models import Cart
+from .scale_data import SCALE_EMAIL_DOMAIN
+
+QUERIES_RE = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+@dataclass
+class BenchmarkContext:
+    """
+    The users and objects the scenarios work with.
+    """
+    customer: User
+    vendor: Vendor
+    cart_food: list
+    keyword: str
+    order_number: str = None
+
+
+@dataclass
+class Scenario:
+    """
+    One benchmarked request.
+
+    Attributes:
+        name (str): The name of the scenario in the results.
+        role (str): 'customer', 'vendor' or None for an anonymous visitor.
+        url (callable): Returns the path for a context.
+        method (str): 'GET' or 'POST'.
+        data (callable, optional): Returns the query or form data for a context.
+        ajax (bool): Whether the request is sent as an XMLHttpRequest.
+        prepare (callable, optional): Called with the context before every request, not timed.
+    """
+    name: str
+    role: str
+    url: object
+    method: str = 'GET'
+    data: object = None
+    ajax: bool = False
+    prepare: object = None
+
+
+def fill_cart(context):
+    """
+    Resets the cart of the benchmark customer to the same few items.
+    """
+    Cart.objects.filter(user=context.customer).delete()
+    Cart.objects.bulk_create([Cart(user=context.customer, fooditem=item, quantity=1) for item in context.cart_food])
+
+
+def order_form(context):
+    profile = context.customer.userprofile
+    return {
+        'first_name': context.customer.first_name,
+        'last_name': context.customer.last_name,
+        'phone': '0888123456',
+        'email': context.customer.email,
+        'address': profile.address or 'ул. Витоша 1',
+        'country': profile.country or 'България',
+        'city': profile.city or 'София',
+        'pin_code': '1000',
+        'payment_method': 'PayPal',
+    }
+
+
+def search_query(context):
+    location = context.vendor.location
+    return {
+        'address': 'София',
+        'lat': location.y if location else '',
+        'lng': location.x if location else '',
+        'radius': 10,
+        'keyword': context.keyword,
+    }
+
+
+def payment_data(context):
+    return {
+        'order_number': context.order_number,
+        'transaction_id': get_random_string(12),
+        'payment_method': 'PayPal',
+        'status': 'COMPLETED',
+    }
+
+
+def default_scenarios(driver):
+    """
+    Returns the benchmarked views.
+
+    Args:
+        driver (TestClientDriver or ServerDriver): Used by the payments scenario to place its orders.
+    """
+    def place_order(context):
+        fill_cart(context)
+        driver.request('customer', 'POST', reverse('place_order'), order_form(context))
+        context.order_number = (
+            Order.objects.filter(user=context.customer, is_ordered=False)
+            .order_by('-pk').values_list('order_number', flat=True).first()
+        )
+
+    return [
+        Scenario('marketplace', None, lambda context: reverse('marketplace')),
+        Scenario('vendor_detail', None, lambda context: reverse('vendor_detail', args=[context.vendor.vendor_slug])),
+        Scenario('search', None, lambda context: reverse('search'), data=search_query),
+        Scenario('checkout', 'customer', lambda context: reverse('checkout'), prepare=fill_cart),
+        Scenario('place_order', 'customer', lambda context: reverse('place_order'), 'POST', order_form, prepare=fill_cart),
+        Scenario('payments', 'customer', lambda context: reverse('payments'), 'POST', payment_data, ajax=True, prepare=place_order),
+        Scenario('vendorDashboard', 'vendor', lambda context: reverse('vendorDashboard')),
+    ]
+
+
+def build_context():
+    """
+    Picks the benchmark users among the generated data: the first generated customer
+    and the approved vendor with the most orders.
+
+    Raises:
+        LookupError: If there is no generated data.
+    """
+    customer = (
+        User.objects.filter(role=User.CUSTOMER, is_active=True, email__endswith=f'@{SCALE_EMAIL_DOMAIN}')
+        .select_related('userprofile').order_by('pk').first()
+    )
+    vendor = (
+        Vendor.objects.filter(is_approved=True, user__is_active=True, user__email__endswith=f'@{SCALE_EMAIL_DOMAIN}')
+        .annotate(orders_count=Count('order')).order_by('-orders_count', 'pk').select_related('user').first()
+    )
+    if customer is None or vendor is None:
+        raise LookupError('No generated data found, run generate_scale_data first.')
+    cart_food = list(FoodItem.objects.filter(vendor=vendor, is_available=True).order_by('pk')[:3])
+    keyword = cart_food[0].food_title.split()[0][:3].lower() if cart_food else ''
+    return BenchmarkContext(customer=customer, vendor=vendor, cart_food=cart_food, keyword=keyword)
+
+
+def parse_queries(server_timing):
+    """
+    Returns the query count of a Server-Timing header, or None.
+    """
+    match = QUERIES_RE.search(server_timing or '')
+    return int(match.group(1)) if match else None
+
+
+class TestClientDriver:
+    """
+    Sends the requests through the Django test client, in this process.
+    """
+
+    def __init__(self, context):
+        self.clients = {None: Client()}
+        for role, user in (('customer', context.customer), ('vendor', context.vendor.user)):
+            self.clients[role] = Client()
+            self.clients[role].force_login(user)
+
+    def request(self, role, method, path, data=None, ajax=False):
+        """
+        Returns the status code and the query count of a request.
+        """
+        headers = {'X-Requested-With': 'XMLHttpRequest'} if ajax else {}
+        client = self.clients[role]
+        response = client.post(path, data, headers=headers) if method == 'POST' else client.get(path, data, headers=headers)
+        return response.status_code, parse_queries(response.get('Server-Timing'))
+
+
+class ServerDriver:
+    """
+    Sends the requests to a running server that uses the same database.
+
+    The sessions are created with the test client and passed as cookies, and the
+    CSRF check is satisfied with a random token sent as cookie and header.
+    """
+
+    def __init__(self, context, base_url):
+        self.base_url = base_url.rstrip('/')
+        csrf_token = get_random_string(32)
+        self.cookies = {None: f'{settings.CSRF_COOKIE_NAME}={csrf_token}'}
+        self.csrf_token = csrf_token
+        for role, user in (('customer', context.customer), ('vendor', context.vendor.user)):
+            client = Client()
+            client.force_login(user)
+            session = client.cookies[settings.SESSION_COOKIE_NAME].value
+            self.cookies[role] = f'{settings.SESSION_COOKIE_NAME}={session}; {self.cookies[None]}'
+
+    def request(self, role, method, path, data=None, ajax=False):
+        url = self.base_url + path
+        body = None
+        if data and method == 'GET':
+            url += '?' + urllib.parse.urlencode(data)
+        elif data:
+            body = urllib.parse.urlencode(data).encode()
+        request = urllib.request.Request(url, data=body, method=method)
+        request.add_header('Cookie', self.cookies[role])
+        request.add_header('X-CSRFToken', self.csrf_token)
+        if ajax:
+            request.add_header('X-Requested-With', 'XMLHttpRequest')
+        opener = urllib.request.build_opener(NoRedirect)
+        try:
+            with opener.open(request) as response:
+                response.read()
+                return response.status, parse_queries(response.headers.get('Server-Timing'))
+        except urllib.error.HTTPError as e:
+            return e.code, parse_queries(e.headers.get('Server-Timing'))
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    # a redirect is a response of the view, like with the test client
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def percentile(values, fraction):
+    """
+    Returns the nearest-rank percentile of a list of numbers.
+    """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+@dataclass
+class ScenarioResult:
+    latencies: list = field(default_factory=list)  # seconds
+    queries: list = field(default_factory=list)
+    errors: int = 0
+
+    def summary(self):
+        total = sum(self.latencies)
+        queries = [q for q in self.queries if q is not None]
+        return {
+            'requests': len(self.latencies),
+            'errors': self.errors,
+            'p50_ms': round(percentile(self.latencies, 0.5) * 1000, 2),
+            'p95_ms': round(percentile(self.latencies, 0.95) * 1000, 2),
+            'mean_ms': round(statistics.mean(self.latencies) * 1000, 2),
+            'queries': round(statistics.mean(queries), 1) if queries else None,
+            'max_queries': max(queries) if queries else None,
+            # sequential requests, so this is the throughput of one worker
+            'throughput_rps': round(len(self.latencies) / total, 1) if total else None,
+        }
+
+
+def run_scenario(driver, scenario, context, iterations, warmup=2):
+    """
+    Runs one scenario.
+
+    Args:
+        driver (TestClientDriver or ServerDriver): Sends the requests.
+        scenario (Scenario): The scenario.
+        context (BenchmarkContext): The benchmark users and objects.
+        iterations (int): The number of measured requests.
+        warmup (int): The number of requests sent first and not measured (cold caches).
+
+    Returns:
+        dict: The summary of the measured requests, see ScenarioResult.summary().
+    """
+    result = ScenarioResult()
+    for i in range(warmup + iterations):
+        if scenario.prepare:
+            scenario.prepare(context)
+        path = scenario.url(context)
+        data = scenario.data(context) if scenario.data else None
+        start = time.perf_counter()
+        status, queries = driver.request(scenario.role, scenario.method, path, data, scenario.ajax)
+        elapsed = time.perf_counter() - start
+        if i < warmup:
+            continue
+        result.latencies.append(elapsed)
+        result.queries.append(queries)
+        if status >= 400:
+            result.errors += 1
+    return result.summary()
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Compares benchmark results with a baseline.
+
+    Args:
+        results (dict): {scenario: summary} of this run.
+        baseline (dict): {scenario: summary} of the baseline run.
+        tolerance (float): The allowed relative increase of the p95 latency.
+
+    Returns:
+        list: One (scenario, message) pair per regression.
+    """
+    regressions = []
+    for name, summary in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if base.get('p95_ms') and summary['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append((name, f"p95 {summary['p95_ms']} ms vs {base['p95_ms']} ms"))
+        if base.get('max_queries') is not None and summary['max_queries'] is not None \
+                and summary['max_queries'] > base['max_queries']:
+            regressions.append((name, f"{summary['max_queries']} queries vs {base['max_queries']}"))
+    return regressions
@@ -0,0 +1,414 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.db import connections, router, transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.utils import timezone
+
+from menu.models import FoodItem
+from .models import Cart
+from .tax_engine import get_tax_engine, sum_tax_dict
+
+# Attributes used to memoize the cart summary and partition on the request object.
+CART_SUMMARY_ATTR = '_cart_summary'
+CART_PARTITION_ATTR = '_cart_partition'
+
+
+def build_cart_summary(user):
+    """
+    Calculates the quantity, subtotal and tax breakdown of the user's cart.
+
+    The quantity and the subtotal are computed by the database in a single aggregate
+    query, the taxes by the tax engine from its cached rules.
+
+    Args:
+        user (User): The user whose cart is summarized.
+
+    Returns:
+        dict: A dictionary with 'cart_count', 'subtotal', 'tax', 'grand_total' and 'tax_dict'.
+    """
+    cart_count = 0
+    subtotal = Decimal('0')
+    tax = 0
+    grand_total = 0
+    tax_dict = {}
+
+    if user.is_authenticated:
+        totals = Cart.objects.filter(user=user).aggregate(
+            cart_count=Sum('quantity'),
+            subtotal=Sum(F('quantity') * F('fooditem__price'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+            vendor_count=Count('fooditem__vendor', distinct=True),
+        )
+        cart_count = totals['cart_count'] or 0
+        subtotal = totals['subtotal'] or Decimal('0')
+        tax_dict = get_tax_engine().order_taxes(subtotal, totals['vendor_count'])
+        tax = sum_tax_dict(tax_dict)
+        grand_total = subtotal + tax
+
+    return dict(cart_count=cart_count, subtotal=subtotal, tax=tax, grand_total=grand_total, tax_dict=tax_dict)
+
+
+def get_cart_summary(request):
+    """
+    Returns the cart summary of the current user, computing it at most once per request.
+
+    The context processors and the cart AJAX views all read the same memoized result.
+
+    Args:
+        request (HttpRequest): The HTTP request object containing user information.
+
+    Returns:
+        dict: The cart summary, see build_cart_summary().
+    """
+    summary = getattr(request, CART_SUMMARY_ATTR, None)
+    if summary is None:
+        partition = getattr(request, CART_PARTITION_ATTR, None)
+        # a page that already partitioned the cart does not need the aggregate query
+        summary = partition.summary() if partition is not None else build_cart_summary(request.user)
+        setattr(request, CART_SUMMARY_ATTR, summary)
+    return summary
+
+
+def clear_cart_summary(request):
+    """
+    Forgets the memoized cart summary. Must be called after the cart has been modified.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+    """
+    request.__dict__.pop(CART_SUMMARY_ATTR, None)
+    request.__dict__.pop(CART_PARTITION_ATTR, None)
+
+
+def cart_counter_data(summary):
+    """
+    Returns the part of the cart summary shown in the navbar badge.
+    """
+    return dict(cart_count=summary['cart_count'])
+
+
+def cart_amounts_data(summary):
+    """
+    Returns the subtotal, tax, grand total and tax breakdown part of the cart summary.
+    """
+    return dict(
+        subtotal=summary['subtotal'],
+        tax=summary['tax'],
+        grand_total=summary['grand_total'],
+        tax_dict=summary['tax_dict'],
+    )
+
+
+@dataclass
+class VendorCart:
+    """
+    The part of a cart ordered from one vendor.
+
+    Attributes:
+        vendor (Vendor): The vendor.
+        items (list): The vendor's cart items.
+        subtotal (Decimal): The price of the items.
+        tax_dict (dict): The vendor's taxes, without the fees charged once per order (e.g. the delivery fee).
+        tax (Decimal): The total of tax_dict.
+    """
+    vendor: object
+    items: list = field(default_factory=list)
+    subtotal: Decimal = Decimal('0')
+    tax_dict: dict = field(default_factory=dict)
+    tax: Decimal = Decimal('0')
+
+    @property
+    def grand_total(self):
+        return self.subtotal + self.tax
+
+
+@dataclass
+class CartPartition:
+    """
+    A cart split by vendor, with the per-vendor and the grand totals.
+
+    Attributes:
+        items (list): All cart items in the order they were added, with their food item and vendor loaded.
+        vendors (OrderedDict): {vendor_id: VendorCart}, in the order the vendors were added.
+        cart_count (int): The total quantity.
+        subtotal (Decimal): The price of all items.
+        tax_dict (dict): The taxes of the whole cart, including the delivery fee.
+        tax (Decimal): The total of tax_dict.
+    """
+    items: list = field(default_factory=list)
+    vendors: OrderedDict = field(default_factory=OrderedDict)
+    cart_count: int = 0
+    subtotal: Decimal = Decimal('0')
+    tax_dict: dict = field(default_factory=dict)
+    tax: Decimal = Decimal('0')
+
+    @property
+    def grand_total(self):
+        return self.subtotal + self.tax
+
+    def summary(self):
+        """
+        Returns the cart summary (see build_cart_summary()) of this cart.
+        """
+        return dict(cart_count=self.cart_count, subtotal=self.subtotal, tax=self.tax, grand_total=self.grand_total, tax_dict=self.tax_dict)
+
+    def vendor_totals(self):
+        """
+        Returns the per-vendor totals in the format of orders.utils.parse_total_data().
+        """
+        return {
+            vendor_id: {
+                'subtotal': vendor_cart.subtotal,
+                'tax': vendor_cart.tax,
+                'tax_dict': {tax_type: {key: str(value) for key, value in amounts.items()} for tax_type, amounts in vendor_cart.tax_dict.items()},
+                'grand_total': vendor_cart.grand_total,
+            }
+            for vendor_id, vendor_cart in self.vendors.items()
+        }
+
+    def total_data(self):
+        """
+        Returns the per-vendor totals in the legacy Order.total_data format.
+
+        {"vendor_id": {"subtotal": "{'tax_type': {'tax_percentage': 'tax_amount'}}"}} without the delivery value.
+        """
+        return {
+            vendor_id: {str(totals['subtotal']): str(totals['tax_dict'])}
+            for vendor_id, totals in self.vendor_totals().items()
+        }
+
+
+def build_cart_partition(user):
+    """
+    Splits the user's cart by vendor from a single joined query.
+
+    Args:
+        user (User): The user whose cart is partitioned.
+
+    Returns:
+        CartPartition: The partitioned cart.
+    """
+    partition = CartPartition()
+    if not user.is_authenticated:
+        return partition
+
+    partition.items = list(Cart.objects.filter(user=user).select_related('fooditem__vendor').order_by('created_at'))
+    for item in partition.items:
+        vendor = item.fooditem.vendor
+        vendor_cart = partition.vendors.get(vendor.id)
+        if vendor_cart is None:
+            vendor_cart = partition.vendors[vendor.id] = VendorCart(vendor=vendor)
+        vendor_cart.items.append(item)
+        vendor_cart.subtotal += item.fooditem.price * item.quantity
+        partition.cart_count += item.quantity
+
+    partition.tax_dict, vendor_taxes = get_tax_engine().breakdown(
+        {vendor_id: vendor_cart.subtotal for vendor_id, vendor_cart in partition.vendors.items()}
+    )
+    for vendor_id, vendor_cart in partition.vendors.items():
+        vendor_cart.tax_dict = vendor_taxes[vendor_id]
+        vendor_cart.tax = sum_tax_dict(vendor_cart.tax_dict)
+        partition.subtotal += vendor_cart.subtotal
+    partition.tax = sum_tax_dict(partition.tax_dict)
+    return partition
+
+
+def get_cart_partition(request):
+    """
+    Returns the partitioned cart of the current user, computing it at most once per request.
+
+    The cart summary of the same request is derived from it without another query.
+
+    Args:
+        request (HttpRequest): The HTTP request object containing user information.
+
+    Returns:
+        CartPartition: The partitioned cart.
+    """
+    partition = getattr(request, CART_PARTITION_ATTR, None)
+    if partition is None:
+        partition = build_cart_partition(request.user)
+        setattr(request, CART_PARTITION_ATTR, partition)
+    return partition
+
+
+# The cart writes below are single statements, so concurrent clicks on the same food
+# item can neither lose an increment nor create a second row (unique user + fooditem).
+# They run on PostgreSQL and on SQLite >= 3.35 (upsert with RETURNING).
+_ADD_SQL = """
+    INSERT INTO {cart} (user_id, fooditem_id, quantity, created_at, updated_at)
+    SELECT %s, id, %s, %s, %s FROM {fooditem} WHERE id = %s
+    ON CONFLICT (user_id, fooditem_id)
+    DO UPDATE SET quantity = {cart}.quantity + excluded.quantity, updated_at = excluded.updated_at
+    RETURNING quantity
+"""
+_DECREASE_SQL = """
+    UPDATE {cart} SET quantity = quantity - %s, updated_at = %s
+    WHERE user_id = %s AND fooditem_id = %s AND quantity > %s
+    RETURNING quantity
+"""
+_REMOVE_LAST_SQL = """
+    DELETE FROM {cart} WHERE user_id = %s AND fooditem_id = %s AND quantity <= %s
+"""
+
+# Limits of a batch of cart changes (see apply_cart_changes()).
+MAX_BATCH_OPERATIONS = 50
+MAX_DELTA = 99
+
+
+def _execute(sql, params):
+    using = router.db_for_write(Cart)
+    connection = connections[using]
+    sql = sql.format(
+        cart=connection.ops.quote_name(Cart._meta.db_table),
+        fooditem=connection.ops.quote_name(FoodItem._meta.db_table),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone() if cursor.description else cursor.rowcount
+
+
+def _change_quantity(user, food_id, delta, now):
+    """
+    Changes the quantity of a food item in the user's cart by delta and returns the new quantity.
+    Must run inside a transaction.
+    """
+    if delta > 0:
+        row = _execute(_ADD_SQL, [user.pk, delta, now, now, food_id])
+        if row is None:
+            raise FoodItem.DoesNotExist('FoodItem matching query does not exist.')
+        return row[0]
+
+    delta = -delta
+    row = _execute(_DECREASE_SQL, [delta, now, user.pk, food_id, delta])
+    if row is not None:
+        return row[0]
+    if _execute(_REMOVE_LAST_SQL, [user.pk, food_id, delta]):
+        return 0
+    # the item could have been added to concurrently, between the two statements
+    row = _execute(_DECREASE_SQL, [delta, now, user.pk, food_id, delta])
+    if row is None:
+        raise Cart.DoesNotExist('Cart matching query does not exist.')
+    return row[0]
+
+
+def add_cart_item(user, food_id):
+    """
+    Adds one piece of a food item to the user's cart with a single upsert.
+
+    Args:
+        user (User): The authenticated user.
+        food_id (int): The ID of the food item.
+
+    Returns:
+        tuple: The new quantity and the fresh cart summary (see build_cart_summary()).
+
+    Raises:
+        FoodItem.DoesNotExist: If there is no such food item.
+    """
+    with transaction.atomic():
+        quantity = _change_quantity(user, food_id, 1, timezone.now())
+        return quantity, build_cart_summary(user)
+
+
+def decrease_cart_item(user, food_id):
+    """
+    Removes one piece of a food item from the user's cart; the row is deleted with the last piece.
+
+    Args:
+        user (User): The authenticated user.
+        food_id (int): The ID of the food item.
+
+    Returns:
+        tuple: The new quantity (0 if the item was removed) and the fresh cart summary.
+
+    Raises:
+        Cart.DoesNotExist: If the food item is not in the cart.
+    """
+    with transaction.atomic():
+        quantity = _change_quantity(user, food_id, -1, timezone.now())
+        return quantity, build_cart_summary(user)
+
+
+def apply_cart_changes(user, deltas):
+    """
+    Applies a batch of quantity changes to the user's cart in one transaction.
+
+    Changes of food items that do not exist, or decreases of items that are not in
+    the cart, are skipped and reported with a quantity of 0. A zero delta changes
+    nothing and reports the current quantity, the frontend re-syncs with it.
+
+    Args:
+        user (User): The authenticated user.
+        deltas (dict): {food_id: delta}, e.g. {12: 3, 15: -1, 17: 0}.
+
+    Returns:
+        tuple: {food_id: new quantity} of the changed lines and the fresh cart summary.
+    """
+    now = timezone.now()
+    quantities = {}
+    with transaction.atomic():
+        # a fixed order keeps concurrent batches of the same user from deadlocking
+        for food_id in sorted(deltas):
+            delta = deltas[food_id]
+            if not delta:
+                quantities[food_id] = Cart.objects.filter(user=user, fooditem_id=food_id).values_list('quantity', flat=True).first() or 0
+                continue
+            try:
+                quantities[food_id] = _change_quantity(user, food_id, delta, now)
+            except (FoodItem.DoesNotExist, Cart.DoesNotExist):
+                quantities[food_id] = 0
+        return quantities, build_cart_summary(user)
+
+
+def parse_cart_operations(operations):
+    """
+    Validates a list of cart operations and sums them up per food item.
+
+    Args:
+        operations (list): [{'food_id': int, 'delta': int}, ...]
+
+    Returns:
+        dict: {food_id: delta}
+
+    Raises:
+        ValueError: If the list is too long or an operation is malformed.
+    """
+    if not isinstance(operations, list) or not 0 < len(operations) <= MAX_BATCH_OPERATIONS:
+        raise ValueError(f'Expected a list of 1 to {MAX_BATCH_OPERATIONS} operations.')
+    deltas = {}
+    for operation in operations:
+        try:
+            food_id = operation['food_id']
+            delta = operation['delta']
+        except (KeyError, TypeError):
+            raise ValueError('Every operation needs a food_id and a delta.')
+        if type(food_id) is not int or type(delta) is not int or food_id <= 0:
+            raise ValueError('food_id and delta must be integers.')
+        deltas[food_id] = deltas.get(food_id, 0) + delta
+    for food_id, delta in deltas.items():
+        if abs(delta) > MAX_DELTA:
+            raise ValueError(f'A quantity can change by at most {MAX_DELTA} in one batch.')
+    return deltas
+
+
+def delete_cart_item(user, cart_id):
+    """
+    Deletes an item from the user's cart.
+
+    Args:
+        user (User): The authenticated user.
+        cart_id (int): The ID of the cart item.
+
+    Returns:
+        dict: The fresh cart summary.
+
+    Raises:
+        Cart.DoesNotExist: If the user has no such cart item.
+    """
+    with transaction.atomic():
+        deleted, _ = Cart.objects.filter(user=user, id=cart_id).delete()
+        if not deleted:
+            raise Cart.DoesNotExist('Cart matching query does not exist.')
+        return build_cart_summary(user)
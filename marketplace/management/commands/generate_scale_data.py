@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from marketplace.scale_data import ScaleConfig, clear, generate
+
+
+class Command(BaseCommand):
+    help = 'Bulk-generates vendors with menus and customers with carts and order history, for the benchmarks.'
+
+    def add_arguments(self, parser):
+        defaults = ScaleConfig()
+        parser.add_argument('--vendors', type=int, default=defaults.vendors, help='Number of vendors.')
+        parser.add_argument('--customers', type=int, default=defaults.customers, help='Number of customers.')
+        parser.add_argument('--categories', type=int, default=defaults.categories, help='Categories per vendor.')
+        parser.add_argument('--food-items', type=int, default=defaults.food_items, help='Food items per category.')
+        parser.add_argument('--cart-items', type=int, default=defaults.cart_items, help='Maximum cart items per customer.')
+        parser.add_argument('--orders', type=int, default=defaults.orders, help='Paid orders per customer.')
+        parser.add_argument('--radius', type=float, default=defaults.radius_km, help='Radius of the vendor and customer locations, in km.')
+        parser.add_argument('--seed', type=int, default=defaults.seed, help='Seed of the random data; the same seed gives the same data.')
+        parser.add_argument('--clear', action='store_true', help='Delete the previously generated data first.')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            self.stdout.write(f'Deleted {clear()} generated users.')
+        config = ScaleConfig(
+            vendors=options['vendors'],
+            customers=options['customers'],
+            categories=options['categories'],
+            food_items=options['food_items'],
+            cart_items=options['cart_items'],
+            orders=options['orders'],
+            radius_km=options['radius'],
+            seed=options['seed'],
+        )
+        counts = generate(config, log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(
+            'Generated ' + ', '.join(f'{count} {name.replace("_", " ")}' for name, count in counts.items()) + '.'
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from marketplace.search_index import rebuild_index, update_documents
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the vendor search documents from the vendors, food items and categories.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vendor', type=int, action='append', dest='vendor_ids', help='Only rebuild this vendor id (can be repeated).')
+
+    def handle(self, *args, **options):
+        if options['vendor_ids']:
+            written = update_documents(options['vendor_ids'])
+        else:
+            written = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} search documents.'))
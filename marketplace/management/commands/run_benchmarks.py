@@ -0,0 +1,103 @@
+import json
+import platform
+from dataclasses import asdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from django.utils import timezone
+
+from marketplace.benchmark import ServerDriver, TestClientDriver, build_context, compare, default_scenarios, run_scenario
+from marketplace.scale_data import ScaleConfig, generate, has_scale_data
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the main views (p50/p95 latency, queries per request, throughput). '
+        'By default a disposable test database is created and filled with generated data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30, help='Measured requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=3, help='Unmeasured requests sent first per scenario.')
+        parser.add_argument('--scenario', action='append', dest='scenarios', help='Only run this scenario (can be repeated).')
+        parser.add_argument('--existing', action='store_true', help='Use the configured database, filled with generate_scale_data.')
+        parser.add_argument('--server', help='Benchmark a running server at this URL (e.g. http://127.0.0.1:8000) instead of the test client. Implies --existing.')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the disposable database between runs.')
+        parser.add_argument('--vendors', type=int, default=ScaleConfig.vendors, help='Generated vendors in the disposable database.')
+        parser.add_argument('--customers', type=int, default=ScaleConfig.customers, help='Generated customers in the disposable database.')
+        parser.add_argument('--seed', type=int, default=ScaleConfig.seed, help='Seed of the generated data.')
+        parser.add_argument('--output', help='Write the results to this JSON file (e.g. to store a new baseline).')
+        parser.add_argument('--baseline', help='Compare the results with this JSON file.')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative p95 increase over the baseline.')
+        parser.add_argument('--fail-on-regression', action='store_true', help='Exit with an error when the baseline comparison finds regressions.')
+
+    def handle(self, *args, **options):
+        existing = options['existing'] or options['server']
+        config = ScaleConfig(vendors=options['vendors'], customers=options['customers'], seed=options['seed'])
+
+        setup_test_environment()
+        old_config = None
+        try:
+            if not existing:
+                old_config = setup_databases(options['verbosity'], interactive=False, keepdb=options['keepdb'])
+                if not (options['keepdb'] and has_scale_data()):
+                    generate(config, log=self.stdout.write)
+            # the query counts are read from the Server-Timing header; budgets must not abort the run
+            with override_settings(SERVER_TIMING=True, QUERY_BUDGET_RAISE=False):
+                results = self.run(options)
+        finally:
+            if old_config is not None:
+                teardown_databases(old_config, options['verbosity'], keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        report = {
+            'meta': {
+                'date': timezone.now().isoformat(),
+                'driver': options['server'] or 'test client',
+                'iterations': options['iterations'],
+                'python': platform.python_version(),
+                'scale': asdict(config) if not existing else 'existing database',
+            },
+            'scenarios': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}.")
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)['scenarios']
+            regressions = compare(results, baseline, options['tolerance'])
+            for name, message in regressions:
+                self.stdout.write(self.style.WARNING(f'Regression in {name}: {message}'))
+            if not regressions:
+                self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
+            elif options['fail_on_regression']:
+                raise CommandError(f'{len(regressions)} regressions against the baseline.')
+
+    def run(self, options):
+        try:
+            context = build_context()
+        except LookupError as e:
+            raise CommandError(str(e))
+        driver = ServerDriver(context, options['server']) if options['server'] else TestClientDriver(context)
+
+        scenarios = default_scenarios(driver)
+        if options['scenarios']:
+            unknown = set(options['scenarios']) - {scenario.name for scenario in scenarios}
+            if unknown:
+                raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+            scenarios = [scenario for scenario in scenarios if scenario.name in options['scenarios']]
+
+        self.stdout.write(f"{'scenario':<16}{'p50 ms':>10}{'p95 ms':>10}{'queries':>10}{'req/s':>10}{'errors':>8}")
+        results = {}
+        for scenario in scenarios:
+            summary = run_scenario(driver, scenario, context, options['iterations'], options['warmup'])
+            results[scenario.name] = summary
+            self.stdout.write(
+                f"{scenario.name:<16}{summary['p50_ms']:>10}{summary['p95_ms']:>10}"
+                f"{str(summary['queries']):>10}{str(summary['throughput_rps']):>10}{summary['errors']:>8}"
+            )
+        return results
+
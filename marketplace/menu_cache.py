@@ -0,0 +1,124 @@
+"""
+Per-vendor menu cache.
+
+The menu page of a vendor (marketplace.views.vendor_detail) is built from the
+vendor, its profile, its categories with their available food items and its
+opening hours. All of it is cached per vendor under a version number, the
+Vendor.menu_version column. Saving or deleting a FoodItem, Category,
+OpeningHour, Vendor or UserProfile bumps the version of the vendor once the
+transaction commits (see marketplace.signals), so the next request rebuilds the
+menu; entries of old versions simply expire.
+
+The version is read from the database with every request, so the cached menus
+are invalidated in every process even though the default cache is per process.
+Each process fills its own cache with its first requests, so there is nothing
+to warm up or count from outside of it.
+
+Two things are cached for a version: the structured menu data and the
+rendered menu fragment. Per-user parts of the page (the cart quantities) and
+time-dependent parts (open now, today's hours) are computed per request and
+never cached.
+"""
+from django.core.cache import cache
+from django.db.models import F, Prefetch
+from django.http import Http404
+from django.template.loader import render_to_string
+
+from menu.models import Category, FoodItem
+from vendor.models import OpeningHour, Vendor
+
+MENU_CACHE_TIMEOUT = 60 * 60 * 24
+MENU_FRAGMENT_TEMPLATE = 'includes/vendor_menu.html'
+
+DATA_KEY = 'marketplace:menu:%s:%s'
+FRAGMENT_KEY = 'marketplace:menu_html:%s:%s'
+
+
+def bump_menu_version(vendor_id):
+    """
+    Invalidates the cached menu of a vendor.
+
+    Args:
+        vendor_id (int): The vendor whose menu changed.
+    """
+    Vendor.objects.filter(pk=vendor_id).update(menu_version=F('menu_version') + 1)
+
+
+def build_menu(vendor_id):
+    """
+    Loads the menu of a vendor from the database.
+
+    Args:
+        vendor_id (int): The vendor.
+
+    Returns:
+        dict: 'vendor' (with its user profile), 'categories' (with their available food
+            items prefetched) and 'opening_hours'.
+    """
+    vendor = Vendor.objects.select_related('user_profile').get(pk=vendor_id)
+    categories = list(
+        Category.objects.filter(vendor=vendor).prefetch_related(
+            Prefetch(
+                'fooditems',
+                queryset = FoodItem.objects.filter(is_available=True)
+            )
+        ).order_by('created_at')
+    )
+    opening_hours = list(OpeningHour.objects.filter(vendor=vendor).order_by('day', '-from_hour'))
+    return {
+        'vendor': vendor,
+        'categories': categories,
+        'opening_hours': opening_hours,
+    }
+
+
+def get_vendor_menu(vendor_slug):
+    """
+    Returns the menu of a vendor, from the cache when it is current.
+
+    Args:
+        vendor_slug (str): The slug of the vendor.
+
+    Returns:
+        dict: The menu, see build_menu(), plus its 'version'.
+
+    Raises:
+        Http404: If there is no vendor with this slug.
+    """
+    current = Vendor.objects.filter(vendor_slug=vendor_slug).values_list('id', 'menu_version').first()
+    if current is None:
+        raise Http404('No vendor matches the given query.')
+    vendor_id, version = current
+    key = DATA_KEY % (vendor_id, version)
+    menu = cache.get(key)
+    if menu is not None:
+        return menu
+
+    try:
+        menu = build_menu(vendor_id)
+    except Vendor.DoesNotExist:
+        raise Http404('No vendor matches the given query.')
+    menu['version'] = version
+    cache.set(key, menu, MENU_CACHE_TIMEOUT)
+    return menu
+
+
+def render_menu_fragment(menu):
+    """
+    Returns the rendered categories and food items of a menu, from the cache when it is current.
+
+    Args:
+        menu (dict): The menu, see get_vendor_menu().
+
+    Returns:
+        str: The HTML fragment.
+    """
+    key = FRAGMENT_KEY % (menu['vendor'].id, menu['version'])
+    html = cache.get(key)
+    if html is not None:
+        return html
+
+    html = render_to_string(MENU_FRAGMENT_TEMPLATE, {'categories': menu['categories']})
+    cache.set(key, html, MENU_CACHE_TIMEOUT)
+    return html
+
@@ -0,0 +1,96 @@
+# Generated by Django 5.0.3 on 2026-10-16 09:00
+
+import django.contrib.postgres.search
+import django.db.models.deletion
+from collections import defaultdict
+from django.db import migrations, models
+
+
+# The GIN indexes need PostgreSQL, on other databases the search uses the memory backend.
+POSTGRES_INDEXES_SQL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX marketplace_vsd_vector_gin ON marketplace_vendorsearchdocument USING gin (search_vector)',
+    'CREATE INDEX marketplace_vsd_name_trgm ON marketplace_vendorsearchdocument USING gin (vendor_name gin_trgm_ops)',
+    'CREATE INDEX marketplace_vsd_food_trgm ON marketplace_vendorsearchdocument USING gin (food_titles gin_trgm_ops)',
+]
+POSTGRES_DROP_INDEXES_SQL = [
+    'DROP INDEX IF EXISTS marketplace_vsd_vector_gin',
+    'DROP INDEX IF EXISTS marketplace_vsd_name_trgm',
+    'DROP INDEX IF EXISTS marketplace_vsd_food_trgm',
+]
+POSTGRES_VECTOR_SQL = (
+    "UPDATE marketplace_vendorsearchdocument SET search_vector = "
+    "setweight(to_tsvector('simple', vendor_name), 'A') || "
+    "setweight(to_tsvector('simple', food_titles), 'B') || "
+    "setweight(to_tsvector('simple', category_names), 'C') || "
+    "setweight(to_tsvector('simple', descriptions), 'D')"
+)
+
+
+def create_postgres_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in POSTGRES_INDEXES_SQL:
+            schema_editor.execute(sql)
+
+
+def drop_postgres_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in POSTGRES_DROP_INDEXES_SQL:
+            schema_editor.execute(sql)
+
+
+def build_search_documents(apps, schema_editor):
+    Vendor = apps.get_model('vendor', 'Vendor')
+    FoodItem = apps.get_model('menu', 'FoodItem')
+    Category = apps.get_model('menu', 'Category')
+    VendorSearchDocument = apps.get_model('marketplace', 'VendorSearchDocument')
+
+    texts = defaultdict(lambda: defaultdict(list))
+    for vendor_id, title, description in FoodItem.objects.filter(is_available=True).values_list('vendor_id', 'food_title', 'description'):
+        texts[vendor_id]['food_titles'].append(title)
+        texts[vendor_id]['descriptions'].append(description)
+    for vendor_id, name, description in Category.objects.values_list('vendor_id', 'category_name', 'description'):
+        texts[vendor_id]['category_names'].append(name)
+        texts[vendor_id]['descriptions'].append(description)
+
+    def join(values):
+        return ' '.join(value.lower() for value in values if value)
+
+    VendorSearchDocument.objects.bulk_create([
+        VendorSearchDocument(
+            vendor_id=vendor_id,
+            vendor_name=join([vendor_name]),
+            food_titles=join(texts[vendor_id]['food_titles']),
+            category_names=join(texts[vendor_id]['category_names']),
+            descriptions=join(texts[vendor_id]['descriptions']),
+        )
+        for vendor_id, vendor_name in Vendor.objects.values_list('id', 'vendor_name')
+    ], batch_size=500)
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(POSTGRES_VECTOR_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0003_alter_tax_options_tax_tax_value_and_more'),
+        ('menu', '0006_alter_fooditem_slug'),
+        ('vendor', '0005_vendor_location'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendorSearchDocument',
+            fields=[
+                ('vendor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='vendor.vendor')),
+                ('vendor_name', models.TextField(blank=True)),
+                ('food_titles', models.TextField(blank=True)),
+                ('category_names', models.TextField(blank=True)),
+                ('descriptions', models.TextField(blank=True)),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(editable=False, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_postgres_indexes, drop_postgres_indexes),
+        migrations.RunPython(build_search_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.3 on 2026-10-16 09:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def merge_duplicate_cart_items(apps, schema_editor):
+    # concurrent clicks could create the same food item twice; keep the oldest row with the summed quantity
+    Cart = apps.get_model('marketplace', 'Cart')
+    duplicates = (
+        Cart.objects.values('user_id', 'fooditem_id')
+        .annotate(rows=models.Count('id'), quantity=models.Sum('quantity'))
+        .filter(rows__gt=1)
+    )
+    for duplicate in duplicates:
+        items = list(Cart.objects.filter(user_id=duplicate['user_id'], fooditem_id=duplicate['fooditem_id']).order_by('created_at', 'id'))
+        keep = items[0]
+        Cart.objects.filter(pk=keep.pk).update(quantity=duplicate['quantity'])
+        Cart.objects.filter(pk__in=[item.pk for item in items[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0004_vendorsearchdocument'),
+        ('menu', '0006_alter_fooditem_slug'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_cart_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('user', 'fooditem'), name='unique_cart_user_fooditem'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-16 23:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0005_cart_unique_cart_user_fooditem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tax',
+            name='per_vendor',
+            field=models.BooleanField(default=False, help_text='Charge a fixed tax once per vendor of an order instead of once per order.'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.3 on 2026-10-16 23:50
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0006_tax_per_vendor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tax',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
+from django.contrib.postgres.search import SearchVectorField
 from accounts.models import User
 from menu.models import FoodItem
+from vendor.models import Vendor
 
 # Create your models here.
 class Cart(models.Model):
@@ -20,6 +22,12 @@ class Cart(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # one row per food item, so adding to the cart can be a single upsert (see marketplace.cart)
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'fooditem'], name='unique_cart_user_fooditem'),
+        ]
+
     def __unicode__(self):
         """
         Returns the string representation of the cart item, which is the username of the user who owns the cart.
@@ -37,12 +45,19 @@ class Tax(models.Model):
         tax_type (CharField): The type of the tax (e.g., VAT, Delivery).
         tax_percentage (DecimalField): The percentage of the tax (e.g., 20.00 for 20%).
         tax_value (DecimalField): The fixed value of the tax.
+        per_vendor (BooleanField): Whether a fixed tax is charged once per vendor of an order instead of once per order.
         is_active (BooleanField): A flag indicating whether the tax is active or not.
+        updated_at (DateTimeField): The timestamp of the last change, part of the version of the tax rules.
+
+    A tax with a tax_value is a fixed fee, otherwise tax_percentage of the subtotal
+    is charged (see marketplace.tax_engine).
     """
     tax_type = models.CharField(max_length=20, unique=True)
     tax_percentage = models.DecimalField(decimal_places=2, max_digits=4, blank=True, verbose_name='Tax Percentage (%)')
     tax_value = models.DecimalField(decimal_places=2, max_digits=4, blank=True, default=0.0)
+    per_vendor = models.BooleanField(default=False, help_text='Charge a fixed tax once per vendor of an order instead of once per order.')
     is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = 'tax'
@@ -54,4 +69,37 @@ class Tax(models.Model):
         Returns:
             str: The type of the tax.
         """
-        return self.tax_type
\ No newline at end of file
+        return self.tax_type
+
+
+class VendorSearchDocument(models.Model):
+    """
+    A model holding the searchable text of a vendor (see marketplace.search_index).
+
+    The text fields are stored lower-cased. On PostgreSQL search_vector holds their
+    weighted tsvector (A: vendor name, B: food titles, C: category names,
+    D: descriptions) behind a GIN index, and vendor_name / food_titles have trigram
+    indexes for substring matches.
+
+    Attributes:
+        vendor (OneToOneField): The vendor.
+        vendor_name (TextField): The vendor name.
+        food_titles (TextField): The titles of the vendor's available food items.
+        category_names (TextField): The names of the vendor's categories.
+        descriptions (TextField): The descriptions of the categories and the available food items.
+        search_vector (SearchVectorField): The weighted tsvector of the text fields (PostgreSQL only).
+        updated_at (DateTimeField): The timestamp when the document was last rebuilt.
+    """
+    vendor = models.OneToOneField(Vendor, primary_key=True, related_name='search_document', on_delete=models.CASCADE)
+    vendor_name = models.TextField(blank=True)
+    food_titles = models.TextField(blank=True)
+    category_names = models.TextField(blank=True)
+    descriptions = models.TextField(blank=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        """
+        Returns the string representation of the document, which is the vendor name.
+        """
+        return self.vendor_name
@@ -0,0 +1,131 @@
+"""
+Nearby vendors of the home page.
+
+Sorting all vendors by their distance to every visitor is the most expensive
+query of the landing page, and visitors close to each other get the same
+vendors. So the coordinates are snapped to a grid of GRID_CELL_DEGREES cells
+and the NEARBY_CANDIDATES approved vendors nearest to the centre of a cell are
+cached per cell, as (id, longitude, latitude). A visitor's vendors are the
+HOME_VENDORS nearest of the candidates of their cell, by the haversine
+distance to the visitor's own location, and only those are read from the
+database.
+
+The candidates are cached for NEARBY_CACHE_TIMEOUT seconds under the version
+of the listed vendors: their number and the time of the last change of one of
+them, read from the database with every visit. Adding, approving, saving or
+deleting a vendor and moving a vendor's profile (which updates
+Vendor.modified_at, see vendor.signals) change the version in every process,
+so the cells are recomputed with the next visits.
+"""
+import math
+
+from django.contrib.gis.db.models.functions import Distance, GeometryDistance
+from django.contrib.gis.geos import Point
+from django.contrib.gis.measure import D  # ``D`` is a shortcut for ``Distance``
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Count, Max
+
+from vendor.models import Vendor
+from vendor.schedule import annotate_is_open
+
+HOME_VENDORS = 8
+NEARBY_CANDIDATES = 32
+NEARBY_RADIUS_KM = 1000
+NEARBY_CACHE_TIMEOUT = 60 * 10
+
+# 0.05 degrees of latitude are about 5.5 km
+GRID_CELL_DEGREES = 0.05
+
+EARTH_RADIUS_KM = 6371.0088
+
+CELL_KEY = 'marketplace:nearby:%s:%s:%s'
+
+
+def listed_vendors():
+    """
+    Returns the vendors shown to customers: approved vendors of active users.
+    """
+    return Vendor.objects.filter(is_approved=True, user__is_active=True)
+
+
+def haversine_km(lng1, lat1, lng2, lat2):
+    """
+    Returns the great-circle distance between two points in kilometers.
+    """
+    lng1, lat1, lng2, lat2 = map(math.radians, (lng1, lat1, lng2, lat2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def grid_cell(lng, lat):
+    """
+    Returns the (row, column) of the grid cell of a location.
+    """
+    return math.floor(lat / GRID_CELL_DEGREES), math.floor(lng / GRID_CELL_DEGREES)
+
+
+def get_nearby_version():
+    """
+    Returns the version of the cached candidates, which changes whenever a listed vendor is
+    added, changed or removed.
+    """
+    version = listed_vendors().aggregate(count=Count('id'), modified_at=Max('modified_at'))
+    modified_at = version['modified_at']
+    return f"{version['count']}-{modified_at.timestamp() if modified_at else 0}"
+
+
+def cell_candidates(cell):
+    """
+    Returns the vendors nearest to the centre of a grid cell, from the cache.
+
+    Args:
+        cell (tuple): The (row, column) of the cell, see grid_cell().
+
+    Returns:
+        list: (id, longitude, latitude) of up to NEARBY_CANDIDATES vendors, nearest first.
+    """
+    key = CELL_KEY % (get_nearby_version(), *cell)
+    candidates = cache.get(key)
+    if candidates is not None:
+        return candidates
+
+    row, column = cell
+    centre = Point((column + 0.5) * GRID_CELL_DEGREES, (row + 0.5) * GRID_CELL_DEGREES, srid=4326)
+    vendors = listed_vendors()
+    if connections[vendors.db].ops.postgis:
+        vendors = vendors.filter(location__dwithin=(centre, D(km=NEARBY_RADIUS_KM))).order_by(GeometryDistance('location', centre))
+    else:
+        vendors = vendors.filter(location__distance_lte=(centre, D(km=NEARBY_RADIUS_KM))).order_by(Distance('location', centre))
+    candidates = [(pk, location.x, location.y) for pk, location in vendors.values_list('id', 'location')[:NEARBY_CANDIDATES]]
+    cache.set(key, candidates, NEARBY_CACHE_TIMEOUT)
+    return candidates
+
+
+def nearby_vendors(lng, lat, limit=HOME_VENDORS):
+    """
+    Returns the vendors nearest to a location, nearest first, with 'kms' set.
+
+    Args:
+        lng (float): The longitude of the visitor.
+        lat (float): The latitude of the visitor.
+        limit (int): The number of vendors, at most NEARBY_CANDIDATES.
+
+    Returns:
+        list: The vendors with their user profiles and opening status.
+    """
+    distances = {}
+    for pk, vendor_lng, vendor_lat in cell_candidates(grid_cell(lng, lat)):
+        kms = haversine_km(lng, lat, vendor_lng, vendor_lat)
+        if kms <= NEARBY_RADIUS_KM:
+            distances[pk] = kms
+    nearest = sorted(distances, key=lambda pk: (distances[pk], pk))[:limit]
+
+    # the candidates may be a few minutes old, so the vendors are filtered again
+    vendors = sorted(
+        listed_vendors().filter(id__in=nearest).select_related('user_profile'),
+        key=lambda vendor: (distances[vendor.id], vendor.id),
+    )
+    for vendor in vendors:
+        vendor.kms = round(distances[vendor.id], 1)
+    return annotate_is_open(vendors)
@@ -0,0 +1,309 @@
+"""
+Synthetic data at realistic sizes, for the benchmarks (see marketplace.benchmark).
+
+generate() writes vendors with locations, opening hours, categories and food
+items, and customers with carts and a history of paid orders, all with
+bulk_create. The data is derived from a seed, so two runs with the same
+arguments produce the same rows. Signals do not fire for bulk inserts, so the
+derived data (opening schedules, search index, revenue rollups) is built
+explicitly at the end.
+
+All generated users have an e-mail address at SCALE_EMAIL_DOMAIN and the
+password SCALE_PASSWORD; clear() removes them together with everything they own.
+"""
+import math
+import random
+from dataclasses import dataclass
+from datetime import time, timedelta
+from decimal import Decimal
+
+import simplejson as json
+from django.contrib.auth.hashers import make_password
+from django.contrib.gis.geos import Point
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import User, UserProfile
+from menu.models import Category, FoodItem
+from orders.models import Order, OrderedFood, OrderVendorTotal, Payment
+from orders.revenue import rebuild_rollups
+from vendor.models import OpeningHour, Vendor
+from vendor.schedule import build_schedule
+from .models import Cart, Tax
+from .search_index import rebuild_index
+from .tax_engine import load_tax_engine, sum_tax_dict
+
+SCALE_EMAIL_DOMAIN = 'scale.test'
+SCALE_PASSWORD = 'scale-data'
+BATCH_SIZE = 1000
+
+# Sofia, the default center of the generated locations
+DEFAULT_CENTER = (42.6977, 23.3219)
+
+VENDOR_WORDS = ['Пица', 'Бургер', 'Суши', 'Дюнер', 'Скара', 'Тако', 'Паста', 'Салата', 'Кафе', 'Бистро', 'Pizza', 'Grill', 'Kitchen', 'Express']
+VENDOR_SUFFIXES = ['Център', 'Плюс', 'Хаус', 'Corner', 'Place', 'Bar', 'Point']
+CATEGORY_NAMES = ['Предястия', 'Салати', 'Супи', 'Основни', 'Пици', 'Бургери', 'Паста', 'Десерти', 'Напитки', 'Сосове']
+FOOD_WORDS = ['Маргарита', 'Капричоза', 'Карбонара', 'Болонезе', 'Шопска', 'Цезар', 'Чийзбургер', 'Тиквички', 'Кюфтета', 'Пилешко', 'Пърленка', 'Таратор', 'Баклава', 'Лимонада']
+FOOD_QUALIFIERS = ['класик', 'голяма', 'малка', 'специална', 'лют', 'вегетариански', 'домашна']
+ORDER_STATUSES = ['Accepted', 'Completed', 'Completed', 'Completed', 'Cancelled']
+
+
+@dataclass
+class ScaleConfig:
+    """
+    The size of the generated data set.
+    """
+    vendors: int = 100
+    customers: int = 500
+    categories: int = 5  # per vendor
+    food_items: int = 8  # per category
+    cart_items: int = 3  # per customer, at most
+    orders: int = 4  # per customer
+    radius_km: float = 20.0  # around the center
+    center: tuple = DEFAULT_CENTER
+    seed: int = 1
+
+
+def _random_point(rng, center, radius_km):
+    # uniform over the disc around the center
+    distance = radius_km * math.sqrt(rng.random())
+    bearing = rng.uniform(0, 2 * math.pi)
+    lat = center[0] + (distance / 111.32) * math.cos(bearing)
+    lng = center[1] + (distance / (111.32 * math.cos(math.radians(center[0])))) * math.sin(bearing)
+    return round(lat, 6), round(lng, 6)
+
+
+def _hour(minutes):
+    return time(minutes // 60 % 24, minutes % 60).strftime('%I:%M %p')
+
+
+def _opening_hours(rng, vendor):
+    hours = []
+    opens = rng.choice([8, 9, 10, 11]) * 60
+    closes = rng.choice([21, 22, 23, 24, 26]) * 60  # some close after midnight
+    for day in range(1, 8):
+        if rng.random() < 0.1:
+            hours.append(OpeningHour(vendor=vendor, day=day, is_closed=True))
+        else:
+            hours.append(OpeningHour(vendor=vendor, day=day, from_hour=_hour(opens), to_hour=_hour(closes)))
+    return hours
+
+
+def _users(config, password, role, count, prefix):
+    return [
+        User(
+            first_name=prefix.capitalize(),
+            last_name=str(i),
+            username=f'scale_{prefix}_{config.seed}_{i}',
+            email=f'{prefix}{i}.{config.seed}@{SCALE_EMAIL_DOMAIN}',
+            role=role,
+            password=password,
+            is_active=True,
+        )
+        for i in range(count)
+    ]
+
+
+def ensure_taxes():
+    """
+    Creates the VAT and delivery taxes if there are no taxes yet.
+    """
+    if not Tax.objects.exists():
+        Tax.objects.bulk_create([
+            Tax(tax_type='ДДС', tax_percentage=Decimal('20.00'), tax_value=Decimal('0.00')),
+            Tax(tax_type='Delivery', tax_percentage=Decimal('0.00'), tax_value=Decimal('5.00')),
+        ])
+
+
+def has_scale_data():
+    """
+    Returns True if the database contains generated users.
+    """
+    return User.objects.filter(email__endswith=f'@{SCALE_EMAIL_DOMAIN}').exists()
+
+
+def clear():
+    """
+    Deletes all generated users and, through the cascades, their vendors, menus, carts and orders.
+
+    Returns:
+        int: The number of deleted users.
+    """
+    users = User.objects.filter(email__endswith=f'@{SCALE_EMAIL_DOMAIN}')
+    with transaction.atomic():
+        # orders only lose their user on delete, so they are removed explicitly
+        Order.objects.filter(user__in=users).delete()
+        UserProfile.objects.filter(user__in=users).delete()
+        count = users.count()
+        users.delete()
+    return count
+
+
+def generate(config, log=None):
+    """
+    Writes a data set of the given size.
+
+    Args:
+        config (ScaleConfig): The size of the data set.
+        log (callable, optional): Called with a progress message after every step.
+
+    Returns:
+        dict: The number of rows written per model.
+    """
+    log = log or (lambda message: None)
+    rng = random.Random(config.seed)
+    password = make_password(SCALE_PASSWORD)
+    counts = {}
+
+    with transaction.atomic():
+        ensure_taxes()
+
+        # VENDORS
+        vendor_users = User.objects.bulk_create(_users(config, password, User.VENDOR, config.vendors, 'vendor'), batch_size=BATCH_SIZE)
+        customers = User.objects.bulk_create(_users(config, password, User.CUSTOMER, config.customers, 'customer'), batch_size=BATCH_SIZE)
+        profiles = []
+        for user in vendor_users + customers:
+            lat, lng = _random_point(rng, config.center, config.radius_km)
+            profiles.append(UserProfile(
+                user=user, address=f'ул. {user.last_name}', city='София', country='България',
+                latitude=str(lat), longitude=str(lng), location=Point(lng, lat, srid=4326),
+            ))
+        profiles = UserProfile.objects.bulk_create(profiles, batch_size=BATCH_SIZE)
+        counts['users'] = len(profiles)
+        log(f'{len(vendor_users)} vendors and {len(customers)} customers')
+
+        vendors = []
+        opening_hours = []
+        for i, (user, profile) in enumerate(zip(vendor_users, profiles)):
+            vendor = Vendor(
+                user=user,
+                user_profile=profile,
+                vendor_name=f'{rng.choice(VENDOR_WORDS)} {rng.choice(VENDOR_SUFFIXES)} {i}',
+                vendor_slug=f'scale-{config.seed}-vendor-{i}',
+                vendor_license='vendor/license/scale.png',
+                is_approved=rng.random() < 0.9,
+                location=profile.location,
+            )
+            hours = _opening_hours(rng, vendor)
+            vendor.opening_schedule = build_schedule(hours)
+            vendors.append(vendor)
+            opening_hours.extend(hours)
+        Vendor.objects.bulk_create(vendors, batch_size=BATCH_SIZE)
+        OpeningHour.objects.bulk_create(opening_hours, batch_size=BATCH_SIZE)
+        counts['vendors'] = len(vendors)
+
+        # MENUS
+        categories = [
+            Category(
+                vendor=vendor,
+                category_name=name,
+                slug=f'{vendor.vendor_slug}-category-{j}',
+                description=f'{name} на {vendor.vendor_name}',
+            )
+            for vendor in vendors
+            for j, name in enumerate(rng.sample(CATEGORY_NAMES, min(config.categories, len(CATEGORY_NAMES))))
+        ]
+        Category.objects.bulk_create(categories, batch_size=BATCH_SIZE)
+        food_items = [
+            FoodItem(
+                vendor=category.vendor,
+                category=category,
+                food_title=f'{rng.choice(FOOD_WORDS)} {rng.choice(FOOD_QUALIFIERS)}',
+                slug=f'{category.slug}-food-{k}',
+                description=f'{category.category_name}, порция {k + 1}',
+                price=Decimal(rng.randrange(300, 3000)) / 100,
+                image='foodimages/scale.jpg',
+                is_available=rng.random() < 0.95,
+            )
+            for category in categories
+            for k in range(config.food_items)
+        ]
+        FoodItem.objects.bulk_create(food_items, batch_size=BATCH_SIZE)
+        counts['categories'] = len(categories)
+        counts['food_items'] = len(food_items)
+        log(f'{len(categories)} categories and {len(food_items)} food items')
+
+        menus = {}
+        for item in food_items:
+            if item.is_available and item.vendor.is_approved:
+                menus.setdefault(item.vendor_id, []).append(item)
+        vendor_ids = list(menus)
+
+        # CARTS - the items of one or two vendors per customer
+        carts = []
+        for customer in customers:
+            if not vendor_ids:
+                break
+            menu = [item for vendor_id in rng.sample(vendor_ids, min(2, len(vendor_ids))) for item in menus[vendor_id]]
+            for item in rng.sample(menu, min(rng.randint(0, config.cart_items), len(menu))):
+                carts.append(Cart(user=customer, fooditem=item, quantity=rng.randint(1, 3)))
+        Cart.objects.bulk_create(carts, batch_size=BATCH_SIZE)
+        counts['cart_items'] = len(carts)
+
+        # ORDER HISTORY - paid orders of one vendor each, spread over the last 90 days
+        now = timezone.now()
+        # the taxes may have been created in this transaction
+        tax_engine = load_tax_engine()
+        payments, orders, created_at, vendor_totals, lines = [], [], [], [], []
+        for customer, profile in zip(customers, profiles[len(vendor_users):]):
+            for _ in range(config.orders if vendor_ids else 0):
+                vendor_id = rng.choice(vendor_ids)
+                items = rng.sample(menus[vendor_id], min(rng.randint(1, 4), len(menus[vendor_id])))
+                quantities = [rng.randint(1, 3) for item in items]
+                subtotal = sum(item.price * quantity for item, quantity in zip(items, quantities))
+                tax_dict, vendor_taxes = tax_engine.breakdown({vendor_id: subtotal})
+                # the vendor's part of the order, without the delivery fee (see CartPartition)
+                vendor_tax_dict = {
+                    tax_type: {key: str(value) for key, value in amounts.items()}
+                    for tax_type, amounts in vendor_taxes[vendor_id].items()
+                }
+                vendor_tax = sum(Decimal(value) for amounts in vendor_tax_dict.values() for value in amounts.values())
+                total = subtotal + sum_tax_dict(tax_dict)
+
+                payment = Payment(
+                    user=customer, transaction_id=f'SCALE{config.seed}-{len(payments)}',
+                    payment_method='PayPal', amount=str(total), status='COMPLETED',
+                )
+                order = Order(
+                    user=customer, payment=payment,
+                    first_name=customer.first_name, last_name=customer.last_name,
+                    email=customer.email, address=profile.address, country=profile.country,
+                    city=profile.city, pin_code='1000',
+                    total=float(total), total_tax=float(sum_tax_dict(tax_dict)),
+                    tax_data=json.dumps(tax_dict, ensure_ascii=False),
+                    total_data=json.dumps({vendor_id: {str(subtotal): str(vendor_tax_dict)}}, ensure_ascii=False),
+                    payment_method='PayPal', status=rng.choice(ORDER_STATUSES), is_ordered=True,
+                )
+                payments.append(payment)
+                orders.append(order)
+                created_at.append(now - timedelta(minutes=rng.randrange(60 * 24 * 90)))
+                vendor_totals.append(OrderVendorTotal(
+                    order=order, vendor_id=vendor_id, subtotal=subtotal, tax=vendor_tax,
+                    grand_total=subtotal + vendor_tax, tax_data=vendor_tax_dict,
+                ))
+                lines.extend(
+                    OrderedFood(order=order, payment=payment, user=customer, fooditem=item,
+                                quantity=quantity, price=float(item.price), amount=float(item.price * quantity))
+                    for item, quantity in zip(items, quantities)
+                )
+        Payment.objects.bulk_create(payments, batch_size=BATCH_SIZE)
+        Order.objects.bulk_create(orders, batch_size=BATCH_SIZE)
+        for order, created in zip(orders, created_at):
+            # created_at is auto_now_add, so the history dates are written afterwards
+            order.created_at = created
+        Order.objects.bulk_update(orders, ['created_at'], batch_size=BATCH_SIZE)
+        Order.vendors.through.objects.bulk_create([
+            Order.vendors.through(order_id=vendor_total.order.pk, vendor_id=vendor_total.vendor_id)
+            for vendor_total in vendor_totals
+        ], batch_size=BATCH_SIZE)
+        OrderVendorTotal.objects.bulk_create(vendor_totals, batch_size=BATCH_SIZE)
+        OrderedFood.objects.bulk_create(lines, batch_size=BATCH_SIZE)
+        counts['orders'] = len(orders)
+        counts['ordered_food'] = len(lines)
+        log(f'{len(orders)} orders with {len(lines)} ordered food items')
+
+    # derived data, normally maintained by the signals
+    rebuild_index()
+    rebuild_rollups([vendor.pk for vendor in vendors])
+    log('search index and revenue rollups rebuilt')
+    return counts
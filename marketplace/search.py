@@ -0,0 +1,161 @@
+"""
+Vendor search engine.
+
+search_vendors() finds the approved vendors matching a keyword and, when a
+location is given, within a radius of it. The radius filter runs on the
+GiST-indexed Vendor.location geography column and the results are ordered
+nearest first with the KNN operator (<->), so only the vendors of the current
+page are ranked. Without a location the vendors are ordered by their text rank
+(see marketplace.search_index). Pages are addressed with a keyset cursor on (rank, id)
+instead of an offset, and the first page returns the total count in the same
+query through a window function.
+
+On PostGIS the search uses ST_DWithin and <->; on other spatial backends
+(e.g. SpatiaLite for local development) it falls back to distance_lte and
+ST_Distance with the same results.
+"""
+from dataclasses import dataclass, field
+
+from django.contrib.gis.db.models.functions import Distance, GeometryDistance
+from django.contrib.gis.geos import Point
+from django.contrib.gis.measure import D  # ``D`` is a shortcut for ``Distance``
+from django.core import signing
+from django.db import connections
+from django.db.models import Count, F, Q, Window
+
+from vendor.models import Vendor
+from vendor.schedule import annotate_is_open
+from . import search_index
+
+SEARCH_PAGE_SIZE = 20
+# the largest radius of the search form (templates/home.html)
+MAX_RADIUS_KM = 200
+
+CURSOR_SALT = 'marketplace.search'
+
+
+@dataclass
+class SearchPage:
+    """
+    One page of search results.
+
+    Attributes:
+        vendors (list): The vendors of the page, with 'kms' set when searching by location.
+        total (int): The number of vendors matching the search.
+        next_cursor (str): The cursor of the next page, or None on the last page.
+    """
+    vendors: list = field(default_factory=list)
+    total: int = 0
+    next_cursor: str = None
+
+
+def parse_location(latitude, longitude, radius):
+    """
+    Validates the raw location parameters of a search.
+
+    Args:
+        latitude (str): The latitude.
+        longitude (str): The longitude.
+        radius (str): The radius in kilometers.
+
+    Returns:
+        tuple: The point and the radius in kilometers, or (None, None) if a
+            parameter is missing or invalid.
+    """
+    try:
+        latitude, longitude, radius = float(latitude), float(longitude), float(radius)
+    except (TypeError, ValueError):
+        return None, None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180 and radius > 0):
+        return None, None
+    return Point(longitude, latitude, srid=4326), min(radius, MAX_RADIUS_KM)
+
+
+def encode_cursor(rank, pk, total):
+    return signing.dumps([rank, pk, total], salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor):
+    """
+    Returns the (rank, id, total) of a cursor, or None if it is missing or has been tampered with.
+    """
+    if not cursor:
+        return None
+    try:
+        rank, pk, total = signing.loads(cursor, salt=CURSOR_SALT)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    return rank, pk, total
+
+
+def matching_vendors(keyword):
+    """
+    Returns the approved vendors whose name, food items or categories match the keyword,
+    annotated with their text rank (see marketplace.search_index).
+    """
+    vendors = Vendor.objects.filter(is_approved=True, user__is_active=True)
+    return search_index.filter_vendors(vendors, keyword)
+
+
+def search_vendors(keyword='', point=None, radius_km=None, cursor=None, page_size=SEARCH_PAGE_SIZE):
+    """
+    Returns one page of the vendors matching a search.
+
+    Args:
+        keyword (str): Matched against the search documents of the vendors.
+        point (Point, optional): The location searched around.
+        radius_km (float, optional): The search radius, required with point.
+        cursor (str, optional): The next_cursor of the previous page.
+        page_size (int): The number of vendors per page.
+
+    Returns:
+        SearchPage: The page.
+    """
+    vendors = matching_vendors(keyword).select_related('user_profile')
+    connection = connections[vendors.db]
+
+    if point is not None:
+        if connection.ops.postgis:
+            vendors = vendors.filter(location__dwithin=(point, D(km=radius_km)))
+            rank = GeometryDistance('location', point)
+        else:
+            vendors = vendors.filter(location__distance_lte=(point, D(km=radius_km)))
+            rank = Distance('location', point)
+        vendors = vendors.annotate(rank=rank, distance=Distance('location', point))
+        ordering = ('rank', 'id')
+    else:
+        # without a location the best text matches come first
+        vendors = vendors.annotate(rank=F('text_rank'))
+        ordering = ('-rank', 'id')
+
+    position = decode_cursor(cursor)
+    if position is None:
+        # the first page counts the matches in the same query
+        vendors = vendors.annotate(total=Window(expression=Count('id')))
+    else:
+        rank_value, last_id, total = position
+        if point is not None:
+            rank_filter = D(m=rank_value) if isinstance(rank, Distance) else rank_value
+            vendors = vendors.filter(Q(rank__gt=rank_filter) | Q(rank=rank_filter, id__gt=last_id))
+        else:
+            vendors = vendors.filter(Q(rank__lt=rank_value) | Q(rank=rank_value, id__gt=last_id))
+
+    rows = list(vendors.order_by(*ordering)[:page_size + 1])
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+
+    if position is None:
+        total = rows[0].total if rows else 0
+
+    for vendor in rows:
+        if point is not None:
+            # calculates the distance to each vendor in kilometers
+            vendor.kms = round(vendor.distance.km, 1)
+
+    next_cursor = None
+    if has_next:
+        last = rows[-1]
+        last_rank = last.rank.m if isinstance(last.rank, D) else last.rank
+        next_cursor = encode_cursor(last_rank, last.id, total)
+
+    return SearchPage(vendors=annotate_is_open(rows), total=total, next_cursor=next_cursor)
@@ -0,0 +1,282 @@
+"""
+Vendor full-text search index.
+
+Every vendor has one VendorSearchDocument with the lower-cased text of its name,
+its available food items and its categories. The documents are rebuilt after
+the transaction that changed a Vendor, FoodItem or Category commits (see
+marketplace.signals) and can be rebuilt from scratch with the
+rebuild_search_index management command.
+
+Two backends match a keyword against the documents:
+
+* PostgresSearchBackend: a prefix tsquery ('пиц:*') in the 'simple' configuration
+  against the GIN-indexed weighted tsvector, plus trigram-indexed substring
+  matches on the vendor name and food titles, ranked with ts_rank.
+* MemorySearchBackend: the same matching and weighting done in Python over the
+  documents, so the search works without PostgreSQL (local development, SQLite).
+
+The backend is chosen from the database vendor, or forced with the
+SEARCH_INDEX_BACKEND setting ('postgres' or 'memory').
+"""
+import re
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections, transaction
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast
+
+from menu.models import Category, FoodItem
+from vendor.models import Vendor
+from .models import VendorSearchDocument
+
+# Document field -> tsvector weight, from the most to the least important.
+FIELD_WEIGHTS = (
+    ('vendor_name', 'A'),
+    ('food_titles', 'B'),
+    ('category_names', 'C'),
+    ('descriptions', 'D'),
+)
+# The default ts_rank weights of D, C, B and A, used by the memory backend.
+RANK_WEIGHTS = {'A': 1.0, 'B': 0.4, 'C': 0.2, 'D': 0.1}
+# Fields searched for substrings (trigram-indexed on PostgreSQL).
+SUBSTRING_FIELDS = ('vendor_name', 'food_titles')
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """
+    Splits a text into lower-cased words. Works for Cyrillic and Latin text alike.
+    """
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def _join(values):
+    return ' '.join(value.lower() for value in values if value)
+
+
+def document_vector():
+    """
+    Returns the expression of the weighted tsvector of a document, built from its stored text fields.
+    """
+    vector = None
+    for name, weight in FIELD_WEIGHTS:
+        field_vector = SearchVector(name, weight=weight, config='simple')
+        vector = field_vector if vector is None else vector + field_vector
+    return vector
+
+
+def build_documents(vendor_ids=None):
+    """
+    Builds the search documents of vendors from the database.
+
+    Args:
+        vendor_ids (iterable, optional): The vendors to build. Defaults to all vendors.
+
+    Returns:
+        list: Unsaved VendorSearchDocument instances, one per existing vendor.
+    """
+    vendors = Vendor.objects.all()
+    fooditems = FoodItem.objects.filter(is_available=True)
+    categories = Category.objects.all()
+    if vendor_ids is not None:
+        vendors = vendors.filter(id__in=vendor_ids)
+        fooditems = fooditems.filter(vendor_id__in=vendor_ids)
+        categories = categories.filter(vendor_id__in=vendor_ids)
+
+    texts = defaultdict(lambda: defaultdict(list))
+    for vendor_id, title, description in fooditems.values_list('vendor_id', 'food_title', 'description'):
+        texts[vendor_id]['food_titles'].append(title)
+        texts[vendor_id]['descriptions'].append(description)
+    for vendor_id, name, description in categories.values_list('vendor_id', 'category_name', 'description'):
+        texts[vendor_id]['category_names'].append(name)
+        texts[vendor_id]['descriptions'].append(description)
+
+    return [
+        VendorSearchDocument(
+            vendor_id=vendor_id,
+            vendor_name=_join([vendor_name]),
+            food_titles=_join(texts[vendor_id]['food_titles']),
+            category_names=_join(texts[vendor_id]['category_names']),
+            descriptions=_join(texts[vendor_id]['descriptions']),
+        )
+        for vendor_id, vendor_name in vendors.values_list('id', 'vendor_name')
+    ]
+
+
+def update_documents(vendor_ids):
+    """
+    Rebuilds the search documents of some vendors. Documents of deleted vendors are removed.
+
+    Args:
+        vendor_ids (iterable): The vendors to rebuild.
+
+    Returns:
+        int: The number of documents written.
+    """
+    vendor_ids = set(vendor_ids)
+    documents = build_documents(vendor_ids)
+    with transaction.atomic():
+        VendorSearchDocument.objects.filter(vendor_id__in=vendor_ids).delete()
+        VendorSearchDocument.objects.bulk_create(documents, batch_size=500)
+        get_backend().refresh(vendor_ids)
+    return len(documents)
+
+
+def rebuild_index():
+    """
+    Rebuilds the search documents of all vendors.
+
+    Returns:
+        int: The number of documents written.
+    """
+    documents = build_documents()
+    with transaction.atomic():
+        VendorSearchDocument.objects.all().delete()
+        VendorSearchDocument.objects.bulk_create(documents, batch_size=500)
+        get_backend().refresh()
+    return len(documents)
+
+
+_pending = threading.local()
+
+
+def _flush_pending():
+    vendor_ids = getattr(_pending, 'vendor_ids', None)
+    _pending.vendor_ids = None
+    if vendor_ids:
+        update_documents(vendor_ids)
+
+
+def schedule_update(vendor_id):
+    """
+    Rebuilds the search document of a vendor once the current transaction commits.
+
+    Several changes of the same vendor in one transaction (e.g. deleting a category
+    and, through the cascade, its food items) rebuild the document only once: the
+    first of their hooks rebuilds the documents of all pending vendors and the
+    others find nothing left to do.
+
+    Args:
+        vendor_id (int): The vendor whose text changed.
+    """
+    if getattr(_pending, 'vendor_ids', None) is None:
+        _pending.vendor_ids = set()
+    _pending.vendor_ids.add(vendor_id)
+    # one hook per change, as the hooks of a rolled back savepoint are dropped; the ids
+    # of a rolled back transaction are rebuilt with the next flush, from the committed data
+    transaction.on_commit(_flush_pending)
+
+
+class PostgresSearchBackend:
+    """
+    Matches keywords with the GIN-indexed tsvector and the trigram indexes of PostgreSQL.
+    """
+
+    def refresh(self, vendor_ids=None):
+        """
+        Recomputes the stored tsvector of the documents.
+        """
+        documents = VendorSearchDocument.objects.all()
+        if vendor_ids is not None:
+            documents = documents.filter(vendor_id__in=vendor_ids)
+        documents.update(search_vector=document_vector())
+
+    def filter(self, vendors, keyword):
+        tokens = tokenize(keyword)
+        if not tokens:
+            return vendors.annotate(text_rank=Value(0.0, output_field=FloatField()))
+        # every word has to match the beginning of a word of the document
+        query = SearchQuery(' & '.join(f'{token}:*' for token in tokens), search_type='raw', config='simple')
+        phrase = ' '.join(tokens)
+        matches = Q(search_document__search_vector=query)
+        for name in SUBSTRING_FIELDS:
+            matches |= Q(**{f'search_document__{name}__contains': phrase})
+        # cast the real ts_rank to double precision, so it survives the search cursor unchanged
+        rank = Cast(SearchRank(F('search_document__search_vector'), query), output_field=FloatField())
+        return vendors.filter(matches).annotate(text_rank=rank)
+
+
+class MemorySearchBackend:
+    """
+    Matches keywords in Python, with the same rules and weights as the PostgreSQL backend.
+    """
+
+    def refresh(self, vendor_ids=None):
+        pass
+
+    def score(self, document, tokens, phrase):
+        """
+        Returns the rank of a document, or None if it does not match.
+        """
+        fields = {name: tokenize(getattr(document, name)) for name, weight in FIELD_WEIGHTS}
+        rank = 0.0
+        for token in tokens:
+            matched = False
+            for name, weight in FIELD_WEIGHTS:
+                hits = sum(1 for word in fields[name] if word.startswith(token))
+                if hits:
+                    matched = True
+                    rank += RANK_WEIGHTS[weight] * hits
+            if not matched:
+                break
+        else:
+            return rank / len(tokens)
+        if any(phrase in getattr(document, name) for name in SUBSTRING_FIELDS):
+            return 0.0
+        return None
+
+    def search(self, keyword, vendor_ids=None):
+        """
+        Returns the matching vendors as {vendor_id: rank}.
+        """
+        tokens = tokenize(keyword)
+        phrase = ' '.join(tokens)
+        documents = VendorSearchDocument.objects.all()
+        if vendor_ids is not None:
+            documents = documents.filter(vendor_id__in=vendor_ids)
+        ranks = {}
+        for document in documents:
+            rank = self.score(document, tokens, phrase)
+            if rank is not None:
+                ranks[document.vendor_id] = rank
+        return ranks
+
+    def filter(self, vendors, keyword):
+        if not tokenize(keyword):
+            return vendors.annotate(text_rank=Value(0.0, output_field=FloatField()))
+        ranks = self.search(keyword)
+        if not ranks:
+            return vendors.none().annotate(text_rank=Value(0.0, output_field=FloatField()))
+        rank = Case(
+            *[When(id=vendor_id, then=Value(value)) for vendor_id, value in ranks.items()],
+            output_field=FloatField(),
+        )
+        return vendors.filter(id__in=list(ranks)).annotate(text_rank=rank)
+
+
+def get_backend(using='default'):
+    """
+    Returns the search backend of a database.
+    """
+    name = getattr(settings, 'SEARCH_INDEX_BACKEND', None)
+    if name is None:
+        name = 'postgres' if connections[using].vendor == 'postgresql' else 'memory'
+    return PostgresSearchBackend() if name == 'postgres' else MemorySearchBackend()
+
+
+def filter_vendors(vendors, keyword):
+    """
+    Narrows a vendor queryset to the vendors matching a keyword.
+
+    Args:
+        vendors (QuerySet): The vendors to search.
+        keyword (str): The words searched for; each word matches the beginning of a word.
+
+    Returns:
+        QuerySet: The matching vendors annotated with 'text_rank' (higher is better).
+    """
+    return get_backend(vendors.db).filter(vendors, keyword)
@@ -0,0 +1,81 @@
+from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.dispatch import receiver
+from accounts.models import UserProfile
+from menu.models import Category, FoodItem
+from takeawaysite.images import derivatives_built
+from vendor.models import OpeningHour, Vendor
+from .search_index import schedule_update
+from .menu_cache import bump_menu_version
+
+@receiver(post_save, sender=Vendor)
+@receiver(post_save, sender=FoodItem)
+@receiver(post_delete, sender=FoodItem)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def search_text_changed_receiver(sender, instance, **kwargs):
+    """
+    Signal receiver that rebuilds the vendor's search document after a change of its
+    name, food items or categories has been committed. Documents of deleted vendors
+    are removed by the cascade, and vendor saves that keep the name are skipped.
+
+    Args:
+        sender (Model class): The model class that sent the signal.
+        instance (Vendor, FoodItem or Category): The instance that was saved or deleted.
+        **kwargs: Additional keyword arguments.
+    """
+    if sender is Vendor:
+        if not kwargs.get('created') and not instance.has_changed('vendor_name'):
+            return
+        schedule_update(instance.id)
+    else:
+        schedule_update(instance.vendor_id)
+
+
+@receiver(post_save, sender=Vendor)
+@receiver(post_delete, sender=Vendor)
+@receiver(post_save, sender=FoodItem)
+@receiver(post_delete, sender=FoodItem)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=OpeningHour)
+@receiver(post_delete, sender=OpeningHour)
+@receiver(post_save, sender=UserProfile)
+def menu_changed_receiver(sender, instance, **kwargs):
+    """
+    Signal receiver that invalidates the cached menu of a vendor once a change of the
+    vendor, its profile, categories, food items or opening hours has been committed.
+
+    Args:
+        sender (Model class): The model class that sent the signal.
+        instance (Model): The instance that was saved or deleted.
+        **kwargs: Additional keyword arguments.
+    """
+    if sender is Vendor:
+        vendor_ids = [instance.id]
+    elif sender is UserProfile:
+        vendor_ids = list(Vendor.objects.filter(user_profile=instance).values_list('id', flat=True))
+    else:
+        vendor_ids = [instance.vendor_id]
+    for vendor_id in vendor_ids:
+        transaction.on_commit(lambda vendor_id=vendor_id: bump_menu_version(vendor_id))
+
+
+@receiver(derivatives_built, sender=FoodItem)
+@receiver(derivatives_built, sender=UserProfile)
+def derivatives_built_receiver(sender, pk, **kwargs):
+    """
+    Signal receiver that invalidates the cached menus showing an image once its new
+    derivatives have been stored, so they link to the resized copies.
+
+    Args:
+        sender (Model class): FoodItem or UserProfile.
+        pk (int): The instance whose derivatives were stored.
+        **kwargs: Additional keyword arguments.
+    """
+    if sender is FoodItem:
+        vendors = Vendor.objects.filter(fooditem__pk=pk)
+    else:
+        vendors = Vendor.objects.filter(user_profile_id=pk)
+    for vendor_id in vendors.values_list('id', flat=True):
+        transaction.on_commit(lambda vendor_id=vendor_id: bump_menu_version(vendor_id))
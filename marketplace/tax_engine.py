@@ -0,0 +1,191 @@
+"""
+Tax engine.
+
+The active Tax rows are compiled into a list of rules, once per process:
+
+* a percentage rule (tax_value of 0) charges tax_percentage of every vendor's
+  subtotal, e.g. the VAT,
+* a fixed rule (a tax_value) charges tax_value once per order, e.g. the
+  delivery fee, or once per vendor of the order when the Tax is per_vendor.
+
+The compiled rules are kept in memory with the version of the Tax table they
+were built from: the number of taxes and the time of the last change, read
+from the database with one small query per call. A change of a Tax in any
+process is therefore seen by every process on its next call.
+
+All amounts are Decimals rounded half up to the cent, and the tax breakdowns
+keep the {'tax_type': {'tax_percentage or tax_value': tax_amount}} format of
+the orders' tax_data.
+"""
+import threading
+from dataclasses import dataclass
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db.models import Count, Max
+
+from .models import Tax
+
+CENT = Decimal('0.01')
+
+PERCENTAGE = 'percentage'
+FIXED = 'fixed'
+
+
+def round_amount(amount):
+    """
+    Rounds an amount half up to the cent.
+    """
+    return Decimal(amount).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+@dataclass(frozen=True)
+class TaxRule:
+    """
+    One active tax.
+
+    Attributes:
+        tax_type (str): The name of the tax, the key of the tax breakdowns.
+        kind (str): PERCENTAGE or FIXED.
+        rate (Decimal): The percentage of a PERCENTAGE rule, or the amount of a FIXED rule.
+        per_vendor (bool): Whether a FIXED rule is charged once per vendor instead of once per order.
+    """
+    tax_type: str
+    kind: str
+    rate: Decimal
+    per_vendor: bool = False
+
+    @property
+    def key(self):
+        return str(self.rate)
+
+    def amount(self, subtotal):
+        """
+        Returns the tax of one subtotal, a vendor's or the whole order's.
+        """
+        if self.kind == PERCENTAGE:
+            return round_amount(self.rate * subtotal / 100)
+        return self.rate
+
+
+def compile_rules(taxes):
+    """
+    Compiles Tax rows into rules.
+
+    Args:
+        taxes (iterable): The active Tax instances.
+
+    Returns:
+        list: The TaxRule of every tax, in the order of the rows.
+    """
+    rules = []
+    for tax in taxes:
+        if tax.tax_value:
+            rules.append(TaxRule(tax.tax_type, FIXED, round_amount(tax.tax_value), tax.per_vendor))
+        else:
+            rules.append(TaxRule(tax.tax_type, PERCENTAGE, tax.tax_percentage or Decimal('0')))
+    return rules
+
+
+class TaxEngine:
+    """
+    Computes the tax breakdowns of a cart or an order from compiled rules.
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+
+    def order_taxes(self, subtotal, vendor_count=1):
+        """
+        Returns the tax breakdown of a whole order.
+
+        Args:
+            subtotal (Decimal): The price of all items.
+            vendor_count (int): The number of vendors of the order, for the per-vendor fees.
+
+        Returns:
+            dict: {'tax_type': {'tax_percentage': tax_amount}}
+        """
+        tax_dict = {}
+        for rule in self.rules:
+            amount = rule.amount(subtotal)
+            if rule.per_vendor:
+                amount *= vendor_count
+            tax_dict[rule.tax_type] = {rule.key: amount}
+        return tax_dict
+
+    def vendor_taxes(self, subtotal):
+        """
+        Returns the tax breakdown of a vendor's part of an order. The fees charged
+        once per order are not part of it.
+
+        Args:
+            subtotal (Decimal): The price of the vendor's items.
+
+        Returns:
+            dict: {'tax_type': {'tax_percentage': tax_amount}}
+        """
+        return {
+            rule.tax_type: {rule.key: rule.amount(subtotal)}
+            for rule in self.rules
+            if rule.kind == PERCENTAGE or rule.per_vendor
+        }
+
+    def breakdown(self, vendor_subtotals):
+        """
+        Computes the taxes of an order and of every vendor's part of it.
+
+        Args:
+            vendor_subtotals (dict): {vendor_id: subtotal}
+
+        Returns:
+            tuple: The order's tax breakdown and {vendor_id: tax breakdown}.
+        """
+        subtotal = sum(vendor_subtotals.values(), Decimal('0'))
+        vendor_taxes = {vendor_id: self.vendor_taxes(vendor_subtotal) for vendor_id, vendor_subtotal in vendor_subtotals.items()}
+        return self.order_taxes(subtotal, len(vendor_subtotals)), vendor_taxes
+
+
+_lock = threading.Lock()
+_loaded = {'engine': None, 'version': None}
+
+
+def get_tax_version():
+    """
+    Returns the version of the tax rules: it changes whenever a Tax is added, saved or deleted.
+    """
+    version = Tax.objects.aggregate(count=Count('pk'), updated_at=Max('updated_at'))
+    return version['count'], version['updated_at']
+
+
+def load_tax_engine():
+    """
+    Returns a tax engine of the active taxes read from the database now.
+    """
+    return TaxEngine(compile_rules(Tax.objects.filter(is_active=True).order_by('pk')))
+
+
+def get_tax_engine():
+    """
+    Returns the tax engine of the active taxes.
+
+    The engine is built once per process and version, so the taxes are only read
+    and compiled again after a Tax has changed.
+
+    Returns:
+        TaxEngine: The engine.
+    """
+    version = get_tax_version()
+    loaded = _loaded
+    if loaded['engine'] is not None and loaded['version'] == version:
+        return loaded['engine']
+    with _lock:
+        if loaded['version'] != version:
+            loaded.update(engine=load_tax_engine(), version=version)
+        return loaded['engine']
+
+
+def sum_tax_dict(tax_dict):
+    """
+    Returns the total of a tax breakdown.
+    """
+    return sum((amount for amounts in tax_dict.values() for amount in amounts.values()), Decimal('0'))
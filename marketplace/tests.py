@@ -1,3 +1,348 @@
-from django.test import TestCase
+import json
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from takeawaysite.testing import QueryBudgetTestCase, create_food, create_user, create_vendor
+from vendor.models import Vendor
+from .cart import MAX_BATCH_OPERATIONS, MAX_DELTA, parse_cart_operations
+from . import search_index, tax_engine
+from .menu_cache import get_vendor_menu
+from .models import Cart, Tax, VendorSearchDocument
+from .nearby import nearby_vendors
+from .tax_engine import FIXED, PERCENTAGE, TaxEngine, TaxRule, compile_rules, get_tax_engine
+
+
+class MenuCacheTests(TestCase):
+
+    def test_a_committed_food_change_invalidates_the_menu(self):
+        vendor = create_vendor('pizzeria')
+        food = create_food(vendor, 'Margherita', Decimal('9.50'))
+        menu = get_vendor_menu('pizzeria')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            food.price = Decimal('11.00')
+            food.save()
+
+        version = Vendor.objects.values_list('menu_version', flat=True).get(pk=vendor.pk)
+        self.assertGreater(version, menu['version'])
+        fresh = get_vendor_menu('pizzeria')
+        self.assertEqual(fresh['version'], version)
+        self.assertEqual(fresh['categories'][0].fooditems.all()[0].price, Decimal('11.00'))
+
+    def test_a_committed_vendor_save_invalidates_the_menu(self):
+        vendor = create_vendor('pizzeria')
+        menu = get_vendor_menu('pizzeria')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            vendor.vendor_name = 'Pizzeria Napoli'
+            vendor.save()
+
+        fresh = get_vendor_menu('pizzeria')
+        self.assertGreater(fresh['version'], menu['version'])
+        self.assertEqual(fresh['vendor'].vendor_name, 'Pizzeria Napoli')
+
+
+class SearchIndexTests(TestCase):
+
+    def setUp(self):
+        search_index._pending.vendor_ids = None
+        self.addCleanup(setattr, search_index._pending, 'vendor_ids', None)
+        patcher = mock.patch.object(search_index, 'update_documents', wraps=search_index.update_documents)
+        self.update_documents = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_changes_of_a_transaction_update_the_index_once_after_the_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                vendor = create_vendor('pizzeria')
+                create_food(vendor, 'Margherita', Decimal('9.50'))
+                create_food(vendor, 'Calzone', Decimal('11.00'), category_name='Oven')
+            self.update_documents.assert_not_called()
+
+        self.update_documents.assert_called_once_with({vendor.id})
+        document = VendorSearchDocument.objects.get(vendor=vendor)
+        self.assertEqual(document.vendor_name, 'pizzeria')
+        self.assertEqual(sorted(document.food_titles.split()), ['calzone', 'margherita'])
+        self.assertEqual(sorted(document.category_names.split()), ['main', 'oven'])
+
+    def test_a_rolled_back_change_does_not_update_the_index(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            vendor = create_vendor('pizzeria')
+        self.update_documents.reset_mock()
+
+        with self.captureOnCommitCallbacks(execute=True), self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                create_food(vendor, 'Margherita', Decimal('9.50'))
+                raise RuntimeError('the food item was not saved')
+
+        self.update_documents.assert_not_called()
+        self.assertEqual(VendorSearchDocument.objects.get(vendor=vendor).food_titles, '')
+
+
+class SearchBackendTests(TestCase):
+
+    def setUp(self):
+        self.napoli = create_vendor('napoli')
+        create_food(self.napoli, 'Пица Маргарита', Decimal('9.50'), category_name='Пици')
+        self.kebab_house = create_vendor('kebab-house')
+        self.kebab_house.vendor_name = 'Kebab House'
+        self.kebab_house.save()
+        self.grill = create_vendor('grill')
+        create_food(self.grill, 'Kebab', Decimal('7.00'))
+
+    def matches(self, keyword):
+        vendors = search_index.filter_vendors(Vendor.objects.all(), keyword).order_by('-text_rank', 'id')
+        return list(vendors.values_list('vendor_slug', flat=True))
+
+    def test_both_backends_match_alike(self):
+        for backend in ('postgres', 'memory'):
+            with self.subTest(backend=backend), override_settings(SEARCH_INDEX_BACKEND=backend):
+                search_index.rebuild_index()
+                self.assertEqual(self.matches('пиц'), ['napoli'])
+                self.assertEqual(self.matches('ПИЦА марг'), ['napoli'])
+                self.assertEqual(self.matches('пици'), ['napoli'])
+                # a match on the name ranks before a match on a food item
+                self.assertEqual(self.matches('kebab'), ['kebab-house', 'grill'])
+                self.assertEqual(self.matches('sushi'), [])
+                self.assertEqual(len(self.matches('')), 3)
+
+
+class TaxEngineTests(SimpleTestCase):
+
+    def setUp(self):
+        self.engine = TaxEngine(compile_rules([
+            SimpleNamespace(tax_type='ДДС', tax_percentage=Decimal('20.00'), tax_value=Decimal('0.00'), per_vendor=False),
+            SimpleNamespace(tax_type='Delivery', tax_percentage=None, tax_value=Decimal('5.00'), per_vendor=False),
+            SimpleNamespace(tax_type='Packaging', tax_percentage=None, tax_value=Decimal('1.00'), per_vendor=True),
+        ]))
+
+    def test_compile_rules(self):
+        self.assertEqual(self.engine.rules, [
+            TaxRule('ДДС', PERCENTAGE, Decimal('20.00')),
+            TaxRule('Delivery', FIXED, Decimal('5.00')),
+            TaxRule('Packaging', FIXED, Decimal('1.00'), per_vendor=True),
+        ])
+
+    def test_percentages_are_rounded_half_up_to_the_cent(self):
+        engine = TaxEngine([TaxRule('ДДС', PERCENTAGE, Decimal('5.00'))])
+        self.assertEqual(engine.order_taxes(Decimal('0.50')), {'ДДС': {'5.00': Decimal('0.03')}})
+        self.assertEqual(engine.order_taxes(Decimal('0.49')), {'ДДС': {'5.00': Decimal('0.02')}})
+
+    def test_order_taxes_charge_the_per_vendor_fees_per_vendor(self):
+        self.assertEqual(self.engine.order_taxes(Decimal('30.05'), vendor_count=2), {
+            'ДДС': {'20.00': Decimal('6.01')},
+            'Delivery': {'5.00': Decimal('5.00')},
+            'Packaging': {'1.00': Decimal('2.00')},
+        })
+
+    def test_vendor_taxes_leave_out_the_fees_of_the_order(self):
+        self.assertEqual(self.engine.vendor_taxes(Decimal('20.05')), {
+            'ДДС': {'20.00': Decimal('4.01')},
+            'Packaging': {'1.00': Decimal('1.00')},
+        })
+
+    def test_breakdown(self):
+        order_taxes, vendor_taxes = self.engine.breakdown({1: Decimal('10.00'), 2: Decimal('20.05')})
+
+        self.assertEqual(order_taxes, self.engine.order_taxes(Decimal('30.05'), vendor_count=2))
+        self.assertEqual(vendor_taxes, {
+            1: {'ДДС': {'20.00': Decimal('2.00')}, 'Packaging': {'1.00': Decimal('1.00')}},
+            2: {'ДДС': {'20.00': Decimal('4.01')}, 'Packaging': {'1.00': Decimal('1.00')}},
+        })
+
+
+class TaxEngineVersionTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.dict(tax_engine._loaded, engine=None, version=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def taxes(self, subtotal=Decimal('10.00')):
+        return get_tax_engine().order_taxes(subtotal)
+
+    def test_a_changed_tax_reloads_the_rules(self):
+        vat = Tax.objects.create(tax_type='ДДС', tax_percentage=Decimal('20.00'), tax_value=Decimal('0.00'))
+        self.assertEqual(self.taxes(), {'ДДС': {'20.00': Decimal('2.00')}})
+        # a current engine costs only the version query
+        with self.assertNumQueries(1):
+            self.taxes()
+
+        vat.tax_percentage = Decimal('9.00')
+        vat.save()
+        self.assertEqual(self.taxes(), {'ДДС': {'9.00': Decimal('0.90')}})
+
+        delivery = Tax.objects.create(tax_type='Delivery', tax_percentage=Decimal('0.00'), tax_value=Decimal('5.00'))
+        self.assertEqual(self.taxes(), {'ДДС': {'9.00': Decimal('0.90')}, 'Delivery': {'5.00': Decimal('5.00')}})
+
+        vat.delete()
+        self.assertEqual(self.taxes(), {'Delivery': {'5.00': Decimal('5.00')}})
+
+        delivery.is_active = False
+        delivery.save()
+        self.assertEqual(self.taxes(), {})
+
+
+class NearbyVendorsTests(TestCase):
+
+    def nearby(self):
+        return [vendor.vendor_slug for vendor in nearby_vendors(23.3219, 42.6977)]
+
+    def test_the_cached_vendors_follow_the_changes_of_the_vendors(self):
+        create_vendor('pizzeria', latitude='42.6980', longitude='23.3220')
+        self.assertEqual(self.nearby(), ['pizzeria'])
+
+        grill = create_vendor('grill', latitude='42.6977', longitude='23.3219', is_approved=False)
+        self.assertEqual(self.nearby(), ['pizzeria'])
+        grill.is_approved = True
+        grill.save()
+        self.assertEqual(self.nearby(), ['grill', 'pizzeria'])
+
+        profile = grill.user_profile
+        profile.latitude, profile.longitude = '10.0000', '100.0000'
+        profile.save()
+        self.assertEqual(self.nearby(), ['pizzeria'])
+
+
+class ParseCartOperationsTests(SimpleTestCase):
+
+    def test_sums_the_deltas_per_food_item(self):
+        operations = [{'food_id': 3, 'delta': 2}, {'food_id': 5, 'delta': -1}, {'food_id': 3, 'delta': 1}]
+        self.assertEqual(parse_cart_operations(operations), {3: 3, 5: -1})
+
+    def test_rejects_an_empty_or_too_long_batch(self):
+        for operations in ([], None, {'food_id': 1, 'delta': 1}, [{'food_id': 1, 'delta': 1}] * (MAX_BATCH_OPERATIONS + 1)):
+            with self.subTest(operations=operations), self.assertRaises(ValueError):
+                parse_cart_operations(operations)
+
+    def test_rejects_malformed_operations(self):
+        for operation in ({'food_id': 1}, {'delta': 1}, 'x', {'food_id': '1', 'delta': 1},
+                          {'food_id': 1, 'delta': 1.5}, {'food_id': True, 'delta': 1}, {'food_id': 0, 'delta': 1}):
+            with self.subTest(operation=operation), self.assertRaises(ValueError):
+                parse_cart_operations([operation])
+
+    def test_limits_the_summed_delta(self):
+        self.assertEqual(parse_cart_operations([{'food_id': 1, 'delta': MAX_DELTA}]), {1: MAX_DELTA})
+        with self.assertRaises(ValueError):
+            parse_cart_operations([{'food_id': 1, 'delta': MAX_DELTA}, {'food_id': 1, 'delta': 1}])
+        with self.assertRaises(ValueError):
+            parse_cart_operations([{'food_id': 1, 'delta': -MAX_DELTA - 1}])
+
+
+class CartBatchTests(TestCase):
+
+    def setUp(self):
+        vendor = create_vendor('pizzeria')
+        self.pizza = create_food(vendor, 'Margherita', Decimal('9.50'))
+        self.salad = create_food(vendor, 'Shopska', Decimal('6.00'))
+        self.customer = create_user('maria')
+        self.client.force_login(self.customer)
+
+    def post_ops(self, ops):
+        return self.client.post(
+            reverse('cart_batch'), json.dumps({'ops': ops}),
+            content_type='application/json', HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        ).json()
+
+    def quantities(self):
+        return dict(Cart.objects.filter(user=self.customer).values_list('fooditem_id', 'quantity'))
+
+    def test_applies_the_batch(self):
+        Cart.objects.create(user=self.customer, fooditem=self.salad, quantity=2)
+
+        response = self.post_ops([{'food_id': self.pizza.id, 'delta': 3}, {'food_id': self.salad.id, 'delta': -1}])
+
+        self.assertEqual(response['status'], 'Success')
+        self.assertEqual(response['lines'], {str(self.pizza.id): 3, str(self.salad.id): 1})
+        self.assertEqual(response['cart_counter']['cart_count'], 4)
+        self.assertEqual(self.quantities(), {self.pizza.id: 3, self.salad.id: 1})
+
+    def test_unknown_food_items_are_skipped(self):
+        response = self.post_ops([{'food_id': self.pizza.id, 'delta': 1}, {'food_id': self.salad.id + 1000, 'delta': 2}])
+
+        self.assertEqual(response['lines'], {str(self.pizza.id): 1, str(self.salad.id + 1000): 0})
+        self.assertEqual(self.quantities(), {self.pizza.id: 1})
+
+    def test_a_zero_delta_reads_the_quantity(self):
+        Cart.objects.create(user=self.customer, fooditem=self.pizza, quantity=4)
+
+        response = self.post_ops([{'food_id': self.pizza.id, 'delta': 0}, {'food_id': self.salad.id, 'delta': 0}])
+
+        self.assertEqual(response['lines'], {str(self.pizza.id): 4, str(self.salad.id): 0})
+        self.assertEqual(self.quantities(), {self.pizza.id: 4})
+
+    def test_an_invalid_batch_changes_nothing(self):
+        for ops in ([{'food_id': self.pizza.id, 'delta': MAX_DELTA + 1}],
+                    [{'food_id': self.pizza.id, 'delta': 1}] * (MAX_BATCH_OPERATIONS + 1),
+                    [{'food_id': str(self.pizza.id), 'delta': 1}]):
+            with self.subTest(ops=len(ops)):
+                self.assertEqual(self.post_ops(ops)['status'], 'Failed')
+        self.assertEqual(self.quantities(), {})
+
+    def test_needs_a_login(self):
+        self.client.logout()
+        self.assertEqual(self.post_ops([{'food_id': self.pizza.id, 'delta': 1}])['status'], 'login_required')
+
+
+class QueryBudgetTests(QueryBudgetTestCase):
+    """
+    The marketplace pages stay within their query budgets with several vendors,
+    food items and cart lines, so a query per vendor or per line fails them.
+    """
+
+    def setUp(self):
+        self.foods = []
+        for index, name in enumerate(('pizzeria', 'grill', 'bistro', 'bakery')):
+            vendor = create_vendor(name, latitude=f'42.69{index}', longitude=f'23.32{index}')
+            for category in ('Main', 'Dessert'):
+                for number in range(2):
+                    self.foods.append(create_food(vendor, f'{name} {category} {number}', Decimal('5.00') + number, category))
+        self.customer = create_user('maria')
+        self.client.force_login(self.customer)
+        for fooditem in self.foods[::3]:
+            Cart.objects.create(user=self.customer, fooditem=fooditem, quantity=2)
+
+    def test_home(self):
+        self.assertWithinBudget(self.client.get(reverse('home')), 'home')
+
+    def test_home_near_a_location(self):
+        response = self.client.get(reverse('home'), {'lat': '42.6977', 'lng': '23.3219'})
+        self.assertWithinBudget(response, 'home')
+
+    def test_marketplace(self):
+        response = self.client.get(reverse('marketplace'))
+        self.assertWithinBudget(response, 'marketplace')
+        self.assertContains(response, 'Bakery')
+
+    def test_vendor_detail(self):
+        response = self.client.get(reverse('vendor_detail', args=['pizzeria']))
+        self.assertWithinBudget(response, 'vendor_detail')
+        self.assertContains(response, 'pizzeria Dessert 1')
+
+    def test_search(self):
+        response = self.client.get(reverse('search'), {
+            'address': 'Sofia', 'lat': '42.6977', 'lng': '23.3219', 'radius': '25', 'keyword': '',
+        })
+        self.assertWithinBudget(response, 'search')
+
+    def test_cart(self):
+        response = self.client.get(reverse('cart'))
+        self.assertWithinBudget(response, 'cart')
+        self.assertContains(response, self.foods[3].food_title)
+
+    def test_checkout(self):
+        self.assertWithinBudget(self.client.get(reverse('checkout')), 'checkout')
+
+    def test_cart_batch(self):
+        ops = [{'food_id': fooditem.id, 'delta': 1} for fooditem in self.foods[:3]]
+        response = self.client.post(
+            reverse('cart_batch'), json.dumps({'ops': ops}),
+            content_type='application/json', HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        self.assertWithinBudget(response, 'cart_batch')
+        self.assertEqual(response.json()['status'], 'Success')
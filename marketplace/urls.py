@@ -14,4 +14,7 @@ urlpatterns = [
 
     # DELETE CART ITEM
     path('delete_cart/<int:cart_id>/', views.delete_cart, name='delete_cart'),
+
+    # BATCH OF CART CHANGES
+    path('cart/batch/', views.cart_batch, name='cart_batch'),
 ]
\ No newline at end of file
@@ -1,22 +1,31 @@
-from django.shortcuts import render, get_object_or_404, redirect
+import json
+
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect
 from django.http import HttpResponse, JsonResponse
-from django.db.models import Prefetch
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q
-from django.contrib.gis.geos import GEOSGeometry
-from django.contrib.gis.measure import D  # ``D`` is a shortcut for ``Distance``
-from django.contrib.gis.db.models.functions import Distance
-
-from vendor.models import Vendor, OpeningHour
-from menu.models import Category, FoodItem
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from takeawaysite.db_router import use_replica
+from vendor.models import Vendor
+from vendor.schedule import annotate_is_open
+from menu.models import FoodItem
 from accounts.models import UserProfile
 from marketplace.models import Cart
 from orders.forms import OrderForm
-from marketplace.context_processors import get_cart_counter, get_cart_amounts
-from datetime import date, datetime
+from marketplace.search import parse_location, search_vendors
+from marketplace.menu_cache import get_vendor_menu, render_menu_fragment
+from marketplace.cart import (
+    get_cart_partition, cart_counter_data, cart_amounts_data,
+    add_cart_item, decrease_cart_item, delete_cart_item,
+    apply_cart_changes, parse_cart_operations,
+)
 
 # Create your views here.
 
+@use_replica
 def marketplace(request):
     """
     View function for displaying the marketplace with a list of approved vendors.
@@ -27,14 +36,17 @@ def marketplace(request):
     Returns:
         HttpResponse: Rendered HTML page with the list of approved vendors.
     """
-    vendors = Vendor.objects.filter(is_approved=True, user__is_active=True)
-    vendor_count = vendors.count()
+    # the open/closed status of every vendor is resolved in one pass from the loaded rows
+    vendors = annotate_is_open(Vendor.objects.filter(is_approved=True, user__is_active=True).select_related('user_profile'))
+    vendor_count = len(vendors)
     context = {
         'vendors': vendors,
         'vendor_count': vendor_count,
     }
     return render(request, 'marketplace/listings.html', context)
 
+@ensure_csrf_cookie
+@use_replica
 def vendor_detail(request, vendor_slug):
     """
     View function for displaying the details of a specific vendor.
@@ -46,22 +58,14 @@ def vendor_detail(request, vendor_slug):
     Returns:
         HttpResponse: Rendered HTML page with the vendor details, categories, and opening hours.
     """
-    vendor = get_object_or_404(Vendor, vendor_slug=vendor_slug)
-
-    categories = Category.objects.filter(vendor=vendor).prefetch_related(
-        Prefetch(
-            'fooditems',
-            queryset = FoodItem.objects.filter(is_available=True)
-        )
-    ).order_by('created_at')
+    # the vendor, its categories and food items and its opening hours come from the menu cache
+    menu = get_vendor_menu(vendor_slug)
+    vendor = menu['vendor']
+    opening_hours = menu['opening_hours']
 
-    opening_hours = OpeningHour.objects.filter(vendor=vendor).order_by('day', '-from_hour')
-    
     # Check current day's opening hours.
-    today_date = date.today()
-    today = today_date.isoweekday()
-    
-    current_opening_hours = OpeningHour.objects.filter(vendor=vendor, day=today)
+    today = timezone.localdate().isoweekday()
+    current_opening_hours = [hour for hour in opening_hours if hour.day == today]
 
     if request.user.is_authenticated:
         cart_items = Cart.objects.filter(user=request.user)
@@ -69,7 +73,7 @@ def vendor_detail(request, vendor_slug):
         cart_items = None
     context = {
         'vendor': vendor,
-        'categories': categories,
+        'menu_html': mark_safe(render_menu_fragment(menu)),
         'cart_items': cart_items,
         'opening_hours': opening_hours,
         'current_opening_hours': current_opening_hours,
@@ -77,10 +81,21 @@ def vendor_detail(request, vendor_slug):
     return render(request, 'marketplace/vendor_detail.html', context)
 
 
-def add_to_cart(request, food_id):
+def is_ajax(request):
+    """
+    Checks if the request was made via AJAX. This helps prevent unwanted access to the cart endpoints from direct GET requests.
+    """
+    return request.headers.get('x-requested-with') == 'XMLHttpRequest'
+
+
+async def add_to_cart(request, food_id):
     """
     View function to add a food item to the cart.
 
+    The view is async: under ASGI (takeawaysite.asgi) a click does not hold a worker
+    thread while it waits for the database. The quantity is increased with a single
+    upsert and the response is computed in the same database call.
+
     Args:
         request (HttpRequest): The request object.
         food_id (int): The ID of the food item.
@@ -89,32 +104,23 @@ def add_to_cart(request, food_id):
         JsonResponse: JSON response with the status of the operation.
     """
     # it is checked whether the user is authentic (logged in). This ensures that only registered users can add products to the cart.
-    if request.user.is_authenticated:
-        # checking if the request was made via AJAX using request.headers.get('x-requested-with'). This helps prevent unwanted access to the function from direct GET requests, assuming that only AJAX requests are valid.
-        if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-            # checking if the food item exists
-            try:
-                fooditem = FoodItem.objects.get(id=food_id)
-                # Checking if the user has already added this product to their cart
-                try:
-                    chkCart = Cart.objects.get(user=request.user, fooditem=fooditem)
-                    # If the product has been added and needs to be added again, the amount in the cart is increased
-                    chkCart.quantity += 1
-                    chkCart.save()
-                    return JsonResponse({'status': 'Success', 'message': 'Increased the cart quantity', 'cart_counter': get_cart_counter(request), 'qty': chkCart.quantity, 'cart_amount': get_cart_amounts(request)})
-                except:
-                    # the second option is if the product is yet to be added to the cart
-                    chkCart = Cart.objects.create(user=request.user, fooditem=fooditem, quantity=1)
-                    return JsonResponse({'status': 'Success', 'message': 'Арикулът е добавен успешно', 'cart_counter': get_cart_counter(request), 'qty': chkCart.quantity, 'cart_amount': get_cart_amounts(request)})
-            except:
-                return JsonResponse({'status': 'Failed', 'message': 'Тази храна не съществува в кошницата!'})
-        else:
-            return JsonResponse({'status': 'Failed', 'message': 'Invalid request!'})
-    else:
+    user = await request.auser()
+    if not user.is_authenticated:
         return JsonResponse({'status': 'login_required', 'message': 'Моля, влезте в профила си, за да продължите!'})
+    if not is_ajax(request):
+        return JsonResponse({'status': 'Failed', 'message': 'Invalid request!'})
+
+    try:
+        quantity, summary = await sync_to_async(add_cart_item)(user, food_id)
+    except FoodItem.DoesNotExist:
+        return JsonResponse({'status': 'Failed', 'message': 'Тази храна не съществува в кошницата!'})
 
+    # a quantity of 1 means that the product has just been added to the cart
+    message = 'Арикулът е добавен успешно' if quantity == 1 else 'Increased the cart quantity'
+    return JsonResponse({'status': 'Success', 'message': message, 'cart_counter': cart_counter_data(summary), 'qty': quantity, 'cart_amount': cart_amounts_data(summary)})
 
-def decrease_cart(request, food_id):
+
+async def decrease_cart(request, food_id):
     """
     View function to decrease the quantity of a food item in the cart.
 
@@ -125,34 +131,62 @@ def decrease_cart(request, food_id):
     Returns:
         JsonResponse: JSON response with the status of the operation.
     """
-    if request.user.is_authenticated:
-        if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-            # Check if the food item exists
-            try:
-                fooditem = FoodItem.objects.get(id=food_id)
-                # Check if the user has already added that food to the cart
-                try:
-                    chkCart = Cart.objects.get(user=request.user, fooditem=fooditem)
-                    if chkCart.quantity > 1:
-                        # decrease the cart quantity
-                        chkCart.quantity -= 1
-                        chkCart.save()
-                    else:
-                        chkCart.delete()
-                        chkCart.quantity = 0
-                    return JsonResponse({'status': 'Success', 'cart_counter': get_cart_counter(request), 'qty': chkCart.quantity, 'cart_amount': get_cart_amounts(request)})
-                except:
-                    return JsonResponse({'status': 'Failed', 'message': 'Тази храна не съществува в кошницата!'})
-            except:
-                return JsonResponse({'status': 'Failed', 'message': 'Тази храна не съществува!'})
-        else:
-            return JsonResponse({'status': 'Failed', 'message': 'Invalid request!'})
-        
-    else:
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'status': 'login_required', 'message': 'Моля, влезте в профила си, за да продължите!'})
+    if not is_ajax(request):
+        return JsonResponse({'status': 'Failed', 'message': 'Invalid request!'})
+
+    try:
+        quantity, summary = await sync_to_async(decrease_cart_item)(user, food_id)
+    except Cart.DoesNotExist:
+        # Check if the food item exists
+        if await FoodItem.objects.filter(id=food_id).aexists():
+            return JsonResponse({'status': 'Failed', 'message': 'Тази храна не съществува в кошницата!'})
+        return JsonResponse({'status': 'Failed', 'message': 'Тази храна не съществува!'})
+    return JsonResponse({'status': 'Success', 'cart_counter': cart_counter_data(summary), 'qty': quantity, 'cart_amount': cart_amounts_data(summary)})
+
+
+async def cart_batch(request):
+    """
+    View function to apply a batch of cart changes.
+
+    The frontend coalesces the +/- clicks of a short debounce window into one POST with
+    a JSON body {"ops": [{"food_id": 12, "delta": 2}, {"food_id": 15, "delta": -1}]}.
+    All changes are applied in one transaction and only what changed is returned:
+    the new quantities of the affected lines, the cart counter and the totals.
+
+    Args:
+        request (HttpRequest): The request object.
+
+    Returns:
+        JsonResponse: JSON response with the status of the operation.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
         return JsonResponse({'status': 'login_required', 'message': 'Моля, влезте в профила си, за да продължите!'})
+    if request.method != 'POST' or not is_ajax(request):
+        return JsonResponse({'status': 'Failed', 'message': 'Invalid request!'})
+
+    try:
+        payload = json.loads(request.body)
+        deltas = parse_cart_operations(payload.get('ops') if isinstance(payload, dict) else None)
+    except json.JSONDecodeError:
+        return JsonResponse({'status': 'Failed', 'message': 'Invalid request!'})
+    except ValueError as e:
+        return JsonResponse({'status': 'Failed', 'message': str(e)})
+
+    quantities, summary = await sync_to_async(apply_cart_changes)(user, deltas)
+    return JsonResponse({
+        'status': 'Success',
+        'lines': {str(food_id): quantity for food_id, quantity in quantities.items()},
+        'cart_counter': cart_counter_data(summary),
+        'cart_amount': cart_amounts_data(summary),
+    })
 
 
 @login_required(login_url = 'login')
+@ensure_csrf_cookie
 def cart(request):
     """
     View function to display the user's cart.
@@ -163,13 +197,13 @@ def cart(request):
     Returns:
         HttpResponse: Rendered HTML page with the user's cart items.
     """
-    cart_items = Cart.objects.filter(user=request.user).order_by('created_at')
+    cart_items = get_cart_partition(request).items
     context = {
         'cart_items': cart_items,
     }
     return render(request, 'marketplace/cart.html', context)
 
-def delete_cart(request, cart_id):
+async def delete_cart(request, cart_id):
     """
     View function to delete an item from the cart.
 
@@ -180,20 +214,20 @@ def delete_cart(request, cart_id):
     Returns:
         JsonResponse: JSON response with the status of the operation.
     """
-    if request.user.is_authenticated:
-        if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-            try:
-                # Check if the cart item exists
-                cart_item = Cart.objects.get(user=request.user, id=cart_id)
-                if cart_item:
-                    cart_item.delete()
-                    return JsonResponse({'status': 'Success', 'message': 'Артикулът беше изтрит!', 'cart_counter': get_cart_counter(request), 'cart_amount': get_cart_amounts(request)})
-            except:
-                return JsonResponse({'status': 'Failed', 'message': 'Артикулът в кошницата не същестува!'})
-        else:
-            return JsonResponse({'status': 'Failed', 'message': 'Invalid request!'})
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'status': 'login_required', 'message': 'Моля, влезте в профила си, за да продължите!'})
+    if not is_ajax(request):
+        return JsonResponse({'status': 'Failed', 'message': 'Invalid request!'})
+
+    try:
+        summary = await sync_to_async(delete_cart_item)(user, cart_id)
+    except Cart.DoesNotExist:
+        return JsonResponse({'status': 'Failed', 'message': 'Артикулът в кошницата не същестува!'})
+    return JsonResponse({'status': 'Success', 'message': 'Артикулът беше изтрит!', 'cart_counter': cart_counter_data(summary), 'cart_amount': cart_amounts_data(summary)})
 
 
+@use_replica
 def search(request):
     """
     View function to search for vendors based on user-provided criteria.
@@ -210,40 +244,25 @@ def search(request):
     else:
         # Retrieve the parameters from the query
         address = request.GET['address']
-        latitude = request.GET['lat']
-        longitude = request.GET['lng']
-        radius = request.GET['radius']
-        keyword = request.GET['keyword']
-
-        # Logic for searching for restaurants
-        # First, food items (FoodItem) whose titles contain the keyword and are available (is_available=True) are found.
-        # The IDs of these vendors are retrieved (values_list('vendor', flat=True)).
-        # We are looking for Vendors who either have the found food products or their name contains the keyword, are approved (is_approved=True) and their user accounts are active (user__is_active=True).
-        fetch_vendors_by_fooditems = FoodItem.objects.filter(food_title__icontains=keyword, is_available=True).values_list('vendor', flat=True)
-        vendors = Vendor.objects.filter(Q(id__in=fetch_vendors_by_fooditems) | Q(vendor_name__icontains=keyword, is_approved=True, user__is_active=True))
-        
-        # Filter restaurants by location
-        if latitude and longitude and radius:
-            # If coordinates and radius are provided, a geometric point (pnt) is created with those coordinates.
-            pnt = GEOSGeometry('POINT(%s %s)' % (longitude, latitude))
-            # Restaurants (food providers) are filtered by location so that they are within the specified radius (distance_lte) from the pnt point.
-            # annotate(distance=Distance("user_profile__location", pnt)) adds the distance from the point to the restaurant location.
-            # order_by("distance") sorts restaurants by distance.
-            vendors = Vendor.objects.filter(Q(id__in=fetch_vendors_by_fooditems) | Q(vendor_name__icontains=keyword, is_approved=True, user__is_active=True),
-            user_profile__location__distance_lte=(pnt, D(km=radius))
-            ).annotate(distance=Distance("user_profile__location", pnt)).order_by("distance")
-
-            # calculates the distance to each merchant in kilometers (v.kms).
-            for v in vendors:
-                v.kms = round(v.distance.km, 1)
-
-        vendor_count = vendors.count()
+        keyword = request.GET.get('keyword', '')
+        point, radius = parse_location(request.GET.get('lat'), request.GET.get('lng'), request.GET.get('radius'))
+
+        # Approved vendors whose name or available food items contain the keyword, within the radius
+        # when a location is given, nearest first. Only one page is loaded, together with the total count.
+        page = search_vendors(keyword, point, radius, cursor=request.GET.get('cursor'))
+
+        next_page_url = None
+        if page.next_cursor:
+            query = request.GET.copy()
+            query['cursor'] = page.next_cursor
+            next_page_url = '?' + query.urlencode()
 
         # the necessary information is passed to the visualization template
         context = {
-            'vendors': vendors,
-            'vendor_count': vendor_count,
-            'source_location': address,
+            'vendors': page.vendors,
+            'vendor_count': page.total,
+            'source_location': address if point is not None else None,
+            'next_page_url': next_page_url,
         }
 
         return render(request, 'marketplace/listings.html', context)
@@ -260,9 +279,9 @@ def checkout(request):
     Returns:
         HttpResponse: Rendered HTML page with the checkout form and cart items.
     """
-    cart_items = Cart.objects.filter(user=request.user).order_by('created_at')
-    cart_count = cart_items.count()
-    if cart_count <= 0:
+    cart = get_cart_partition(request)
+    cart_items = cart.items
+    if cart.cart_count <= 0:
         return redirect('marketplace')
     
     user_profile = UserProfile.objects.get(user=request.user)
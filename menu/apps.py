@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class MenuConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'menu'
+
+    # connect the image derivative signals
+    def ready(self):
+        import menu.signals
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-16 22:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0006_alter_fooditem_slug'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fooditem',
+            name='image_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
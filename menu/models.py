@@ -58,6 +58,7 @@ class FoodItem(models.Model):
         description (TextField): A brief description of the food item, optional with a maximum length of 250 characters.
         price (DecimalField): The price of the food item, with a maximum of 10 digits and 2 decimal places.
         image (ImageField): An image of the food item, uploaded to the 'foodimages' directory.
+        image_derivatives (JSONField): The resized WebP/JPEG copies of the image (see takeawaysite.images).
         is_available (BooleanField): A flag indicating whether the food item is currently available, defaulting to True.
         created_at (DateTimeField): The date and time when the food item was created, automatically set on creation.
         updated_at (DateTimeField): The date and time when the food item was last updated, automatically set on each update.
@@ -72,6 +73,7 @@ class FoodItem(models.Model):
     description = models.TextField(max_length=250, blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     image = models.ImageField(upload_to='foodimages')
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     is_available = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
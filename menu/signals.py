@@ -0,0 +1,17 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from takeawaysite.images import queue_derivatives
+from .models import FoodItem
+
+@receiver(post_save, sender=FoodItem)
+def food_image_receiver(sender, instance, **kwargs):
+    """
+    Signal receiver that queues the building of the resized copies of a food item's
+    image after a new file has been uploaded (see takeawaysite.images).
+
+    Args:
+        sender (Model class): The model class that sent the signal (FoodItem in this case).
+        instance (FoodItem): The instance that was saved.
+        **kwargs: Additional keyword arguments.
+    """
+    queue_derivatives(instance, 'image', 'image_derivatives')
@@ -1,3 +1,80 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from accounts.models import ImageDerivativeJob
+from takeawaysite.images import build_queued_derivatives
+from takeawaysite.testing import create_food, create_vendor
+from vendor.models import Vendor
+
+
+def png(width, height):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 80, 40)).save(buffer, 'PNG')
+    return SimpleUploadedFile('pizza.png', buffer.getvalue(), content_type='image/png')
+
+
+class FoodImageDerivativesTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.food = create_food(create_vendor('pizzeria'), 'Margherita', Decimal('9.50'))
+
+    def render(self, food):
+        template = Template('{% load images %}{% responsive_image food.image food.image_derivatives 80 %}')
+        return template.render(Context({'food': food}))
+
+    def test_an_upload_only_queues_the_derivatives(self):
+        self.food.image = png(800, 600)
+        self.food.save()
+
+        self.food.refresh_from_db()
+        self.assertNotEqual(self.food.image_derivatives.get('source'), self.food.image.name)
+        self.assertTrue(ImageDerivativeJob.objects.filter(model='menu.fooditem', object_id=self.food.pk, field_name='image').exists())
+        # the original is shown until the derivatives are built
+        self.assertIn(f'src="{self.food.image.url}"', self.render(self.food))
+
+    def test_the_queued_derivatives_are_built(self):
+        self.food.image = png(800, 600)
+        self.food.save()
+
+        self.assertEqual(build_queued_derivatives(), (1, 0))
+
+        self.food.refresh_from_db()
+        derivatives = self.food.image_derivatives
+        self.assertEqual(derivatives['source'], self.food.image.name)
+        self.assertEqual(sorted(derivatives['webp'], key=int), ['160', '320', '640', '800'])
+        self.assertFalse(ImageDerivativeJob.objects.exists())
+        self.assertIn('<picture>', self.render(self.food))
+
+    def test_an_unreadable_file_keeps_the_original(self):
+        self.food.image = SimpleUploadedFile('pizza.jpg', b'not an image', content_type='image/jpeg')
+        self.food.save()
+
+        self.assertEqual(build_queued_derivatives(), (0, 1))
+
+        self.food.refresh_from_db()
+        self.assertEqual(self.food.image_derivatives, {'source': self.food.image.name})
+        self.assertIn(f'src="{self.food.image.url}"', self.render(self.food))
+
+    def test_building_the_derivatives_invalidates_the_menu(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.food.image = png(800, 600)
+            self.food.save()
+        version = Vendor.objects.get(pk=self.food.vendor_id).menu_version
+
+        with self.captureOnCommitCallbacks(execute=True):
+            build_queued_derivatives()
+
+        # the cached menu links to the resized copies from now on
+        self.assertEqual(Vendor.objects.get(pk=self.food.vendor_id).menu_version, version + 1)
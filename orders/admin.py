@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Payment, Order, OrderedFood
+from .models import Payment, Order, OrderedFood, OrderVendorTotal
 
 class OrderedFoodInline(admin.TabularInline):
     model = OrderedFood
@@ -7,9 +7,15 @@ class OrderedFoodInline(admin.TabularInline):
     extra = 0 # This specifies that no extra empty forms should be displayed by default.
 
 
+class OrderVendorTotalInline(admin.TabularInline):
+    model = OrderVendorTotal
+    readonly_fields = ('vendor', 'subtotal', 'tax', 'grand_total', 'tax_data') # written once at checkout
+    extra = 0
+
+
 class OrderAdmin(admin.ModelAdmin):
     list_display = ['order_number', 'name', 'phone', 'email', 'total', 'payment_method', 'status', 'order_placed_to', 'is_ordered']
-    inlines = [OrderedFoodInline]
+    inlines = [OrderedFoodInline, OrderVendorTotalInline]
 
 # Register your models here.
 admin.site.register(Payment)
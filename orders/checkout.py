@@ -0,0 +1,134 @@
+"""
+Checkout pipeline.
+
+complete_payment() turns a placed order into a paid one in a single transaction:
+it locks the order and the cart, records the payment, copies the cart into
+OrderedFood rows with one bulk insert, updates the vendors' revenue rollups,
+adds the order to the vendors' live feeds (orders.feed), queues the
+confirmation emails and clears the cart. Either all of it is written or
+nothing is, and a second submit of the same order returns the first result.
+"""
+from collections import OrderedDict
+
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+import simplejson as json
+
+from accounts.utils import send_notification
+from marketplace.models import Cart
+from .feed import publish_order_event
+from .models import Order, OrderEvent, OrderedFood, Payment
+from .revenue import record_order_paid
+from .utils import order_total_by_vendor
+
+
+def complete_payment(user, order_number, transaction_id, payment_method, status, domain=None):
+    """
+    Records the payment of an order and moves the user's cart into it.
+
+    Args:
+        user (User): The customer.
+        order_number (str): The number of the placed order.
+        transaction_id (str): The transaction id of the payment provider.
+        payment_method (str): The payment method.
+        status (str): The payment status reported by the provider.
+        domain (Site, optional): The current site, used in the emails.
+
+    Returns:
+        tuple: The order and a flag that is False if the order had already been paid.
+
+    Raises:
+        Order.DoesNotExist: If the user has no order with this number.
+    """
+    with transaction.atomic():
+        # the row lock serializes concurrent submits of the same order
+        order = Order.objects.select_for_update().get(user=user, order_number=order_number)
+        if order.is_ordered:
+            return order, False
+
+        cart_items = list(
+            Cart.objects.select_for_update(of=('self',))
+            .filter(user=user)
+            .select_related('fooditem__vendor__user')
+            .order_by('created_at')
+        )
+
+        payment = Payment.objects.create(
+            user = user,
+            transaction_id = transaction_id,
+            payment_method = payment_method,
+            amount = order.total,
+            status = status
+        )
+
+        order.payment = payment
+        order.is_ordered = True
+        order.save(update_fields=['payment', 'is_ordered', 'updated_at'])
+
+        ordered_food = OrderedFood.objects.bulk_create([
+            OrderedFood(
+                order = order,
+                payment = payment,
+                user = user,
+                fooditem = item.fooditem,
+                quantity = item.quantity,
+                price = item.fooditem.price,
+                amount = item.fooditem.price * item.quantity, # total amount
+            )
+            for item in cart_items
+        ])
+
+        # the vendor totals are shared by the revenue rollups and the vendor emails
+        prefetch_related_objects([order], 'vendor_totals')
+        record_order_paid(order)
+        publish_order_event(order, OrderEvent.NEW_ORDER)
+        queue_order_emails(user, order, ordered_food, domain)
+
+        Cart.objects.filter(pk__in=[item.pk for item in cart_items]).delete()
+    return order, True
+
+
+def queue_order_emails(user, order, ordered_food, domain=None):
+    """
+    Queues the order confirmation email of the customer and one new order email per vendor.
+
+    Args:
+        user (User): The customer.
+        order (Order): The paid order, with its vendor totals prefetched.
+        ordered_food (list): The OrderedFood rows of the order, with their food items and vendors loaded.
+        domain (Site, optional): The current site.
+    """
+    # SEND ORDER CONFIRMATION EMAIL TO THE CUSTOMER
+    mail_subject = 'Thank you for ordering with us.'
+    mail_template = 'orders/order_confirmation_email.html'
+    customer_subtotal = sum(item.price * item.quantity for item in ordered_food)
+    context = {
+        'user': user,
+        'order': order,
+        'to_email': order.email,
+        'ordered_food': ordered_food,
+        'domain': domain,
+        'customer_subtotal': customer_subtotal,
+        'tax_data': json.loads(order.tax_data),
+    }
+    send_notification(mail_subject, mail_template, context)
+
+    # SEND ORDER RECEIVED EMAIL TO THE VENDOR
+    mail_subject = 'You have received a new order.'
+    mail_template = 'orders/new_order_received.html'
+    food_by_vendor = OrderedDict()
+    for item in ordered_food:
+        food_by_vendor.setdefault(item.fooditem.vendor, []).append(item)
+
+    for vendor, ordered_food_to_vendor in food_by_vendor.items():
+        vendor_total = order_total_by_vendor(order, vendor.id)
+        context = {
+            'order': order,
+            'to_email': vendor.user.email,
+            'ordered_food_to_vendor': ordered_food_to_vendor,
+            'domain': domain,
+            'vendor_subtotal': vendor_total['subtotal'],
+            'tax_data': vendor_total['tax_dict'],
+            'vendor_grand_total': vendor_total['grand_total'],
+        }
+        send_notification(mail_subject, mail_template, context)
@@ -0,0 +1,287 @@
+"""
+Live order feed of the vendor dashboards.
+
+When an order is paid (orders.checkout.complete_payment) and when its status
+changes (vendor.views.update_order_status), publish_order_event() writes one
+OrderEvent row per vendor of the order, in the same transaction. The vendor
+pages keep an EventSource open on vendor.views.order_events, which streams the
+vendor's events as server-sent events. The id of every event is the OrderEvent
+id, so a reconnecting browser resumes after the last event it received
+(Last-Event-ID) and nothing is lost or repeated.
+
+A stream sleeps until its vendor has new events:
+
+* publishers in the same process wake it once their transaction commits,
+* on PostgreSQL, publishers in other processes wake it through NOTIFY, which
+  one LISTEN connection per event loop receives (psycopg 3, see
+  requirements.txt),
+* otherwise (another database, or while the LISTEN connection is down) one
+  poller per event loop reads the ids of the new events every POLL_SECONDS,
+  on a connection of its own that it keeps, and wakes the streams of their
+  vendors.
+
+A stream only reads its events when it is woken or every HEARTBEAT_SECONDS,
+so it does not hold a database connection between reads. It ends after
+STREAM_SECONDS; the browser reconnects on its own. It must be served by the
+ASGI application (takeawaysite.asgi).
+"""
+import asyncio
+import json
+import logging
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg
+from asgiref.sync import sync_to_async
+from django.db import connections, router, transaction
+from django.urls import reverse
+
+from .history import order_json
+from .models import OrderEvent
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = 'order_events'
+EVENTS_PER_READ = 100
+HEARTBEAT_SECONDS = 15
+POLL_SECONDS = 2
+LISTEN_RETRY_SECONDS = 30
+STREAM_SECONDS = 5 * 60
+RETRY_MILLISECONDS = 3000
+
+
+def publish_order_event(order, kind):
+    """
+    Adds an event of an order to the feed of each of its vendors.
+
+    Must be called inside the transaction that changed the order, so the event
+    is only seen if the change is committed.
+
+    Args:
+        order (Order): The order, with its vendor totals (prefetched or not).
+        kind (str): OrderEvent.NEW_ORDER or OrderEvent.STATUS_CHANGED.
+    """
+    detail_url = reverse('vendor_order_detail', args=[order.order_number])
+    events = OrderEvent.objects.bulk_create([
+        OrderEvent(
+            vendor_id=vendor_total.vendor_id, order=order, kind=kind,
+            data={**order_json(order, vendor_total.grand_total), 'id': order.id, 'kind': kind, 'url': detail_url},
+        )
+        for vendor_total in order.vendor_totals.all()
+    ])
+    vendor_ids = sorted({event.vendor_id for event in events})
+    if not vendor_ids:
+        return
+
+    using = router.db_for_write(OrderEvent)
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        # delivered to the listeners when the transaction commits
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [NOTIFY_CHANNEL, ','.join(map(str, vendor_ids))])
+    transaction.on_commit(lambda: wake_streams(vendor_ids), using=using)
+
+
+def latest_event_id(vendor):
+    """
+    Returns the id of the vendor's last event, where a page rendered now starts its stream.
+    """
+    return OrderEvent.objects.filter(vendor=vendor).order_by('-id').values_list('id', flat=True).first() or 0
+
+
+_waiters_lock = threading.Lock()
+_waiters = {}  # vendor_id: {(loop, asyncio.Event)}
+
+
+def wake_streams(vendor_ids):
+    """
+    Wakes the streams of this process that wait for events of the vendors. Thread-safe.
+    """
+    with _waiters_lock:
+        waiters = [waiter for vendor_id in vendor_ids for waiter in _waiters.get(vendor_id, ())]
+    for loop, event in waiters:
+        try:
+            loop.call_soon_threadsafe(event.set)
+        except RuntimeError:
+            # the loop of the stream has been closed
+            pass
+
+
+def _add_waiter(vendor_id, waiter):
+    with _waiters_lock:
+        _waiters.setdefault(vendor_id, set()).add(waiter)
+
+
+def _remove_waiter(vendor_id, waiter):
+    with _waiters_lock:
+        waiters = _waiters.get(vendor_id, set())
+        waiters.discard(waiter)
+        if not waiters:
+            _waiters.pop(vendor_id, None)
+
+
+# event loop: (task, asyncio.Event set once LISTEN is running, start time)
+_listeners = weakref.WeakKeyDictionary()
+
+
+def listen_connection_params():
+    """
+    Returns the psycopg connection parameters of the database of the feed, or None
+    if it is not PostgreSQL.
+    """
+    settings_dict = connections[router.db_for_write(OrderEvent)].settings_dict
+    if 'postgis' not in settings_dict['ENGINE'] and 'postgresql' not in settings_dict['ENGINE']:
+        return None
+    params = {
+        'dbname': settings_dict['NAME'],
+        'user': settings_dict['USER'],
+        'password': settings_dict['PASSWORD'],
+        'host': settings_dict['HOST'],
+        'port': settings_dict['PORT'],
+    }
+    return {key: value for key, value in params.items() if value}
+
+
+async def _listen(params, ready):
+    try:
+        async with await psycopg.AsyncConnection.connect(**params, autocommit=True) as connection:
+            await connection.execute(f'LISTEN {NOTIFY_CHANNEL}')
+            ready.set()
+            async for notify in connection.notifies():
+                wake_streams([int(vendor_id) for vendor_id in notify.payload.split(',') if vendor_id])
+    except Exception:
+        logger.exception('Order feed LISTEN connection lost, the streams poll until it is back.')
+    finally:
+        ready.clear()
+
+
+def listening():
+    """
+    Starts the LISTEN connection of the running event loop if needed.
+
+    Returns:
+        bool: True if the streams are woken by NOTIFY, False if they have to poll.
+    """
+    loop = asyncio.get_running_loop()
+    task, ready, started = _listeners.get(loop, (None, None, None))
+    if task is None or (task.done() and loop.time() - started >= LISTEN_RETRY_SECONDS):
+        params = listen_connection_params()
+        if params is None:
+            return False
+        ready = asyncio.Event()
+        task = loop.create_task(_listen(params, ready))
+        _listeners[loop] = (task, ready, loop.time())
+    return ready.is_set()
+
+
+# event loop: poller task
+_pollers = weakref.WeakKeyDictionary()
+# the reads of the pollers run in this thread, which keeps its database connection
+_poll_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='order-feed-poll')
+
+
+def poll_events(last_id):
+    """
+    Reads the new events of all vendors, for the poller.
+
+    Args:
+        last_id (int or None): The id of the last event the poller has seen, None on its first read.
+
+    Returns:
+        tuple: The id of the last event and the ids of the vendors with events after last_id.
+    """
+    events = OrderEvent.objects.order_by('-id')
+    if last_id is None:
+        return events.values_list('id', flat=True).first() or 0, []
+    rows = list(events.filter(id__gt=last_id).values_list('id', 'vendor_id'))
+    if not rows:
+        return last_id, []
+    return rows[0][0], sorted({vendor_id for _, vendor_id in rows})
+
+
+def _has_waiters(loop):
+    with _waiters_lock:
+        return any(waiter[0] is loop for waiters in _waiters.values() for waiter in waiters)
+
+
+async def _poll():
+    loop = asyncio.get_running_loop()
+    last_id = None
+    try:
+        while _has_waiters(loop) and not listening():
+            last_id, vendor_ids = await loop.run_in_executor(_poll_executor, poll_events, last_id)
+            wake_streams(vendor_ids)
+            await asyncio.sleep(POLL_SECONDS)
+    except Exception:
+        # the streams still read their events every HEARTBEAT_SECONDS, the next one restarts the poller
+        logger.exception('Order feed poller failed.')
+        # on a new connection
+        _poll_executor.submit(connections.close_all)
+
+
+def polling():
+    """
+    Starts the poller of the running event loop if needed. It stops once LISTEN
+    is running or no stream of the loop is left.
+    """
+    loop = asyncio.get_running_loop()
+    task = _pollers.get(loop)
+    if task is None or task.done():
+        _pollers[loop] = loop.create_task(_poll())
+
+
+def _read_events(vendor_id, last_id):
+    events = list(OrderEvent.objects.filter(vendor_id=vendor_id, id__gt=last_id).order_by('id')[:EVENTS_PER_READ])
+    # a stream reads rarely (when woken or every HEARTBEAT_SECONDS), so it does
+    # not keep the connection between reads
+    connections[router.db_for_read(OrderEvent)].close()
+    return events
+
+
+def format_event(event):
+    """
+    Returns an event in the text/event-stream format.
+    """
+    return f'id: {event.id}\nevent: order\ndata: {json.dumps(event.data, ensure_ascii=False)}\n\n'
+
+
+async def stream_events(vendor_id, last_id):
+    """
+    Yields the events of a vendor after last_id as server-sent events, as they are published.
+
+    Args:
+        vendor_id (int): The vendor.
+        last_id (int): The id of the last event the client has.
+    """
+    loop = asyncio.get_running_loop()
+    waiter = (loop, asyncio.Event())
+    _add_waiter(vendor_id, waiter)
+    try:
+        yield f'retry: {RETRY_MILLISECONDS}\n\n'
+        deadline = loop.time() + STREAM_SECONDS
+        last_sent = loop.time()
+        while loop.time() < deadline:
+            # cleared before reading, so an event published meanwhile is not missed
+            waiter[1].clear()
+            events = await sync_to_async(_read_events)(vendor_id, last_id)
+            for event in events:
+                last_id = event.id
+                yield format_event(event)
+            if events:
+                last_sent = loop.time()
+                if len(events) == EVENTS_PER_READ:
+                    continue
+
+            if not listening():
+                polling()
+            try:
+                await asyncio.wait_for(waiter[1].wait(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            if loop.time() - last_sent >= HEARTBEAT_SECONDS:
+                # keeps proxies from closing the idle connection
+                last_sent = loop.time()
+                yield ': keepalive\n\n'
+    finally:
+        _remove_waiter(vendor_id, waiter)
@@ -0,0 +1,116 @@
+"""
+Order history of customers and vendors.
+
+The "My orders" pages load the paid orders newest first, one page at a time,
+with a keyset cursor on (created_at, id) instead of an offset: every page is a
+range scan of an index, however deep the customer or vendor scrolls.
+
+* customer_orders() is served by the (user, is_ordered, -created_at, -id) index.
+* vendor_orders() walks the partial index of paid orders by (-created_at, -id)
+  and checks the vendor with the (vendor_id, order_id) index of the
+  order-vendor through table, without the duplicates and the sort of a join.
+"""
+from dataclasses import dataclass, field
+
+from django.core import signing
+from django.db.models import Exists, OuterRef, Prefetch, Q
+from django.utils.dateparse import parse_datetime
+
+from .models import Order, OrderVendorTotal
+
+ORDERS_PAGE_SIZE = 25
+
+CURSOR_SALT = 'orders.history'
+
+
+@dataclass
+class OrderPage:
+    """
+    One page of an order history.
+
+    Attributes:
+        orders (list): The orders of the page, newest first.
+        next_cursor (str): The cursor of the next page, or None on the last page.
+    """
+    orders: list = field(default_factory=list)
+    next_cursor: str = None
+
+
+def encode_cursor(order):
+    return signing.dumps([order.created_at.isoformat(), order.pk], salt=CURSOR_SALT)
+
+
+def decode_cursor(cursor):
+    """
+    Returns the (created_at, id) of a cursor, or None if it is missing or has been tampered with.
+    """
+    if not cursor:
+        return None
+    try:
+        created_at, pk = signing.loads(cursor, salt=CURSOR_SALT)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    created_at = parse_datetime(created_at) if isinstance(created_at, str) else None
+    if created_at is None or not isinstance(pk, int):
+        return None
+    return created_at, pk
+
+
+def customer_orders(user):
+    """
+    Returns the paid orders of a customer.
+    """
+    return Order.objects.filter(user=user, is_ordered=True)
+
+
+def vendor_orders(vendor):
+    """
+    Returns the paid orders placed to a vendor, with the vendor's totals prefetched.
+    """
+    placed_to_vendor = Order.vendors.through.objects.filter(order_id=OuterRef('pk'), vendor_id=vendor.pk)
+    return Order.objects.filter(Exists(placed_to_vendor), is_ordered=True).prefetch_related(
+        Prefetch('vendor_totals', queryset=OrderVendorTotal.objects.filter(vendor=vendor))
+    )
+
+
+def order_json(order, total):
+    """
+    Returns the fields of an order shown in the order history, for the JSON endpoints.
+
+    Args:
+        order (Order): The order.
+        total (Decimal or float): The total shown, the order total or the vendor's part of it.
+    """
+    return {
+        'order_number': order.order_number,
+        'name': order.name,
+        'total': f'{total:.2f}',
+        'status': order.status,
+        'created_at': order.created_at.isoformat(),
+    }
+
+
+def paginate_orders(orders, cursor=None, page_size=ORDERS_PAGE_SIZE):
+    """
+    Returns one page of orders, newest first.
+
+    Args:
+        orders (QuerySet): The orders, e.g. from customer_orders() or vendor_orders().
+        cursor (str, optional): The next_cursor of the previous page.
+        page_size (int): The number of orders per page.
+
+    Returns:
+        OrderPage: The page.
+    """
+    orders = orders.order_by('-created_at', '-id')
+    position = decode_cursor(cursor)
+    if position:
+        created_at, pk = position
+        orders = orders.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+    # one extra row tells whether there is a next page
+    rows = list(orders[:page_size + 1])
+    page = OrderPage(orders=rows[:page_size])
+    if len(rows) > page_size:
+        page.next_cursor = encode_cursor(rows[page_size - 1])
+    return page
@@ -0,0 +1,39 @@
+from decimal import InvalidOperation
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from orders.models import Order, OrderVendorTotal
+from orders.utils import create_vendor_totals
+
+
+class Command(BaseCommand):
+    help = 'Converts the total_data blobs of existing orders into OrderVendorTotal rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Delete and rebuild the rows of orders that already have them.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of orders converted per transaction.')
+
+    def handle(self, *args, **options):
+        orders = Order.objects.exclude(total_data__isnull=True).order_by('pk')
+        if not options['rebuild']:
+            orders = orders.filter(vendor_totals__isnull=True)
+
+        batch_size = options['batch_size']
+        order_ids = list(orders.values_list('pk', flat=True).distinct())
+        converted = 0
+        failed = 0
+        for start in range(0, len(order_ids), batch_size):
+            batch = Order.objects.filter(pk__in=order_ids[start:start + batch_size])
+            with transaction.atomic():
+                if options['rebuild']:
+                    OrderVendorTotal.objects.filter(order__in=batch).delete()
+                for order in batch:
+                    try:
+                        create_vendor_totals(order)
+                        converted += 1
+                    except (ValueError, TypeError, AttributeError, InvalidOperation) as e:
+                        failed += 1
+                        self.stderr.write(f'Order {order.order_number} (id {order.pk}): {e}')
+
+        self.stdout.write(self.style.SUCCESS(f'Converted {converted} orders ({failed} failed).'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.revenue import check_consistency
+
+
+class Command(BaseCommand):
+    help = 'Compares the daily vendor revenue rollups against the raw OrderedFood rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vendor', type=int, action='append', dest='vendor_ids', help='Only check this vendor id (can be repeated).')
+
+    def handle(self, *args, **options):
+        mismatches = check_consistency(options['vendor_ids'])
+        for vendor_id, day, field, expected, actual in mismatches:
+            self.stdout.write(f'vendor {vendor_id} {day}: {field} expected {expected}, rollup has {actual}')
+        if mismatches:
+            raise CommandError(f'{len(mismatches)} mismatches found, run rebuild_revenue_rollups to fix them.')
+        self.stdout.write(self.style.SUCCESS('Revenue rollups are consistent.'))
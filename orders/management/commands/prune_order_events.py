@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from orders.models import OrderEvent
+
+
+class Command(BaseCommand):
+    help = 'Deletes the order feed events older than a number of days (the streams only need the recent ones).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='Keep the events of the last DAYS days.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        deleted, _ = OrderEvent.objects.filter(created_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} order events.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from orders.revenue import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the daily vendor revenue rollups from the paid orders.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vendor', type=int, action='append', dest='vendor_ids', help='Only rebuild this vendor id (can be repeated).')
+
+    def handle(self, *args, **options):
+        written = rebuild_rollups(options['vendor_ids'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} daily revenue rows.'))
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.3 on 2026-10-16 09:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_alter_order_tax_data'),
+        ('vendor', '0004_vendor_opening_schedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderVendorTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('tax', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('grand_total', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('tax_data', models.JSONField(blank=True, default=dict, help_text="Data format: {'tax_type':{'tax_percentage':'tax_amount'}}")),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vendor_totals', to='orders.order')),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_totals', to='vendor.vendor')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['vendor', 'order'], name='orders_orde_vendor__235332_idx')],
+                'unique_together': {('order', 'vendor')},
+            },
+        ),
+    ]
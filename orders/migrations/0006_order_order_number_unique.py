@@ -0,0 +1,41 @@
+# Generated by Django 5.0.3 on 2026-10-16 23:00
+
+from django.db import migrations, models
+
+from orders.utils import generate_order_number
+
+
+def backfill_order_numbers(apps, schema_editor):
+    """
+    Gives a fresh order number to every order whose number is empty, not numeric (the
+    order detail URLs only take digits) or already used by an older order, so the
+    unique index can be built.
+    """
+    Order = apps.get_model('orders', 'Order')
+    invalid = []
+    seen = set()
+    for pk, number in Order.objects.order_by('pk').values_list('pk', 'order_number').iterator():
+        if not number or not number.isdigit() or number in seen:
+            invalid.append(pk)
+        seen.add(number)
+
+    renumbered = list(Order.objects.filter(pk__in=invalid).only('pk'))
+    for order in renumbered:
+        order.order_number = generate_order_number()
+    Order.objects.bulk_update(renumbered, ['order_number'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_vendordailyrevenue'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_order_numbers, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='order',
+            name='order_number',
+            field=models.CharField(default=generate_order_number, max_length=20, unique=True),
+        ),
+    ]
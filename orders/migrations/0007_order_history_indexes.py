@@ -0,0 +1,30 @@
+# Generated by Django 5.0.3 on 2026-10-16 23:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_order_order_number_unique'),
+        ('vendor', '0005_vendor_location'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'is_ordered', '-created_at', '-id'], name='order_user_history_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('is_ordered', True)), fields=['-created_at', '-id'], name='order_paid_history_idx'),
+        ),
+        # the auto-created through table only has an index on (order_id, vendor_id) and one
+        # per column; the vendor order history looks up (vendor_id, order_id)
+        migrations.RunSQL(
+            'CREATE INDEX orders_order_vendors_vendor_order_idx ON orders_order_vendors (vendor_id, order_id)',
+            'DROP INDEX orders_order_vendors_vendor_order_idx',
+        ),
+    ]
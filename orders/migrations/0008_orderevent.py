@@ -0,0 +1,29 @@
+# Generated by Django 5.0.3 on 2026-10-16 23:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_order_history_indexes'),
+        ('vendor', '0005_vendor_location'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('new_order', 'New order'), ('status_changed', 'Status changed')], max_length=20)),
+                ('data', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='orders.order')),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_events', to='vendor.vendor')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['vendor', 'id'], name='orderevent_vendor_feed_idx')],
+            },
+        ),
+    ]
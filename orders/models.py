@@ -2,9 +2,8 @@ from django.db import models
 from accounts.models import User
 from menu.models import FoodItem
 from vendor.models import Vendor
-import json
-
-request_object = ''
+from .utils import generate_order_number, order_total_by_vendor
+from .request_object import get_current_vendor
 
 class Payment(models.Model):
     PAYMENT_METHOD = (
@@ -34,7 +33,8 @@ class Order(models.Model):
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     payment = models.ForeignKey(Payment, on_delete=models.SET_NULL, blank=True, null=True)
     vendors = models.ManyToManyField(Vendor, blank=True)
-    order_number = models.CharField(max_length=20)
+    # allocated before the insert (time-ordered, see orders.utils.generate_order_number)
+    order_number = models.CharField(max_length=20, unique=True, default=generate_order_number)
     first_name = models.CharField(max_length=50)
     last_name = models.CharField(max_length=50)
     phone = models.CharField(max_length=15, blank=True)
@@ -53,6 +53,13 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # the order histories, paginated on (created_at, id) (see orders.history)
+            models.Index(fields=['user', 'is_ordered', '-created_at', '-id'], name='order_user_history_idx'),
+            models.Index(fields=['-created_at', '-id'], condition=models.Q(is_ordered=True), name='order_paid_history_idx'),
+        ]
+
     # Concatenate first name and last name
     @property
     def name(self):
@@ -61,39 +68,22 @@ class Order(models.Model):
     def order_placed_to(self):
         return ", ".join([str(i) for i in self.vendors.all()])
     
-    def get_total_by_vendor(self):
-        vendor = Vendor.objects.get(user=request_object.user)
-
-        subtotal = 0
-        tax = 0
-        tax_dict = {}
-
-        if self.total_data:
-            total_data = json.loads(self.total_data)
-            data = total_data.get(str(vendor.id))
-            
-            
-            for key, val in data.items():
-                subtotal += float(key)
-                val = val.replace("'", '"')
-                val = json.loads(val)
-                tax_dict.update(val)
-
-                # calculate tax
-                # {'ДДС': {'9.00': '3.46'}}
-                for i in val:
-                    for j in val[i]:
-                        tax += float(val[i][j])
-
-        grand_total = float(subtotal) + float(tax)
-        
-        context = {
-            'subtotal': subtotal,
-            'tax_dict': tax_dict, 
-            'grand_total': grand_total,
-        }
-
-        return context
+    def get_total_by_vendor(self, vendor=None):
+        """
+        Returns the subtotal, tax breakdown and grand total of the part of the order placed to a vendor.
+
+        Args:
+            vendor (Vendor, optional): The vendor. Defaults to the vendor of the current
+                request's user, so templates can call {{ order.get_total_by_vendor }}.
+
+        Returns:
+            dict: A dictionary with 'subtotal', 'tax_dict' and 'grand_total'.
+        """
+        if vendor is None:
+            vendor = get_current_vendor()
+            if vendor is None:
+                raise Vendor.DoesNotExist('get_total_by_vendor() needs a vendor outside a vendor request.')
+        return order_total_by_vendor(self, vendor.id)
 
     def __str__(self):
         return self.order_number
@@ -111,4 +101,87 @@ class OrderedFood(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return self.fooditem.food_title
\ No newline at end of file
+        return self.fooditem.food_title
+
+
+class OrderVendorTotal(models.Model):
+    """
+    The totals of the part of an order placed to one vendor.
+
+    Written once at checkout, so dashboards and vendor pages can read the numbers
+    with indexed SQL instead of parsing Order.total_data.
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='vendor_totals')
+    vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE, related_name='order_totals')
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2)
+    tax = models.DecimalField(max_digits=12, decimal_places=2)
+    grand_total = models.DecimalField(max_digits=12, decimal_places=2)
+    tax_data = models.JSONField(blank=True, default=dict, help_text = "Data format: {'tax_type':{'tax_percentage':'tax_amount'}}")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('order', 'vendor')
+        indexes = [
+            models.Index(fields=['vendor', 'order']),
+        ]
+
+    def __str__(self):
+        return f'{self.order} - {self.vendor}'
+
+
+class VendorDailyRevenue(models.Model):
+    """
+    Daily revenue rollup of a vendor.
+
+    Updated incrementally when an order is paid or its status changes (see orders.revenue),
+    so the vendor dashboard reads at most one row per day instead of every order.
+    """
+    vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE, related_name='daily_revenue')
+    date = models.DateField()
+    orders_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    tax = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('vendor', 'date')
+        verbose_name_plural = 'vendor daily revenue'
+
+    def __str__(self):
+        return f'{self.vendor} - {self.date}'
+
+
+class OrderEvent(models.Model):
+    """
+    Change feed of a vendor's orders: one row per vendor when an order is paid and
+    when its status changes. Streamed to the vendor's dashboard (see orders.feed),
+    which resumes from the id of the last event it received.
+
+    Attributes:
+        vendor (ForeignKey): The vendor the event is for.
+        order (ForeignKey): The order.
+        kind (CharField): NEW_ORDER or STATUS_CHANGED.
+        data (JSONField): The order as shown to the vendor (see orders.history.order_json).
+        created_at (DateTimeField): The timestamp of the event.
+    """
+    NEW_ORDER = 'new_order'
+    STATUS_CHANGED = 'status_changed'
+    KIND = (
+        (NEW_ORDER, 'New order'),
+        (STATUS_CHANGED, 'Status changed'),
+    )
+
+    vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE, related_name='order_events')
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='events')
+    kind = models.CharField(max_length=20, choices=KIND)
+    data = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # the events of a vendor after the last one received
+            models.Index(fields=['vendor', 'id'], name='orderevent_vendor_feed_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.vendor} - {self.order} - {self.kind}'
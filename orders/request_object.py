@@ -1,18 +1,71 @@
-from . import models
+"""
+Current request context.
+
+RequestObjectMiddleware stores the request being handled in a ContextVar, so
+code without access to the request (e.g. Order.get_total_by_vendor() called
+from a template) can read it with get_current_request(). Unlike a module
+global, a ContextVar is private to the thread or asyncio task handling the
+request, so concurrent requests in threaded (gthread) or ASGI workers never see
+each other's request.
+"""
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from vendor.models import Vendor
+
+_current_request = ContextVar('current_request', default=None)
+
+# Attribute used to memoize the vendor of the current user on the request object.
+CURRENT_VENDOR_ATTR = '_current_vendor'
+
+
+def get_current_request():
+    """
+    Returns the request handled by the current thread or task, or None outside a request.
+    """
+    return _current_request.get()
+
+
+def get_current_vendor():
+    """
+    Returns the vendor of the current user, looked up at most once per request.
+
+    Returns:
+        Vendor: The vendor, or None outside a request or if the user is not a vendor.
+    """
+    request = get_current_request()
+    if request is None or not request.user.is_authenticated:
+        return None
+    if CURRENT_VENDOR_ATTR not in request.__dict__:
+        setattr(request, CURRENT_VENDOR_ATTR, Vendor.objects.filter(user=request.user).first())
+    return getattr(request, CURRENT_VENDOR_ATTR)
+
 
 def RequestObjectMiddleware(get_response):
-    # One-time configuration and initialization.
+    """
+    Makes the request available through get_current_request() while it is handled.
+    Works in both WSGI and ASGI deployments.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = _current_request.set(request)
+            try:
+                return await get_response(request)
+            finally:
+                _current_request.reset(token)
 
-    def middleware(request):
-        # Code to be executed for each request before
-        # the view (and later middleware) are called.
-        models.request_object = request
+        return markcoroutinefunction(middleware)
 
-        response = get_response(request)
+    def middleware(request):
+        token = _current_request.set(request)
+        try:
+            return get_response(request)
+        finally:
+            _current_request.reset(token)
 
-        # Code to be executed for each request/response after
-        # the view is called.
+    return middleware
 
-        return response
 
-    return middleware
\ No newline at end of file
+RequestObjectMiddleware.sync_capable = True
+RequestObjectMiddleware.async_capable = True
@@ -0,0 +1,187 @@
+"""
+Vendor revenue engine.
+
+Keeps one VendorDailyRevenue row per vendor and day. The rows are updated
+incrementally from the OrderVendorTotal rows of an order when the order is paid
+(orders.views.payments) and when its status moves in or out of 'Cancelled'
+(vendor.views.update_order_status). The vendor dashboard reads its numbers
+from these rollups, so its cost grows with the number of days, not orders.
+
+rebuild_rollups() recomputes the rows from the orders and check_consistency()
+compares them against the raw OrderedFood rows.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import OrderedFood, OrderVendorTotal, VendorDailyRevenue
+
+# Orders in these statuses do not count towards the revenue.
+EXCLUDED_STATUSES = ('Cancelled',)
+
+
+def counts_towards_revenue(is_ordered, status):
+    """
+    Returns True if an order with this payment flag and status is part of the revenue.
+    """
+    return is_ordered and status not in EXCLUDED_STATUSES
+
+
+def _apply(order, sign):
+    day = timezone.localdate(order.created_at)
+    with transaction.atomic():
+        for vendor_total in order.vendor_totals.all():
+            rollup, created = VendorDailyRevenue.objects.get_or_create(vendor_id=vendor_total.vendor_id, date=day)
+            VendorDailyRevenue.objects.filter(pk=rollup.pk).update(
+                orders_count=F('orders_count') + sign,
+                revenue=F('revenue') + sign * vendor_total.grand_total,
+                tax=F('tax') + sign * vendor_total.tax,
+                updated_at=timezone.now(),
+            )
+
+
+def record_order_paid(order):
+    """
+    Adds a freshly paid order to the daily rollups of its vendors.
+
+    Args:
+        order (Order): The order, already marked as ordered.
+    """
+    if counts_towards_revenue(order.is_ordered, order.status):
+        _apply(order, 1)
+
+
+def record_status_change(order, old_status):
+    """
+    Updates the rollups after the status of a paid order changed.
+
+    Args:
+        order (Order): The order, with its new status.
+        old_status (str): The status before the change.
+    """
+    was_counted = counts_towards_revenue(order.is_ordered, old_status)
+    is_counted = counts_towards_revenue(order.is_ordered, order.status)
+    if was_counted != is_counted:
+        _apply(order, 1 if is_counted else -1)
+
+
+def vendor_revenue(vendor, since=None):
+    """
+    Returns the revenue of a vendor from the daily rollups.
+
+    Args:
+        vendor (Vendor): The vendor.
+        since (date, optional): The first day to include. Defaults to all time.
+
+    Returns:
+        dict: A dictionary with 'orders_count', 'revenue' and 'tax'.
+    """
+    rollups = VendorDailyRevenue.objects.filter(vendor=vendor)
+    if since is not None:
+        rollups = rollups.filter(date__gte=since)
+    totals = rollups.aggregate(orders_count=Sum('orders_count'), revenue=Sum('revenue'), tax=Sum('tax'))
+    return {
+        'orders_count': totals['orders_count'] or 0,
+        'revenue': totals['revenue'] or Decimal('0'),
+        'tax': totals['tax'] or Decimal('0'),
+    }
+
+
+def _day():
+    return TruncDate('order__created_at', tzinfo=timezone.get_current_timezone())
+
+
+def compute_rollups(vendor_ids=None):
+    """
+    Computes the daily rollups from the OrderVendorTotal rows of the paid orders.
+
+    Returns:
+        dict: {(vendor_id, date): {'orders_count', 'revenue', 'tax'}}
+    """
+    vendor_totals = OrderVendorTotal.objects.filter(order__is_ordered=True).exclude(order__status__in=EXCLUDED_STATUSES)
+    if vendor_ids is not None:
+        vendor_totals = vendor_totals.filter(vendor_id__in=vendor_ids)
+    rows = vendor_totals.annotate(day=_day()).values('vendor_id', 'day').annotate(
+        orders_count=Count('order', distinct=True),
+        revenue=Sum('grand_total'),
+        tax=Sum('tax'),
+    )
+    return {
+        (row['vendor_id'], row['day']): {
+            'orders_count': row['orders_count'],
+            'revenue': row['revenue'],
+            'tax': row['tax'],
+        }
+        for row in rows
+    }
+
+
+def rebuild_rollups(vendor_ids=None):
+    """
+    Deletes and recomputes the daily rollups.
+
+    Args:
+        vendor_ids (list, optional): Only rebuild these vendors. Defaults to all vendors.
+
+    Returns:
+        int: The number of rollup rows written.
+    """
+    rollups = compute_rollups(vendor_ids)
+    with transaction.atomic():
+        existing = VendorDailyRevenue.objects.all()
+        if vendor_ids is not None:
+            existing = existing.filter(vendor_id__in=vendor_ids)
+        existing.delete()
+        VendorDailyRevenue.objects.bulk_create([
+            VendorDailyRevenue(vendor_id=vendor_id, date=day, **values)
+            for (vendor_id, day), values in rollups.items()
+        ], batch_size=1000)
+    return len(rollups)
+
+
+def check_consistency(vendor_ids=None, tolerance=Decimal('0.01')):
+    """
+    Compares the daily rollups against the raw OrderedFood rows.
+
+    The rollup's revenue without tax must match the sum of the ordered food amounts,
+    and its order count the number of distinct paid orders of that vendor and day.
+
+    Args:
+        vendor_ids (list, optional): Only check these vendors. Defaults to all vendors.
+        tolerance (Decimal): The accepted rounding difference of the amounts.
+
+    Returns:
+        list: The mismatches as (vendor_id, date, field, expected, actual) tuples.
+    """
+    ordered_food = OrderedFood.objects.filter(order__is_ordered=True).exclude(order__status__in=EXCLUDED_STATUSES)
+    rollups = VendorDailyRevenue.objects.all()
+    if vendor_ids is not None:
+        ordered_food = ordered_food.filter(fooditem__vendor_id__in=vendor_ids)
+        rollups = rollups.filter(vendor_id__in=vendor_ids)
+
+    expected = {
+        (row['fooditem__vendor_id'], row['day']): row
+        for row in ordered_food.annotate(day=_day()).values('fooditem__vendor_id', 'day').annotate(
+            orders_count=Count('order', distinct=True),
+            subtotal=Sum('amount'),
+        )
+    }
+    actual = {(row.vendor_id, row.date): row for row in rollups}
+
+    mismatches = []
+    for key in sorted(set(expected) | set(actual), key=lambda k: (k[0], k[1])):
+        vendor_id, day = key
+        raw = expected.get(key)
+        rollup = actual.get(key)
+        raw_count = raw['orders_count'] if raw else 0
+        raw_subtotal = Decimal(str(raw['subtotal'])) if raw else Decimal('0')
+        rollup_count = rollup.orders_count if rollup else 0
+        rollup_subtotal = (rollup.revenue - rollup.tax) if rollup else Decimal('0')
+        if raw_count != rollup_count:
+            mismatches.append((vendor_id, day, 'orders_count', raw_count, rollup_count))
+        if abs(raw_subtotal - rollup_subtotal) > tolerance:
+            mismatches.append((vendor_id, day, 'subtotal', raw_subtotal, rollup_subtotal))
+    return mismatches
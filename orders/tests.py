@@ -1,3 +1,219 @@
-from django.test import TestCase
+import asyncio
+import json
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.db import IntegrityError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from marketplace.models import Cart
+from takeawaysite.testing import create_food, create_user, create_vendor, place_paid_order
+from . import feed, utils
+from .models import Order, OrderEvent, OrderedFood
+from .utils import MAX_SEQUENCE, NODE_BITS, ORDER_NUMBER_EPOCH_MS, SEQUENCE_BITS, generate_order_number, save_new_order
+
+NOW_MS = ORDER_NUMBER_EPOCH_MS + 86_400_000
+
+
+def split_order_number(number):
+    """
+    Returns the (milliseconds, node id, sequence) parts of an order number.
+    """
+    number = int(number)
+    return (
+        (number >> (NODE_BITS + SEQUENCE_BITS)) + ORDER_NUMBER_EPOCH_MS,
+        (number >> SEQUENCE_BITS) & ((1 << NODE_BITS) - 1),
+        number & MAX_SEQUENCE,
+    )
+
+
+def order_fields(**fields):
+    return {
+        'first_name': 'Maria', 'last_name': 'Test', 'email': 'maria@example.com', 'address': '1 Test Street',
+        'city': 'Sofia', 'pin_code': '1000', 'total': 10.0, 'total_tax': 0.0, 'payment_method': 'PayPal',
+        **fields,
+    }
+
+
+@override_settings(ORDER_NUMBER_NODE_ID=7)
+class GenerateOrderNumberTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.multiple(utils, _last_ms=0, _sequence=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        clock = mock.patch.object(utils, 'time')
+        self.time = clock.start().time
+        self.time.return_value = NOW_MS / 1000
+        self.addCleanup(clock.stop)
+
+    def test_numbers_of_the_same_millisecond_are_unique_and_ordered(self):
+        numbers = [generate_order_number() for _ in range(100)]
+
+        self.assertEqual(len(set(numbers)), 100)
+        self.assertEqual([int(number) for number in numbers], sorted(int(number) for number in numbers))
+        self.assertEqual([split_order_number(number) for number in numbers[:3]],
+                         [(NOW_MS, 7, 0), (NOW_MS, 7, 1), (NOW_MS, 7, 2)])
+        self.assertTrue(all(number.isdigit() for number in numbers))
+
+    def test_numbers_keep_growing_when_the_clock_goes_back(self):
+        first = generate_order_number()
+        self.time.return_value = (NOW_MS - 5000) / 1000
+
+        self.assertGreater(int(generate_order_number()), int(first))
+
+    def test_a_used_up_sequence_continues_in_the_next_millisecond(self):
+        utils._last_ms = NOW_MS
+        utils._sequence = MAX_SEQUENCE - 1
+
+        numbers = [generate_order_number() for _ in range(3)]
+
+        self.assertEqual([split_order_number(number) for number in numbers],
+                         [(NOW_MS, 7, MAX_SEQUENCE), (NOW_MS + 1, 7, 0), (NOW_MS + 1, 7, 1)])
+
+
+class SaveNewOrderTests(TestCase):
+
+    def test_a_clashing_number_is_replaced(self):
+        taken = Order.objects.create(**order_fields()).order_number
+        order = Order(**order_fields(order_number=taken))
+
+        save_new_order(order)
+
+        self.assertNotEqual(order.order_number, taken)
+        self.assertEqual(Order.objects.filter(order_number__in=[taken, order.order_number]).count(), 2)
+
+    def test_gives_up_after_the_last_attempt(self):
+        taken = Order.objects.create(**order_fields()).order_number
+        order = Order(**order_fields(order_number=taken))
+
+        with mock.patch.object(utils, 'generate_order_number', return_value=taken), self.assertRaises(IntegrityError):
+            save_new_order(order, attempts=2)
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class BackfillOrderNumbersTests(TransactionTestCase):
+    """
+    Runs the data migration of orders 0006 on orders saved before the unique index.
+    """
+    migrate_from = [('orders', '0005_vendordailyrevenue')]
+    migrate_to = [('orders', '0006_order_order_number_unique')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_renumbers_empty_non_numeric_and_duplicate_numbers(self):
+        Order = self.migrate(self.migrate_from).get_model('orders', 'Order')
+        numbers = ['1001', '', 'ORD-17', '1001', '1002']
+        ids = [Order.objects.create(**order_fields(order_number=number)).pk for number in numbers]
+
+        Order = self.migrate(self.migrate_to).get_model('orders', 'Order')
+
+        renumbered = dict(Order.objects.values_list('pk', 'order_number'))
+        self.assertEqual(renumbered[ids[0]], '1001')
+        self.assertEqual(renumbered[ids[4]], '1002')
+        for pk in ids[1:4]:
+            self.assertTrue(renumbered[pk].isdigit())
+        self.assertEqual(len(set(renumbered.values())), len(numbers))
+
+
+class OrderFeedTests(TestCase):
+    """
+    Pays an order and changes its status through the views, as the checkout page
+    and the vendor dashboard do, and checks the events of the vendors' live feeds.
+    """
+
+    def setUp(self):
+        self.pizzeria = create_vendor('pizzeria')
+        self.grill = create_vendor('grill')
+        self.customer = create_user('maria')
+        self.client.force_login(self.customer)
+        self.order = place_paid_order(self.client, self.customer, [
+            (create_food(self.pizzeria, 'Margherita', Decimal('9.50')), 1),
+            (create_food(self.grill, 'Kebab', Decimal('7.00')), 2),
+        ])
+
+    def test_paying_publishes_the_order_to_its_vendors(self):
+        self.assertTrue(self.order.is_ordered)
+        self.assertEqual(self.order.payment.transaction_id, 'PAYID-TEST')
+        self.assertEqual(OrderedFood.objects.filter(order=self.order).count(), 2)
+        self.assertFalse(Cart.objects.filter(user=self.customer).exists())
+
+        events = OrderEvent.objects.filter(order=self.order).order_by('vendor_id')
+        self.assertEqual([event.vendor_id for event in events], [self.pizzeria.id, self.grill.id])
+        for event in events:
+            vendor_total = self.order.vendor_totals.get(vendor_id=event.vendor_id)
+            self.assertEqual(event.kind, OrderEvent.NEW_ORDER)
+            self.assertEqual(event.data['id'], self.order.id)
+            self.assertEqual(event.data['name'], 'Maria Test')
+            self.assertEqual(event.data['total'], f'{vendor_total.grand_total:.2f}')
+
+    def test_a_second_submit_of_the_payment_changes_nothing(self):
+        response = self.client.post(reverse('payments'), {
+            'order_number': self.order.order_number, 'transaction_id': 'PAYID-AGAIN',
+            'payment_method': 'PayPal', 'status': 'COMPLETED',
+        }, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+        self.assertEqual(response.json()['transaction_id'], 'PAYID-TEST')
+        self.assertEqual(OrderEvent.objects.filter(order=self.order).count(), 2)
+
+    def test_a_status_change_is_published(self):
+        self.client.force_login(self.pizzeria.user)
+
+        response = self.client.post(
+            reverse('update_order_status', args=[self.order.id]), json.dumps({'status': 'Accepted'}),
+            content_type='application/json', HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+
+        self.assertEqual(response.json(), {'status': 'success'})
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'Accepted')
+        events = OrderEvent.objects.filter(order=self.order, kind=OrderEvent.STATUS_CHANGED)
+        self.assertEqual(sorted(event.vendor_id for event in events), [self.pizzeria.id, self.grill.id])
+        self.assertTrue(all(event.data['status'] == 'Accepted' for event in events))
+
+    def test_the_poller_reads_the_vendors_with_new_events(self):
+        events = OrderEvent.objects.filter(order=self.order).order_by('id')
+        last_id = events.last().id
+
+        # the first read only finds where the feed is
+        self.assertEqual(feed.poll_events(None), (last_id, []))
+        self.assertEqual(feed.poll_events(events.first().id - 1), (last_id, sorted([self.pizzeria.id, self.grill.id])))
+        self.assertEqual(feed.poll_events(last_id), (last_id, []))
+
+
+class OrderFeedPollerTests(SimpleTestCase):
+
+    def test_the_poller_wakes_the_streams_until_listen_runs(self):
+        async def poll():
+            waiter = (asyncio.get_running_loop(), asyncio.Event())
+            feed._add_waiter(7, waiter)
+            try:
+                await feed._poll()
+            finally:
+                feed._remove_waiter(7, waiter)
+            return waiter[1].is_set()
+
+        with (
+            mock.patch.object(feed, 'poll_events', return_value=(1, [7])) as poll_events,
+            mock.patch.object(feed, 'listening', side_effect=[False, True]),
+            mock.patch.object(feed, 'POLL_SECONDS', 0),
+        ):
+            self.assertTrue(asyncio.run(poll()))
+        poll_events.assert_called_once_with(None)
+
+    def test_the_poller_stops_without_streams(self):
+        async def poll():
+            await feed._poll()
+
+        with mock.patch.object(feed, 'poll_events') as poll_events, mock.patch.object(feed, 'listening', return_value=False):
+            asyncio.run(poll())
+        poll_events.assert_not_called()
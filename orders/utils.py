@@ -1,33 +1,194 @@
-import datetime
+import hashlib
+import os
+import socket
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
 import simplejson as json
 
+# Order numbers are time-ordered 63-bit ids (at most 19 digits), allocated without
+# touching the database: milliseconds since ORDER_NUMBER_EPOCH_MS, a node id of the
+# process and a per-millisecond sequence.
+ORDER_NUMBER_EPOCH_MS = 1704067200000  # 2024-01-01 00:00 UTC
+NODE_BITS = 10
+SEQUENCE_BITS = 12
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+_order_number_lock = threading.Lock()
+_last_ms = 0
+_sequence = 0
+_node_id = None
+
+
+def order_number_node_id():
+    """
+    Returns the node id of this process: the ORDER_NUMBER_NODE_ID setting, or a hash of
+    the host name and process id. The unique index on Order.order_number catches the
+    rare collision of two processes with the same hash.
+    """
+    global _node_id
+    configured = getattr(settings, 'ORDER_NUMBER_NODE_ID', None)
+    if configured is not None:
+        return configured % (1 << NODE_BITS)
+    if _node_id is None or _node_id[0] != os.getpid():
+        # recomputed after a fork, so worker processes get their own id
+        digest = hashlib.sha1(f'{socket.gethostname()}:{os.getpid()}'.encode()).digest()
+        _node_id = (os.getpid(), int.from_bytes(digest[:4], 'big') % (1 << NODE_BITS))
+    return _node_id[1]
+
+
+def generate_order_number():
+    """
+    Allocates a new order number before the order is inserted.
+
+    The numbers grow with time, so they sort like the orders were placed, and are
+    unique per process even within the same millisecond.
+
+    Returns:
+        str: The order number, e.g. '369620730186092544' (digits only, so it fits the
+            <int:order_number> URLs).
+    """
+    global _last_ms, _sequence
+    with _order_number_lock:
+        now_ms = max(int(time.time() * 1000), _last_ms)  # never goes back with the clock
+        if now_ms == _last_ms:
+            _sequence += 1
+            if _sequence > MAX_SEQUENCE:
+                # the sequence of this millisecond is used up, continue in the next one
+                now_ms += 1
+                _sequence = 0
+        else:
+            _sequence = 0
+        _last_ms = now_ms
+        number = ((now_ms - ORDER_NUMBER_EPOCH_MS) << (NODE_BITS + SEQUENCE_BITS)) | (order_number_node_id() << SEQUENCE_BITS) | _sequence
+    return str(number)
+
+def save_new_order(order, attempts=3):
+    """
+    Inserts a new order with a single write.
+
+    The order number is allocated when the Order is instantiated (see
+    generate_order_number()). If it clashes with one allocated by another process,
+    a fresh number is drawn and the insert retried.
+
+    Args:
+        order (Order): The unsaved order.
+        attempts (int): The number of inserts tried.
+
+    Returns:
+        Order: The saved order.
+    """
+    for attempt in range(attempts):
+        try:
+            with transaction.atomic():
+                order.save(force_insert=True)
+            return order
+        except IntegrityError:
+            clash = type(order).objects.filter(order_number=order.order_number).exists()
+            if not clash or attempt == attempts - 1:
+                raise
+            order.order_number = generate_order_number()
 
-def generate_order_number(pk):
-    current_datetime = datetime.datetime.now().strftime('%Y%m%d%H%M%S') # 20240601121213 + pk
-    order_number = current_datetime + str(pk)
-    return order_number
+
+def parse_total_data(total_data):
+    """
+    Converts the legacy Order.total_data blob into per-vendor totals.
+
+    total_data is stored as {"vendor_id": {"subtotal": "{'tax_type': {'tax_percentage': 'tax_amount'}}"}},
+    either as a dict or as a JSON string, with the tax dictionaries stringified with single quotes.
+
+    Returns:
+        dict: {vendor_id (int): {'subtotal', 'tax', 'tax_dict', 'grand_total'}} with Decimal amounts.
+    """
+    if not total_data:
+        return {}
+    if isinstance(total_data, str):
+        total_data = json.loads(total_data)
+
+    totals = {}
+    for vendor_id, data in total_data.items():
+        subtotal = Decimal('0')
+        tax = Decimal('0')
+        tax_dict = {}
+        for key, val in data.items():
+            subtotal += Decimal(key)
+            if isinstance(val, str):
+                val = json.loads(val.replace("'", '"'))
+            tax_dict.update(val)
+
+            # {'ДДС': {'9.00': '3.46'}}
+            for i in val:
+                for j in val[i]:
+                    tax += Decimal(str(val[i][j]))
+        totals[int(vendor_id)] = {
+            'subtotal': subtotal,
+            'tax': tax,
+            'tax_dict': tax_dict,
+            'grand_total': subtotal + tax,
+        }
+    return totals
+
+def create_vendor_totals(order, totals=None):
+    """
+    Writes the OrderVendorTotal rows of an order.
+
+    Args:
+        order (Order): A saved order with total_data.
+        totals (dict, optional): The per-vendor totals in the format of parse_total_data(),
+            e.g. from CartPartition.vendor_totals(). Defaults to parsing order.total_data.
+
+    Returns:
+        list: The created OrderVendorTotal instances.
+    """
+    if totals is None:
+        totals = parse_total_data(order.total_data)
+    rows = [
+        order.vendor_totals.model(
+            order=order,
+            vendor_id=vendor_id,
+            subtotal=vendor_total['subtotal'],
+            tax=vendor_total['tax'],
+            grand_total=vendor_total['grand_total'],
+            tax_data=vendor_total['tax_dict'],
+        )
+        for vendor_id, vendor_total in totals.items()
+    ]
+    return order.vendor_totals.model.objects.bulk_create(rows)
 
 def order_total_by_vendor(order, vendor_id):
-    total_data = json.loads(order.total_data)
-    data = total_data.get(str(vendor_id))
-    subtotal = 0
-    tax = 0
-    tax_dict = {}
-
-    for key, val in data.items():
-        subtotal += float(key)
-        val = val.replace("'", '"')
-        val = json.loads(val)
-        tax_dict.update(val)
-
-        for i in val:
-            for j in val[i]:
-                tax += float(val[i][j])
-    grand_total = float(subtotal) + float(tax)
+    """
+    Returns the subtotal, tax breakdown and grand total of the part of an order placed to a vendor.
+
+    The numbers are read from the OrderVendorTotal table (prefetched rows are used when
+    available). Orders that have not been backfilled yet fall back to parsing total_data.
+
+    Args:
+        order (Order): The order.
+        vendor_id (int): The id of the vendor.
+
+    Returns:
+        dict: A dictionary with 'subtotal', 'tax_dict' and 'grand_total'.
+    """
+    if 'vendor_totals' in getattr(order, '_prefetched_objects_cache', {}):
+        vendor_total = next((i for i in order.vendor_totals.all() if i.vendor_id == vendor_id), None)
+    else:
+        vendor_total = order.vendor_totals.filter(vendor_id=vendor_id).first()
+
+    if vendor_total is not None:
+        totals = {
+            'subtotal': vendor_total.subtotal,
+            'tax_dict': vendor_total.tax_data,
+            'grand_total': vendor_total.grand_total,
+        }
+    else:
+        totals = parse_total_data(order.total_data).get(vendor_id, {})
     context = {
-        'subtotal': subtotal,
-        'tax_dict': tax_dict, 
-        'grand_total': grand_total,
+        'subtotal': totals.get('subtotal', 0),
+        'tax_dict': totals.get('tax_dict', {}),
+        'grand_total': totals.get('grand_total', 0),
     }
 
-    return context
\ No newline at end of file
+    return context
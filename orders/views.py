@@ -1,67 +1,33 @@
-from urllib import response
 from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render, redirect
-from marketplace.models import Cart, Tax
-from .models import Payment
-from marketplace.models import Tax
-from marketplace.context_processors import get_cart_amounts
-from menu.models import FoodItem
+from marketplace.cart import get_cart_partition, get_cart_summary
 from .forms import OrderForm
-from .models import Order, OrderedFood, Payment
-from .utils import generate_order_number, order_total_by_vendor
-from accounts.utils import send_notification
+from .models import Order, OrderedFood
+from .utils import create_vendor_totals, save_new_order
+from .checkout import complete_payment
 from django.contrib.auth.decorators import login_required
 from django.contrib.sites.shortcuts import get_current_site
+from django.db import transaction
 import simplejson as json
 
 
 # Create your views here.
 @login_required(login_url='login')
 def place_order(request):
-    cart_items = Cart.objects.filter(user=request.user).order_by('created_at')
-    cart_count = cart_items.count()
-    if cart_count <= 0:
+    # one joined query gives the cart items grouped by vendor with their subtotals and taxes
+    cart = get_cart_partition(request)
+    if cart.cart_count <= 0:
         return redirect('marketplace')
-    
-    vendor_ids = []
 
-    for i in cart_items:
-        if i.fooditem.vendor.id not in vendor_ids:
-            vendor_ids.append(i.fooditem.vendor.id)
-    
+    vendor_ids = list(cart.vendors)
+
     # {"vendor_id": {"subtotal" :{"tax_type": {"tax_percentage": "tax_amount"}}}} without the delivery value
-    get_tax = Tax.objects.filter(is_active=True)
-    subtotal = 0
-    total_data = {}
-    k = {}
-    for i in cart_items:
-        fooditem = FoodItem.objects.get(pk=i.fooditem.id, vendor_id__in=vendor_ids)
-        v_id = fooditem.vendor.id
-        if v_id in k:
-            subtotal = k[v_id]
-            subtotal += (fooditem.price * i.quantity)
-            k[v_id] = subtotal
-        else:
-            subtotal = (fooditem.price * i.quantity)
-            k[v_id] = subtotal
-        
-        # Calculate the TAX data
-        tax_dict = {}
-        for i in get_tax:
-            tax_type = i.tax_type
-            if tax_type == "ДДС":
-                tax_percentage = i.tax_percentage
-                tax_amount_vat = round((tax_percentage * subtotal) / 100, 2)
-                tax_dict.update({tax_type: {str(tax_percentage): str(tax_amount_vat)}})
-        
-        # Construct total data
-        total_data.update({fooditem.vendor.id: {str(subtotal): str(tax_dict)}})
+    total_data = cart.total_data()
 
-    
-    subtotal = get_cart_amounts(request)['subtotal']
-    total_tax = get_cart_amounts(request)['tax']
-    grand_total = get_cart_amounts(request)['grand_total']
-    tax_data = get_cart_amounts(request)['tax_dict']
+    cart_summary = get_cart_summary(request)
+    total_tax = cart_summary['tax']
+    grand_total = cart_summary['grand_total']
+    tax_data = cart_summary['tax_dict']
     
     if request.method == "POST":
         form = OrderForm(request.POST)
@@ -81,13 +47,14 @@ def place_order(request):
             order.total_data = json.dumps(total_data, ensure_ascii=False)
             order.total_tax = total_tax
             order.payment_method = request.POST['payment_method']
-            order.save() # order id/pk is generated
-            order.order_number = generate_order_number(order.id)
-            order.vendors.add(*vendor_ids)
-            order.save()
+            with transaction.atomic():
+                # the order number was allocated with the Order, so it is written in one INSERT
+                save_new_order(order)
+                order.vendors.add(*vendor_ids)
+                create_vendor_totals(order, cart.vendor_totals())
             context = {
                 'order': order,
-                'cart_items': cart_items,
+                'cart_items': cart.items,
             }
             return render(request, 'orders/place_order.html', context)
         else:
@@ -99,91 +66,24 @@ def place_order(request):
 def payments(request):
     # Checks if the request is an AJAX request and if it is a POST method
     if request.headers.get('x-requested-with') == 'XMLHttpRequest' and request.method == 'POST':
-        # Retrieves the payment details from the POST request and store them into the Payment model
+        # Retrieves the payment details from the POST request
         order_number = request.POST.get('order_number')
         transaction_id = request.POST.get('transaction_id')
         payment_method = request.POST.get('payment_method')
         status = request.POST.get('status')
 
-        # Finds the relevant order
-        order = Order.objects.get(user=request.user, order_number=order_number)
-        payment = Payment(
-            user = request.user,
-            transaction_id = transaction_id,
-            payment_method = payment_method,
-            amount = order.total,
-            status = status
-        )
-        payment.save()
-
-        # UPDATE THE ORDER MODEL
-        order.payment = payment
-        order.is_ordered = True
-        order.save()
-
-        # MOVE THE CART ITEMS TO ORDERED FOOD MODEL
-        cart_items = Cart.objects.filter(user=request.user)
-        for item in cart_items:
-            ordered_food = OrderedFood()
-            ordered_food.order = order
-            ordered_food.payment = payment
-            ordered_food.user = request.user
-            ordered_food.fooditem = item.fooditem
-            ordered_food.quantity = item.quantity
-            ordered_food.price = item.fooditem.price
-            ordered_food.amount = item.fooditem.price * item.quantity # total amount
-            ordered_food.save()
-
-        # SEND ORDER CONFIRMATION EMAIL TO THE CUSTOMER
-        mail_subject = 'Thank you for ordering with us.'
-        mail_template = 'orders/order_confirmation_email.html'
-
-        ordered_food = OrderedFood.objects.filter(order=order)
-        customer_subtotal = 0
-        for item in ordered_food:
-            customer_subtotal += (item.price * item.quantity)
-
-        tax_data = json.loads(order.tax_data)
-        context = {
-            'user': request.user,
-            'order': order,
-            'to_email': order.email,
-            'ordered_food': ordered_food,
-            'domain': get_current_site(request),
-            'customer_subtotal': customer_subtotal,
-            'tax_data': tax_data,
-        }
-        send_notification(mail_subject, mail_template, context)
-
-        # SEND ORDER RECEIVED EMAIL TO THE VENDOR
-        mail_subject = 'You have received a new order.'
-        mail_template = 'orders/new_order_received.html'
-        to_emails = []
-        for i in cart_items:
-            if i.fooditem.vendor.user.email not in to_emails:
-                to_emails.append(i.fooditem.vendor.user.email)
-
-                ordered_food_to_vendor = OrderedFood.objects.filter(order=order, fooditem__vendor=i.fooditem.vendor)
-                # print(ordered_food_to_vendor)
-
-        
-                context = {
-                    'order': order,
-                    'to_email': i.fooditem.vendor.user.email,
-                    'ordered_food_to_vendor': ordered_food_to_vendor,
-                    'vendor_subtotal': order_total_by_vendor(order, i.fooditem.vendor.id)['subtotal'],
-                    'tax_data': order_total_by_vendor(order, i.fooditem.vendor.id)['tax_dict'],
-                    'vendor_grand_total': order_total_by_vendor(order, i.fooditem.vendor.id)['grand_total'],
-                }
-                send_notification(mail_subject, mail_template, context)
-
-        # CLEAR THE CART IF THE PAYMENT IS SUCCESS
-        cart_items.delete()
+        # Stores the payment, moves the cart items to the ordered food, queues the
+        # confirmation emails and clears the cart - all in one transaction
+        try:
+            order, created = complete_payment(request.user, order_number, transaction_id, payment_method, status, get_current_site(request))
+        except Order.DoesNotExist:
+            return JsonResponse({'status': 'Failed', 'message': 'Order not found!'})
 
         # RETURN BACK TO AJAX WITH THE STATUS SUCCESS OR FAILURE
+        # (a repeated submit gets the transaction of the first one)
         response = {
             'order_number': order_number,
-            'transaction_id': transaction_id,
+            'transaction_id': order.payment.transaction_id,
         }
         return JsonResponse(response)
     
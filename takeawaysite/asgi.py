@@ -3,6 +3,15 @@ ASGI config for takeawaysite project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The cart AJAX endpoints (marketplace.views.add_to_cart, decrease_cart and
+delete_cart) are async views and the project middleware is async capable, so
+served from here (e.g. ``uvicorn takeawaysite.asgi:application``) a cart click
+does not hold a worker thread while it waits for the database.
+
+The live order feed of the vendor pages (vendor.views.order_events, see
+orders.feed) is a long-lived server-sent event stream and needs to be served
+from here as well.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
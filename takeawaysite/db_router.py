@@ -0,0 +1,197 @@
+"""
+Read replicas.
+
+The read-heavy views (the home page, the marketplace, a vendor's menu, the
+search and the order histories) read from a replica of the database, all other
+queries and all writes go to the primary ('default'). The replicas are the
+DATABASE_REPLICAS aliases of DATABASES (see settings.DB_REPLICA_HOSTS).
+
+Reads are routed to a replica only inside use_replica():
+
+    @use_replica
+    def marketplace(request):
+        ...
+
+    with use_replica():
+        vendors = list(Vendor.objects.filter(is_approved=True))
+
+use_primary() does the opposite, for the parts of a replica view that must see
+the latest data. A replica is picked per block, so a page reads consistent data.
+
+A replica lags behind the primary, so a user must not be sent to it right
+after they wrote (added to the cart, placed an order): ReplicaPinningMiddleware
+sets a cookie on every response of a request that wrote, and the requests of
+the next READ_AFTER_WRITE_SECONDS read from the primary. Reads made inside a
+transaction, or after a write in the same request, go to the primary as well.
+
+To try it locally, point DB_REPLICA_HOSTS at the same server as DB_HOST: the
+replica alias is then a second connection to the same database. Under
+manage.py test the views read from the primary, and replica1 mirrors the test
+database for the router tests (takeawaysite/tests.py).
+"""
+import random
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+READ_AFTER_WRITE_COOKIE = 'db_primary'
+
+_replica_alias = ContextVar('replica_alias', default=None)
+_request_state = ContextVar('routing_state', default=None)
+
+
+@dataclass
+class RoutingState:
+    """
+    The routing state of a request.
+
+    Attributes:
+        pinned (bool): The user wrote within the last READ_AFTER_WRITE_SECONDS.
+        wrote (bool): The request has written to the database.
+    """
+    pinned: bool = False
+    wrote: bool = False
+
+
+def replica_aliases():
+    """
+    Returns the database aliases of the replicas.
+    """
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class ReadFrom:
+    """
+    Context manager and view decorator choosing where the reads of a block go,
+    see use_replica() and use_primary().
+    """
+
+    def __init__(self, replica):
+        self.replica = replica
+        self._token = None
+
+    def __enter__(self):
+        aliases = replica_aliases()
+        alias = random.choice(aliases) if self.replica and aliases else None
+        self._token = _replica_alias.set(alias)
+        return alias
+
+    def __exit__(self, *exc_info):
+        _replica_alias.reset(self._token)
+
+    def __call__(self, func):
+        # a new instance per call, so concurrent calls do not share the token
+        if iscoroutinefunction(func):
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                with ReadFrom(self.replica):
+                    return await func(*args, **kwargs)
+
+            return markcoroutinefunction(wrapper)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with ReadFrom(self.replica):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+
+def use_replica(func=None):
+    """
+    Sends the reads of a view or a with block to a replica.
+
+    Usable as @use_replica or as with use_replica(): ...
+    """
+    return ReadFrom(True)(func) if func is not None else ReadFrom(True)
+
+
+def use_primary(func=None):
+    """
+    Sends the reads of a view or a with block to the primary, also inside use_replica().
+
+    Usable as @use_primary or as with use_primary(): ...
+    """
+    return ReadFrom(False)(func) if func is not None else ReadFrom(False)
+
+
+class ReplicaRouter:
+    """
+    Database router sending the reads made inside use_replica() to a replica and
+    everything else to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = _replica_alias.get()
+        if alias is None:
+            return None
+        state = _request_state.get()
+        if state is not None and (state.pinned or state.wrote):
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # a transaction reads its own writes
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replica_aliases():
+            return False
+        return None
+
+
+def _finish(request, response, state):
+    if state.wrote and replica_aliases():
+        response.set_cookie(
+            READ_AFTER_WRITE_COOKIE, '1',
+            max_age=getattr(settings, 'READ_AFTER_WRITE_SECONDS', 5),
+            httponly=True, samesite='Lax', secure=request.is_secure(),
+        )
+    return response
+
+
+def ReplicaPinningMiddleware(get_response):
+    """
+    Keeps the reads of a user on the primary for READ_AFTER_WRITE_SECONDS after
+    a request of theirs wrote to the database, see the module docstring.
+    Works in both WSGI and ASGI deployments.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            state = RoutingState(pinned=READ_AFTER_WRITE_COOKIE in request.COOKIES)
+            token = _request_state.set(state)
+            try:
+                response = await get_response(request)
+            finally:
+                _request_state.reset(token)
+            return _finish(request, response, state)
+
+        return markcoroutinefunction(middleware)
+
+    def middleware(request):
+        state = RoutingState(pinned=READ_AFTER_WRITE_COOKIE in request.COOKIES)
+        token = _request_state.set(state)
+        try:
+            response = get_response(request)
+        finally:
+            _request_state.reset(token)
+        return _finish(request, response, state)
+
+    return middleware
+
+
+ReplicaPinningMiddleware.sync_capable = True
+ReplicaPinningMiddleware.async_capable = True
@@ -0,0 +1,267 @@
+"""
+Responsive image derivatives.
+
+When an image (FoodItem.image, UserProfile.profile_picture / cover_photo) is
+uploaded, resized WebP and JPEG copies are written at fixed widths next to it
+under MEDIA_ROOT/derivatives/. The file names contain a hash of their content,
+so they never change once written and can be served with far-future cache
+headers. The names are recorded in a JSON field of the model:
+
+    {
+        "source": "foodimages/pizza.png",
+        "width": 1600, "height": 1200,
+        "webp": {"160": "derivatives/foodimages/pizza.160w.1a2b3c4d5e6f.webp", ...},
+        "jpeg": {"160": "derivatives/foodimages/pizza.160w.9f8e7d6c5b4a.jpg", ...}
+    }
+
+Resizing and re-encoding takes seconds for a large upload, so it does not run
+in the request: saving a new image queues an ImageDerivativeJob
+(queue_derivatives()) and the build_image_derivatives management command
+builds the queued images (build_queued_derivatives()). Until then, and for
+files that are not readable images, the templatetags in
+takeawaysite.templatetags.images show the original. They only use derivatives
+whose "source" is the current file. The generate_image_derivatives management
+command backfills existing media.
+
+The derivatives field is written with update(), so no post_save runs for it;
+derivatives_built is sent instead, for the caches that render the images
+(see marketplace.signals).
+"""
+import hashlib
+import io
+import posixpath
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.dispatch import Signal
+from PIL import Image, ImageOps
+
+from accounts.models import ImageDerivativeJob
+
+# Widths of the derivatives, in pixels. Images are never upscaled.
+IMAGE_WIDTHS = (160, 320, 640, 1280)
+DERIVATIVES_DIR = 'derivatives'
+
+FORMATS = {
+    # format: (PIL format, extension, save options)
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# Sent with the model as sender and the pk of the instance whose derivatives were stored.
+derivatives_built = Signal()
+
+
+def _encode(image, fmt):
+    pil_format, extension, options = FORMATS[fmt]
+    if pil_format == 'JPEG' and image.mode != 'RGB':
+        # JPEG has no alpha channel, transparent parts become white
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue(), extension
+
+
+def derivative_widths(width):
+    """
+    Returns the derivative widths of an image of this width: every fixed width below it,
+    plus the image's own width (capped at the largest fixed width).
+    """
+    widths = {w for w in IMAGE_WIDTHS if w < width}
+    widths.add(min(width, IMAGE_WIDTHS[-1]))
+    return sorted(widths)
+
+
+def build_derivatives(name, storage=None):
+    """
+    Writes the derivatives of a stored image.
+
+    Args:
+        name (str): The name of the original in the storage.
+        storage (Storage, optional): Defaults to the default storage.
+
+    Returns:
+        dict: The derivatives, see the module docstring.
+    """
+    storage = storage or default_storage
+    with storage.open(name, 'rb') as original:
+        image = Image.open(original)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+
+    directory = posixpath.join(DERIVATIVES_DIR, posixpath.dirname(name))
+    stem = posixpath.splitext(posixpath.basename(name))[0]
+    derivatives = {'source': name, 'width': image.width, 'height': image.height}
+    for fmt in FORMATS:
+        derivatives[fmt] = {}
+
+    for width in derivative_widths(image.width):
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for fmt in FORMATS:
+            data, extension = _encode(resized, fmt)
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            derivative_name = posixpath.join(directory, f'{stem}.{width}w.{digest}.{extension}')
+            if not storage.exists(derivative_name):
+                derivative_name = storage.save(derivative_name, ContentFile(data))
+            derivatives[fmt][str(width)] = derivative_name
+    return derivatives
+
+
+def derivative_names(derivatives):
+    """
+    Returns the file names of all derivatives in a derivatives dictionary.
+    """
+    return {name for fmt in FORMATS for name in (derivatives or {}).get(fmt, {}).values()}
+
+
+def delete_derivatives(derivatives, keep=(), storage=None):
+    """
+    Deletes the files of old derivatives, except the names in keep.
+    """
+    storage = storage or default_storage
+    for name in derivative_names(derivatives) - set(keep):
+        storage.delete(name)
+
+
+def current_derivatives(field_file, derivatives):
+    """
+    Returns the derivatives if they were built from the current file of the image field, else None.
+    """
+    if field_file and derivatives and derivatives.get('source') == field_file.name:
+        return derivatives
+    return None
+
+
+def queue_derivatives(instance, field_name, derivatives_field):
+    """
+    Queues the rebuild of the derivatives of an image field if its file has changed since they were built.
+
+    Meant to be called from a post_save receiver. The job is inserted in the transaction
+    of the save, so it is only built if the save commits.
+
+    Args:
+        instance (Model): The saved instance.
+        field_name (str): The name of the image field.
+        derivatives_field (str): The name of the JSON field holding the derivatives.
+
+    Returns:
+        bool: True if the image needs new derivatives.
+    """
+    field_file = getattr(instance, field_name)
+    source = field_file.name if field_file else None
+    if (getattr(instance, derivatives_field) or {}).get('source') == source:
+        return False
+    ImageDerivativeJob.objects.bulk_create([
+        ImageDerivativeJob(
+            model=instance._meta.label_lower, object_id=instance.pk,
+            field_name=field_name, derivatives_field=derivatives_field,
+        )
+    ], ignore_conflicts=True)
+    return True
+
+
+def build_job(job):
+    """
+    Builds the derivatives of the image of a job and stores them on the instance.
+
+    The derivatives field is written with update(), so no receiver runs again, and only
+    if the image has not been replaced in the meantime (its own job builds it then).
+
+    Returns:
+        bool: False if the file is not a readable image, True otherwise.
+    """
+    model = apps.get_model(job.model)
+    row = model._default_manager.filter(pk=job.object_id).values_list(job.field_name, job.derivatives_field).first()
+    if row is None:
+        # deleted since
+        return True
+    name, old = row[0] or None, row[1] or {}
+    if old.get('source') == name:
+        return True
+
+    storage = model._meta.get_field(job.field_name).storage
+    readable = True
+    new = {}
+    if name:
+        try:
+            new = build_derivatives(name, storage)
+        except (OSError, Image.DecompressionBombError):
+            # not a readable image (or missing file); the original keeps being served
+            readable = False
+            new = {'source': name}
+    current = {job.field_name: row[0]}
+    if model._default_manager.filter(pk=job.object_id, **current).update(**{job.derivatives_field: new}):
+        delete_derivatives(old, keep=derivative_names(new), storage=storage)
+        derivatives_built.send(sender=model, pk=job.object_id)
+    else:
+        delete_derivatives(new, keep=derivative_names(old), storage=storage)
+    return readable
+
+
+def build_queued_derivatives(batch_size=20):
+    """
+    Builds the derivatives of a batch of queued images, oldest first.
+
+    The jobs are taken off the queue before they are built, so several workers can
+    run at once; a job lost with a crashed worker is caught up by the
+    generate_image_derivatives backfill.
+
+    Args:
+        batch_size (int): The maximum number of jobs.
+
+    Returns:
+        tuple: The number of jobs done and of files that are not readable images.
+    """
+    with transaction.atomic():
+        jobs = list(ImageDerivativeJob.objects.select_for_update(skip_locked=True).order_by('pk')[:batch_size])
+        ImageDerivativeJob.objects.filter(pk__in=[job.pk for job in jobs]).delete()
+    done = failed = 0
+    for job in jobs:
+        if build_job(job):
+            done += 1
+        else:
+            failed += 1
+    return done, failed
+
+
+def derivatives_for_name(name):
+    """
+    Builds the derivatives of a stored image, for the backfill worker processes.
+
+    Returns:
+        tuple: The name and its derivatives, or the name and the error message.
+    """
+    try:
+        return name, build_derivatives(name), None
+    except Exception as e:
+        return name, None, str(e)
+
+
+def pick(derivatives, fmt, width):
+    """
+    Returns the name of the smallest derivative of a format at least this wide
+    (the largest one if none is wide enough), or None if there are no derivatives.
+    """
+    sizes = sorted((int(w), name) for w, name in (derivatives or {}).get(fmt, {}).items())
+    if not sizes:
+        return None
+    for w, name in sizes:
+        if w >= width:
+            return name
+    return sizes[-1][1]
+
+
+def srcset(derivatives, fmt, storage=None):
+    """
+    Returns the srcset attribute value of the derivatives of a format.
+    """
+    storage = storage or default_storage
+    sizes = sorted((int(w), name) for w, name in (derivatives or {}).get(fmt, {}).items())
+    return ', '.join(f'{storage.url(name)} {w}w' for w, name in sizes)
@@ -0,0 +1,216 @@
+"""
+Per-request query and timing instrumentation.
+
+InstrumentationMiddleware measures every request:
+
+* the number of SQL queries and the time spent in the database, through an
+  execute wrapper installed on every database connection,
+* the time spent rendering templates, through the InstrumentedDjangoTemplates
+  template backend,
+* the lazy context globals the templates evaluated (see takeawaysite.lazy_context).
+
+The numbers are sent back in a Server-Timing header (shown in the network
+panel of the browser's developer tools) and logged as one JSON line per
+request by the 'takeawaysite.instrumentation' logger.
+
+QUERY_BUDGETS caps the number of queries of a view, by URL name. A request over
+its budget logs a warning, or raises QueryBudgetExceeded when
+QUERY_BUDGET_RAISE is set (the default under manage.py test), so a test
+exercising the view fails when an N+1 query creeps in.
+"""
+import json
+import logging
+import time
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+from .lazy_context import evaluated_context
+
+logger = logging.getLogger(__name__)
+
+_current_metrics = ContextVar('request_metrics', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    Raised when a view runs more queries than its budget and QUERY_BUDGET_RAISE is set.
+    """
+
+
+@dataclass
+class RequestMetrics:
+    """
+    What a request cost. Times are in seconds.
+
+    The template time includes the queries run while rendering (lazy context globals,
+    related objects read in templates), so it overlaps with the database time.
+    """
+    queries: int = 0
+    db_time: float = 0.0
+    templates: int = 0
+    template_time: float = 0.0
+    total_time: float = 0.0
+
+
+def get_current_metrics():
+    """
+    Returns the metrics of the request handled by the current thread or task, or None.
+    """
+    return _current_metrics.get()
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper that counts the queries and their time for the current request.
+    """
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - start
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """
+    connection_created receiver adding record_query() to every new database connection.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_recorder)
+
+
+class InstrumentedTemplate(Template):
+    """
+    Template of the InstrumentedDjangoTemplates backend, timing render().
+    """
+
+    def render(self, context=None, request=None):
+        metrics = _current_metrics.get()
+        if metrics is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.templates += 1
+            metrics.template_time += time.perf_counter() - start
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """
+    The Django template backend, with the render time recorded in the request metrics.
+    """
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return InstrumentedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def get_query_budget(view_name):
+    """
+    Returns the query budget of a view, or None if it has none.
+
+    Args:
+        view_name (str): The URL name of the view.
+    """
+    return getattr(settings, 'QUERY_BUDGETS', {}).get(view_name)
+
+
+def server_timing(metrics):
+    """
+    Returns the Server-Timing header value of the metrics.
+    """
+    return ', '.join([
+        f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries"',
+        f'tpl;dur={metrics.template_time * 1000:.1f};desc="{metrics.templates} templates"',
+        f'total;dur={metrics.total_time * 1000:.1f}',
+    ])
+
+
+def _finish(request, response, metrics, start):
+    metrics.total_time = time.perf_counter() - start
+    match = getattr(request, 'resolver_match', None)
+    view_name = match.view_name if match else None
+
+    if getattr(settings, 'SERVER_TIMING', True):
+        timing = server_timing(metrics)
+        if response.has_header('Server-Timing'):
+            timing = f"{response['Server-Timing']}, {timing}"
+        response['Server-Timing'] = timing
+
+    record = {
+        'method': request.method,
+        'path': request.path,
+        'view': view_name,
+        'status': response.status_code,
+        **asdict(metrics),
+        'context': evaluated_context(request),
+    }
+    for key in ('db_time', 'template_time', 'total_time'):
+        record[key] = round(record[key] * 1000, 1)  # ms
+    logger.info(json.dumps(record, ensure_ascii=False))
+
+    budget = get_query_budget(view_name)
+    if budget is not None and metrics.queries > budget:
+        message = f'{view_name} ran {metrics.queries} queries, over its budget of {budget}'
+        if getattr(settings, 'QUERY_BUDGET_RAISE', False):
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+    return response
+
+
+def InstrumentationMiddleware(get_response):
+    """
+    Records the queries and template render time of every request, see the module docstring.
+    Works in both WSGI and ASGI deployments.
+    """
+    # connections opened before this module was imported (e.g. the test database)
+    for connection in connections.all(initialized_only=True):
+        install_query_recorder(None, connection)
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            metrics = RequestMetrics()
+            token = _current_metrics.set(metrics)
+            start = time.perf_counter()
+            try:
+                response = await get_response(request)
+            finally:
+                _current_metrics.reset(token)
+            return _finish(request, response, metrics, start)
+
+        return markcoroutinefunction(middleware)
+
+    def middleware(request):
+        metrics = RequestMetrics()
+        token = _current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = get_response(request)
+        finally:
+            _current_metrics.reset(token)
+        return _finish(request, response, metrics, start)
+
+    return middleware
+
+
+InstrumentationMiddleware.sync_capable = True
+InstrumentationMiddleware.async_capable = True
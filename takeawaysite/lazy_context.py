@@ -0,0 +1,131 @@
+"""
+Request-scoped lazy values for the template context processors.
+
+Context processors run on every render(), even when the template never reads
+the variables they provide. The helpers in this module wrap a processor's value
+in a SimpleLazyObject so the database is only hit when a template actually
+touches the variable. The value is memoized on the request, so rendering
+several templates in one request still computes it once.
+
+Every evaluation is recorded on the request and LazyContextReportMiddleware
+keeps a per-view count of which globals were evaluated.
+"""
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.functional import SimpleLazyObject, new_method_proxy
+
+logger = logging.getLogger(__name__)
+
+# Attributes used on the request object.
+VALUES_ATTR = '_lazy_context_values'
+EVALUATED_ATTR = '_lazy_context_evaluated'
+# Report key of the requests that resolved to no view (404s), so unknown paths do not grow the report.
+UNRESOLVED = '<unresolved>'
+
+_report_lock = threading.Lock()
+_report = defaultdict(Counter)  # view name -> Counter(global name -> evaluations)
+_requests = Counter()  # view name -> number of rendered requests
+
+
+class LazyValue(SimpleLazyObject):
+    """
+    SimpleLazyObject that can also be formatted, so lazy numbers (cart count, amounts)
+    go through the template number localization like plain ones.
+    """
+    __format__ = new_method_proxy(format)
+
+
+def lazy_context(request, name, func):
+    """
+    Returns a lazy object that computes func() the first time a template uses it.
+
+    Args:
+        request (HttpRequest): The current request, used to memoize the value.
+        name (str): The name of the template variable (used for the report).
+        func (callable): A function without arguments returning the value.
+
+    Returns:
+        LazyValue: The deferred value.
+    """
+    def evaluate():
+        values = request.__dict__.setdefault(VALUES_ATTR, {})
+        if name not in values:
+            values[name] = func()
+            request.__dict__.setdefault(EVALUATED_ATTR, []).append(name)
+        return values[name]
+
+    return LazyValue(evaluate)
+
+
+def evaluated_context(request):
+    """
+    Returns the names of the lazy context globals that were evaluated for this request.
+
+    Args:
+        request (HttpRequest): The request object.
+
+    Returns:
+        list: The evaluated names, in evaluation order.
+    """
+    return list(request.__dict__.get(EVALUATED_ATTR, []))
+
+
+def lazy_context_report():
+    """
+    Returns the per-view report of the evaluated lazy context globals.
+
+    Returns:
+        dict: {view_name: {'requests': int, 'evaluated': {global_name: int}}}
+    """
+    with _report_lock:
+        return {
+            view: {'requests': _requests[view], 'evaluated': dict(_report[view])}
+            for view in _requests
+        }
+
+
+def reset_lazy_context_report():
+    """
+    Clears the per-view report.
+    """
+    with _report_lock:
+        _report.clear()
+        _requests.clear()
+
+
+def _record(request):
+    match = getattr(request, 'resolver_match', None)
+    view_name = match.view_name if match else UNRESOLVED
+    evaluated = evaluated_context(request)
+    with _report_lock:
+        _requests[view_name] += 1
+        _report[view_name].update(evaluated)
+    logger.debug('%s evaluated context globals: %s', view_name, ', '.join(evaluated) or '-')
+
+
+def LazyContextReportMiddleware(get_response):
+    """
+    Records which lazy context globals every view evaluated.
+    Works in both WSGI and ASGI deployments.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            response = await get_response(request)
+            _record(request)
+            return response
+
+        return markcoroutinefunction(middleware)
+
+    def middleware(request):
+        response = get_response(request)
+        _record(request)
+        return response
+
+    return middleware
+
+
+LazyContextReportMiddleware.sync_capable = True
+LazyContextReportMiddleware.async_capable = True
@@ -11,8 +11,9 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -50,6 +51,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'takeawaysite.instrumentation.InstrumentationMiddleware', # query count, DB and template time of every request (Server-Timing header, logs, QUERY_BUDGETS)
+    'takeawaysite.db_router.ReplicaPinningMiddleware', # reads of a user stay on the primary for a few seconds after they wrote
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,17 +60,39 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'orders.request_object.RequestObjectMiddleware', # custom middleware created to access the request object
+    'orders.request_object.RequestObjectMiddleware', # makes the current request available through a contextvar (orders.request_object)
+    'takeawaysite.lazy_context.LazyContextReportMiddleware', # per-view report of the evaluated lazy context globals
 ]
 
+# Maximum number of SQL queries per view (by URL name), checked by the instrumentation
+# middleware. An exceeded budget is logged, or raises QueryBudgetExceeded when
+# QUERY_BUDGET_RAISE is set, which it is under manage.py test.
+QUERY_BUDGETS = {
+    'home': 12,
+    'marketplace': 10,
+    'vendor_detail': 10,
+    'search': 10,
+    'cart': 8,
+    'checkout': 10,
+    'cart_batch': 12,
+    'customer_my_orders': 10,
+    'vendor_my_orders': 10,
+}
+QUERY_BUDGET_RAISE = config('QUERY_BUDGET_RAISE', default='test' in sys.argv[1:2], cast=bool)
+# Server-Timing response header with the query count, DB time and template time
+SERVER_TIMING = config('SERVER_TIMING', default=True, cast=bool)
+
 ROOT_URLCONF = 'takeawaysite.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # the Django backend, timing every render for the instrumentation middleware
+        'BACKEND': 'takeawaysite.instrumentation.InstrumentedDjangoTemplates',
         'DIRS': ['templates'],
         'APP_DIRS': True,
         'OPTIONS': {
+            # get_vendor, get_user_profile and the cart processors return lazy values
+            # (see takeawaysite/lazy_context.py) - the database is only queried when a template uses them.
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -80,6 +105,11 @@ TEMPLATES = [
                 'accounts.context_processors.get_user_profile',
                 'accounts.context_processors.get_paypal_client_id',
             ],
+            # takeawaysite is not an installed app, so its template tags are registered here
+            'libraries': {
+                'images': 'takeawaysite.templatetags.images',
+                'bundles': 'takeawaysite.templatetags.bundles',
+            },
         },
     },
 ]
@@ -101,6 +131,25 @@ DATABASES = {
     }
 }
 
+# Read replicas of the default database, as a comma separated list of hosts. The
+# read-heavy views read from them, see takeawaysite.db_router.
+DATABASE_REPLICAS = []
+for number, host in enumerate(config('DB_REPLICA_HOSTS', default='', cast=Csv()), start=1):
+    alias = f'replica{number}'
+    DATABASES[alias] = {**DATABASES['default'], 'HOST': host, 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(alias)
+if 'test' in sys.argv[1:2]:
+    # The test cases write inside transactions the replica connections do not see, so
+    # the views read from the primary under manage.py test. replica1 mirrors the test
+    # database for the router tests, which enable it with override_settings().
+    DATABASES.setdefault('replica1', {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}})
+    DATABASE_REPLICAS = []
+
+DATABASE_ROUTERS = ['takeawaysite.db_router.ReplicaRouter']
+
+# How long the reads of a user stay on the primary after they wrote (replication lag)
+READ_AFTER_WRITE_SECONDS = config('READ_AFTER_WRITE_SECONDS', default=5, cast=int)
+
 AUTH_USER_MODEL = 'accounts.User'
 
 # Password validation
@@ -143,10 +192,65 @@ STATICFILES_DIRS = [
     'takeawaysite/static'
     ]
 
+# collectstatic bundles the files below, stores everything under content-hashed names
+# and writes .gz/.br siblings (see takeawaysite/storage.py). Serve STATIC_ROOT with
+# "Cache-Control: public, max-age=31536000, immutable" and the precompressed siblings
+# (nginx gzip_static/brotli_static). With DEBUG on, {% bundle %} loads the sources one by one.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'takeawaysite.storage.BundledManifestStaticFilesStorage',
+    },
+}
+# bundle name -> source files, in load order. Style sheets are bundled within their
+# directory, so their relative url()s keep working.
+STATIC_BUNDLES = {
+    'css/theme.css': [
+        'css/iconmoon.css',
+        'css/style.css',
+        'css/cs-foodbakery-plugin.css',
+    ],
+    'css/site.css': [
+        'css/bootstrap-slider.css',
+        'css/custom.css',
+    ],
+    'js/head.js': [
+        'js/modernizr.js',
+        'js/bootstrap.js',
+        'js/custom.js',
+    ],
+    'js/footer.js': [
+        'js/scripts.js',
+        'js/functions.js',
+    ],
+}
+
 # Media files configuration
+# The resized copies of the uploaded images are built by
+# 'python manage.py build_image_derivatives --loop' (see takeawaysite/images.py).
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR /'media'
 
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        # request metrics (takeawaysite.instrumentation) and the static bundle report
+        'takeawaysite': {
+            'handlers': ['console'],
+            'level': config('LOG_LEVEL', default='INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -158,6 +262,9 @@ MESSAGE_TAGS = {
 }
 
 # Email configuration
+# Emails are queued in the outbox (accounts.OutgoingEmail) and delivered by
+# 'python manage.py send_queued_emails --loop'. Use the locmem or console backend locally.
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
 # for gmail smtp.gmail.com ; for abv is smtp.abv.bg
 # for gmail is 587, for abv is 465
 EMAIL_HOST = config('EMAIL_HOST')
@@ -72,48 +72,152 @@ function onPlaceChanged (){
 }
 
 $(document).ready(function(){
-    // add to cart
-    // at the moment I click on the add_to_cart button it will take the respective food_id and the url
-    // will send the GET request to this particular url using ajax
-    // This is a jQuery selector that binds to all elements with the .add_to_cart class. When one of these items is clicked, the following function is executed:
-    $('.add_to_cart').on('click', function(e){
-        // This line prevents standard browser behavior, which typically involves reloading the page after submitting a form or performing navigation.
-        e.preventDefault();
+    // CART BATCHING
+    // The +/- clicks are not sent one by one. They are collected for a short debounce window
+    // and sent together to the cart batch endpoint, which applies them in one transaction and
+    // returns only what changed: the quantities of the affected items, the counter and the totals.
+    var CART_BATCH_URL = '/marketplace/cart/batch/';
+    var CART_BATCH_DELAY = 300; // milliseconds without a click before the batch is sent
+    var pendingCartDeltas = {}; // food_id -> change of the quantity that has not been sent yet
+    var cartItemIds = {}; // food_id -> cart item id, used on the cart page to remove emptied items
+    var cartBatchTimer = null;
+    var cartBatchInFlight = false;
+
+    // Read the CSRF token from the cookie, the cart buttons are not inside a form
+    function getCookie(name){
+        var cookies = document.cookie ? document.cookie.split('; ') : [];
+        for(var i = 0; i < cookies.length; i++){
+            var parts = cookies[i].split('=');
+            if(parts[0] == name){
+                return decodeURIComponent(parts.slice(1).join('='));
+            }
+        }
+        return null;
+    }
 
-        // These two lines retrieve the food_id and url data from the data-id and data-url attributes of the element to which the clicked function is bound.
-        food_id = $(this).attr('data-id');
-        url = $(this).attr('data-url');
-        
-        // This is jQuery's way of sending an AJAX request. The object passed as an argument sets the query parameters.
+    function queueCartChange(food_id, delta){
+        pendingCartDeltas[food_id] = (pendingCartDeltas[food_id] || 0) + delta;
+
+        // show the new quantity right away, the response brings the confirmed numbers
+        var qty = Math.max(0, (parseInt($('#qty-'+food_id).html()) || 0) + delta);
+        $('#qty-'+food_id).html(qty);
+
+        clearTimeout(cartBatchTimer);
+        cartBatchTimer = setTimeout(sendCartBatch, CART_BATCH_DELAY);
+    }
+
+    function takeCartOps(){
+        var ops = [];
+        for(food_id in pendingCartDeltas){
+            if(pendingCartDeltas[food_id] != 0){
+                ops.push({'food_id': parseInt(food_id), 'delta': pendingCartDeltas[food_id]});
+            }
+        }
+        pendingCartDeltas = {};
+        return ops;
+    }
+
+    function postCartOps(ops, success, error){
         $.ajax({
-            // The request type is GET, which means a request is sent to the server to get information.
-            type: 'GET',
-            url: url,
-            // The function that will be executed when the request is successful. The response parameter contains the data returned by the server.
-            success: function(response){
-                // The status of the response is checked: if response.status is 'login_required', then an information message is displayed and the user is redirected to the login page.
-                if(response.status == 'login_required'){
-                    swal(response.message, '', 'info').then(function(){
-                        window.location = '/login';
-                    })
-                }else if(response.status == 'Failed'){
-                    swal(response.message, '', 'error')
-                }
-                else{
-                    // If the operation is successful, the HTML elements with the IDs #cart_counter and #qty-<food_id> are updated with the information from the response, which includes the number of items in the cart and the number of the item added.
-                    $('#cart_counter').html(response.cart_counter['cart_count']);
-                    $('#qty-'+food_id).html(response.qty);
+            type: 'POST',
+            url: CART_BATCH_URL,
+            contentType: 'application/json',
+            data: JSON.stringify({'ops': ops}),
+            headers: {'X-CSRFToken': getCookie('csrftoken'), 'X-Requested-With': 'XMLHttpRequest'},
+            success: success,
+            error: error,
+        })
+    }
 
-                    // subtotal, tax and grand total
-                    // The last line calls the applyCartAmounts function, which updates the total price information for the products in the cart, including subtotal, tax, and total.
-                    applyCartAmounts(
-                        response.cart_amount['subtotal'],
-                        response.cart_amount['tax_dict'],
-                        response.cart_amount['grand_total']
-                    )
-                }
+    function applyCartLines(response){
+        $('#cart_counter').html(response.cart_counter['cart_count']);
+
+        for(food_id in response.lines){
+            // clicks made while the batch was on its way are still shown on top of the confirmed quantity
+            var qty = response.lines[food_id] + (pendingCartDeltas[food_id] || 0);
+            $('#qty-'+food_id).html(Math.max(0, qty));
+
+            if(window.location.pathname == '/cart/' && food_id in cartItemIds){
+                removeCartItem(qty, cartItemIds[food_id]);
             }
+        }
+        if(window.location.pathname == '/cart/'){
+            checkEmptyCart();
+        }
+
+        applyCartAmounts(
+            response.cart_amount['subtotal'],
+            response.cart_amount['tax_dict'],
+            response.cart_amount['grand_total']
+        )
+    }
+
+    // after a failed batch the quantities shown right away are wrong: a batch of zero changes
+    // of the same items reads their quantities back from the server
+    function syncCartLines(ops){
+        var syncOps = ops.map(function(op){
+            return {'food_id': op.food_id, 'delta': 0};
+        });
+        postCartOps(syncOps, function(response){
+            if(response.status == 'Success'){
+                applyCartLines(response);
+            }
+            cartBatchInFlight = false;
+        }, function(){
+            cartBatchInFlight = false;
+        })
+    }
+
+    function sendCartBatch(){
+        // only one batch is sent at a time, so the changes reach the server in order
+        if(cartBatchInFlight){
+            cartBatchTimer = setTimeout(sendCartBatch, CART_BATCH_DELAY);
+            return;
+        }
+        var ops = takeCartOps();
+        if(ops.length == 0){
+            return;
+        }
+
+        cartBatchInFlight = true;
+        postCartOps(ops, function(response){
+            if(response.status == 'login_required'){
+                cartBatchInFlight = false;
+                swal(response.message, '', 'info').then(function(){
+                    window.location = '/login';
+                })
+            }else if(response.status == 'Failed'){
+                swal(response.message, '', 'error')
+                syncCartLines(ops);
+            }else{
+                applyCartLines(response);
+                cartBatchInFlight = false;
+            }
+        }, function(){
+            // the batch may or may not have been applied (server error, lost connection)
+            syncCartLines(ops);
         })
+    }
+
+    // send the clicks of the last debounce window when the user leaves the page (e.g. to the checkout)
+    $(window).on('pagehide', function(){
+        var ops = takeCartOps();
+        if(ops.length > 0){
+            fetch(CART_BATCH_URL, {
+                method: 'POST',
+                keepalive: true,
+                headers: {'Content-Type': 'application/json', 'X-CSRFToken': getCookie('csrftoken'), 'X-Requested-With': 'XMLHttpRequest'},
+                body: JSON.stringify({'ops': ops}),
+            });
+        }
+    })
+
+    // add to cart
+    // at the moment I click on the add_to_cart button the respective food_id is queued for the next cart batch
+    $('.add_to_cart').on('click', function(e){
+        // This line prevents standard browser behavior, which typically involves reloading the page after submitting a form or performing navigation.
+        e.preventDefault();
+        queueCartChange($(this).attr('data-id'), 1);
     })
 
     // place the cart item quantity on load
@@ -127,38 +231,11 @@ $(document).ready(function(){
     $('.decrease_cart').on('click', function(e){
         e.preventDefault();
         food_id = $(this).attr('data-id');
-        url = $(this).attr('data-url');
-        cart_id = $(this).attr('id');
-
-        $.ajax({
-            type: 'GET',
-            url: url,
-            success: function(response){
-                if(response.status == 'login_required'){
-                    swal(response.message, '', 'info').then(function(){
-                        window.location = '/login';
-                    })
-                }
-                else if(response.status == 'Failed'){
-                    swal(response.message, '', 'error')
-                }else{
-                    $('#cart_counter').html(response.cart_counter['cart_count']);
-                    $('#qty-'+food_id).html(response.qty);
-
-                    applyCartAmounts(
-                        response.cart_amount['subtotal'],
-                        response.cart_amount['tax_dict'],
-                        response.cart_amount['grand_total']
-                    )
-
-                    if(window.location.pathname == '/cart/'){
-                        removeCartItem(response.qty, cart_id);
-                        checkEmptyCart();
-                    }
-
-                }
-            }
-        })
+        // on the cart page the button id is the id of the cart item
+        if($(this).attr('id')){
+            cartItemIds[food_id] = $(this).attr('id');
+        }
+        queueCartChange(food_id, -1);
     })
 
     // DELETE CART ITEM
@@ -303,5 +380,82 @@ $(document).ready(function(){
         })
     })
 
+    // LOAD MORE ORDERS (order history infinite scroll)
+
+    $('.order-history-more').each(function(){
+        var more = $(this);
+        var tbody = more.siblings('table').find('tbody');
+        var loading = false;
+
+        function loadMore(){
+            var cursor = more.attr('data-cursor');
+            if(loading || !cursor){
+                return;
+            }
+            loading = true;
+            $.ajax({
+                type: 'GET',
+                url: more.attr('data-url'),
+                data: {'cursor': cursor},
+                success: function(response){
+                    tbody.append(response.html);
+                    more.attr('data-cursor', response.next_cursor || '');
+                    if(!response.next_cursor){
+                        more.hide();
+                    }
+                },
+                complete: function(){
+                    loading = false;
+                }
+            })
+        }
+
+        more.on('click', 'a', function(e){
+            e.preventDefault();
+            loadMore();
+        });
+
+        // load the next page when the end of the table scrolls into view
+        if('IntersectionObserver' in window){
+            new IntersectionObserver(function(entries){
+                if(entries[0].isIntersecting){
+                    loadMore();
+                }
+            }).observe(this);
+        }
+    })
+
+    // LIVE ORDER EVENTS (vendor dashboard and orders, see orders.feed)
+
+    $('.order-events').each(function(){
+        if(!window.EventSource){
+            return;
+        }
+        var feed = $(this);
+        var rows = $(feed.attr('data-rows'));
+        // after a reconnect the browser resumes from the Last-Event-ID header instead
+        var source = new EventSource(feed.attr('data-url') + '?last_event_id=' + feed.attr('data-last-event-id'));
+
+        source.addEventListener('order', function(e){
+            var order = JSON.parse(e.data);
+            var row = rows.find('tr[data-order-id="' + order.id + '"]');
+            if(order.kind == 'new_order' && !row.length){
+                row = $('<tr>').attr('data-order-id', order.id);
+                row.append($('<td>').append($('<b>').append($('<a>').attr('href', order.url).text(order.order_number))));
+                row.append($('<td>').text(order.name));
+                row.append($('<td>').text('BGN ' + order.total));
+                row.append($('<td class="order-status">').text(order.status));
+                row.append($('<td>').text(new Date(order.created_at).toLocaleString()));
+                row.append($('<td>').append($('<a class="btn btn-danger">').attr('href', order.url).text('Детайли')));
+                rows.prepend(row);
+                $('#orders-count').text(function(i, count){
+                    return parseInt(count) + 1;
+                });
+            }
+            row.find('.order-status').text(order.status);
+            row.find('.status-select').val(order.status);
+        });
+    })
+
     // document ready close
 });
\ No newline at end of file
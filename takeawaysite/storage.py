@@ -0,0 +1,211 @@
+"""
+Static asset build.
+
+collectstatic with BundledManifestStaticFilesStorage (the STORAGES['staticfiles']
+backend) does three things on top of the usual copy:
+
+* concatenates the files of every entry in the STATIC_BUNDLES setting into one
+  bundle, minified with rjsmin/rcssmin,
+* stores every file under a content-hashed name (css/site.3f2a1b4c5d6e.css)
+  through the ManifestStaticFilesStorage, so they can be served with immutable
+  cache headers,
+* writes .gz and .br siblings of the hashed text assets for the web server to
+  serve precompressed.
+
+rjsmin, rcssmin and brotli are in requirements.txt; collectstatic fails if one of
+them is missing. The module itself imports without them, so the {% bundle %} tag
+works in a development checkout that never collects.
+
+The size of every bundle is logged and written to STATIC_ROOT/bundle-report.json.
+Templates include the bundles with the {% bundle %} tag of
+takeawaysite.templatetags.bundles.
+"""
+import gzip
+import json
+import logging
+import posixpath
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BUILD_MODULES = {'rcssmin': rcssmin, 'rjsmin': rjsmin, 'brotli': brotli}
+
+logger = logging.getLogger(__name__)
+
+REPORT_NAME = 'bundle-report.json'
+COMPRESSED_EXTENSIONS = ('.css', '.js', '.svg')
+
+# vendored style sheets outside of STATIC_BUNDLES that reference files which were
+# never shipped (bootstrap.css is not linked, the pages load Bootstrap from a CDN)
+VENDORED_STYLE_SHEETS = ('css/bootstrap.css',)
+
+CHARSET_RE = re.compile(r'@charset\s+"[^"]*";\s*', re.IGNORECASE)
+# source maps of the vendored files are not shipped
+SOURCE_MAP_RE = re.compile(r'^\s*//# sourceMappingURL=.*$', re.MULTILINE)
+
+
+def get_bundles():
+    """
+    Returns the STATIC_BUNDLES setting: {bundle name: [source names, in order]}.
+    """
+    return getattr(settings, 'STATIC_BUNDLES', {})
+
+
+def join_css(sources):
+    """
+    Concatenates style sheets. The @charset rules are folded into one at the top,
+    where CSS requires it to be.
+    """
+    body = '\n'.join(CHARSET_RE.sub('', source) for source in sources)
+    body = rcssmin.cssmin(body, keep_bang_comments=True)
+    return '@charset "UTF-8";\n' + body
+
+
+def join_js(sources):
+    """
+    Concatenates scripts. Each one is terminated with a semicolon, so a file without
+    a trailing one cannot run into the next.
+    """
+    body = '\n;\n'.join(SOURCE_MAP_RE.sub('', source) for source in sources)
+    return rjsmin.jsmin(body, keep_bang_comments=True)
+
+
+def _gzip(data):
+    # mtime=0 keeps the output identical between builds of the same content
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+class BundledManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Manifest storage that also builds the STATIC_BUNDLES and precompresses the hashed files.
+    """
+
+    def url_converter(self, name, hashed_files, template=None):
+        converter = super().url_converter(name, hashed_files, template)
+        bundled = any(name == bundle or name in sources for bundle, sources in get_bundles().items())
+        if not bundled and name not in VENDORED_STYLE_SHEETS:
+            return converter
+
+        def lenient_converter(matchobj):
+            # the vendored theme references files that were never shipped (e.g. the
+            # prettyPhoto sprites in style.css); those keep their plain URL instead of
+            # failing the build. A missing file anywhere else still fails it.
+            try:
+                return converter(matchobj)
+            except ValueError:
+                logger.warning('%s references %s, which is not found; its URL is not hashed', name, matchobj['url'])
+                return matchobj['matched']
+
+        return lenient_converter
+
+    def build_bundle(self, name, sources):
+        """
+        Writes a bundle from the collected copies of its sources.
+
+        Args:
+            name (str): The name of the bundle, ending in .css or .js.
+            sources (list): The names of the files, in order.
+
+        Returns:
+            dict: The size of the sources and of the bundle, in bytes.
+        """
+        extension = posixpath.splitext(name)[1]
+        if extension not in ('.css', '.js'):
+            raise ImproperlyConfigured(f'STATIC_BUNDLES: {name} is neither a .css nor a .js bundle.')
+        texts = []
+        for source in sources:
+            if posixpath.splitext(source)[1] != extension:
+                raise ImproperlyConfigured(f'STATIC_BUNDLES: {source} cannot be bundled into {name}.')
+            if extension == '.css' and posixpath.dirname(source) != posixpath.dirname(name):
+                # the relative url()s of a style sheet only resolve from its own directory
+                raise ImproperlyConfigured(f'STATIC_BUNDLES: {source} must be in the directory of {name}.')
+            with self.open(source) as f:
+                texts.append(f.read().decode('utf-8'))
+
+        content = (join_css if extension == '.css' else join_js)(texts).encode('utf-8')
+        if self.exists(name):
+            self.delete(name)
+        self._save(name, ContentFile(content))
+        return {
+            'files': len(sources),
+            'source_bytes': sum(len(text.encode('utf-8')) for text in texts),
+            'bundle_bytes': len(content),
+        }
+
+    def compress(self, name):
+        """
+        Writes the .gz and .br siblings of a file, if they are smaller than the file.
+
+        Returns:
+            dict: The size of every written encoding, in bytes.
+        """
+        with self.open(name) as f:
+            data = f.read()
+        encodings = [
+            ('gzip', '.gz', _gzip),
+            ('brotli', '.br', lambda data: brotli.compress(data, quality=11)),
+        ]
+
+        sizes = {}
+        for encoding, suffix, compress in encodings:
+            compressed = compress(data)
+            if len(compressed) >= len(data):
+                continue
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self._save(name + suffix, ContentFile(compressed))
+            sizes[f'{encoding}_bytes'] = len(compressed)
+        return sizes
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            yield from super().post_process(paths, dry_run, **options)
+            return
+
+        missing = [module for module, imported in BUILD_MODULES.items() if imported is None]
+        if missing:
+            raise ImproperlyConfigured(
+                f'collectstatic needs {", ".join(missing)} to minify and compress the static files '
+                '(pip install -r requirements.txt).'
+            )
+
+        report = {}
+        for name, sources in get_bundles().items():
+            report[name] = self.build_bundle(name, sources)
+            paths[name] = (self, name)
+
+        yield from super().post_process(paths, dry_run, **options)
+
+        compressed = {
+            name: self.compress(name)
+            for name in sorted(set(self.hashed_files.values()))
+            if name.endswith(COMPRESSED_EXTENSIONS) and self.exists(name)
+        }
+
+        for name, sizes in report.items():
+            sizes['hashed_name'] = self.hashed_files.get(self.hash_key(name), name)
+            sizes.update(compressed.get(sizes['hashed_name'], {}))
+            logger.info(
+                'Bundle %s: %d files, %d bytes -> %d bytes (gzip %s, brotli %s)',
+                name, sizes['files'], sizes['source_bytes'], sizes['bundle_bytes'],
+                sizes.get('gzip_bytes', '-'), sizes.get('brotli_bytes', '-'),
+            )
+        if self.exists(REPORT_NAME):
+            self.delete(REPORT_NAME)
+        self._save(REPORT_NAME, ContentFile(json.dumps(report, indent=2).encode('utf-8')))
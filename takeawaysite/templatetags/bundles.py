@@ -0,0 +1,41 @@
+"""
+Template tag for the static bundles (see takeawaysite.storage).
+
+    {% load bundles %}
+    {% bundle 'css/site.css' %}
+
+renders one <link>/<script> of the bundle when the bundles are built by the
+staticfiles storage, and one tag per source file otherwise (DEBUG, runserver),
+so the sources can be edited and debugged without a collectstatic.
+"""
+from django import template
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+
+from takeawaysite.storage import BundledManifestStaticFilesStorage, get_bundles
+
+register = template.Library()
+
+TAGS = {
+    '.css': '<link href="{}" rel="stylesheet">',
+    '.js': '<script src="{}"></script>',
+}
+
+
+def bundles_enabled():
+    return not settings.DEBUG and isinstance(staticfiles_storage, BundledManifestStaticFilesStorage)
+
+
+@register.simple_tag
+def bundle(name):
+    """
+    Renders the tags that load a bundle.
+
+    Args:
+        name (str): The name of the bundle in the STATIC_BUNDLES setting.
+    """
+    files = [name] if bundles_enabled() else get_bundles()[name]
+    tag = TAGS[name[name.rindex('.'):]]
+    return format_html_join('\n\t', tag, ((static(path),) for path in files))
@@ -0,0 +1,56 @@
+"""
+Template helpers for the responsive image derivatives (see takeawaysite.images).
+
+    {% load images %}
+    {% responsive_image food.image food.image_derivatives 125 alt=food.food_title class="img-list" %}
+    <div style="background: url({% image_url profile.cover_photo profile.cover_photo_derivatives 1280 %})">
+"""
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from takeawaysite import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(field_file, derivatives, width, alt='', **attrs):
+    """
+    Renders a <picture> with WebP and JPEG sources sized for an image shown at the given width.
+
+    Images without derivatives of their current file (not built yet, or not a
+    readable image) fall back to a plain <img> of the original.
+
+    Args:
+        field_file (FieldFile): The image field.
+        derivatives (dict): The derivatives of the image.
+        width (int): The displayed width in CSS pixels, used for the sizes attribute.
+        alt (str): The alternative text.
+        **attrs: Additional attributes of the <img> (class, height, ...).
+    """
+    if not field_file:
+        return ''
+    storage = field_file.storage
+    derivatives = images.current_derivatives(field_file, derivatives)
+    fallback = images.pick(derivatives, 'jpeg', int(width) * 2)
+    if fallback is None:
+        return format_html('<img src="{}" alt="{}"{}>', field_file.url, alt, flatatt(attrs))
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}px"><img src="{}" srcset="{}" sizes="{}px" alt="{}" loading="lazy"{}></picture>',
+        images.srcset(derivatives, 'webp', storage), width,
+        storage.url(fallback), images.srcset(derivatives, 'jpeg', storage), width,
+        alt, flatatt(attrs),
+    )
+
+
+@register.simple_tag
+def image_url(field_file, derivatives, width):
+    """
+    Returns the URL of the smallest JPEG derivative at least this wide, e.g. for CSS backgrounds.
+    Images without derivatives of their current file return the URL of the original.
+    """
+    if not field_file:
+        return ''
+    name = images.pick(images.current_derivatives(field_file, derivatives), 'jpeg', int(width))
+    return field_file.storage.url(name) if name else field_file.url
@@ -0,0 +1,124 @@
+"""
+Helpers creating the users, vendors and menus of the test cases.
+"""
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils.text import slugify
+
+from accounts.models import User
+from marketplace.models import Cart
+from menu.models import Category, FoodItem
+from orders.models import Order
+from vendor.models import Vendor
+
+PASSWORD = 'Secret#123'
+
+
+def create_user(username, role=User.CUSTOMER, **fields):
+    """
+    Creates an active user with its profile.
+
+    Args:
+        username (str): The username, also used for the email address and the names.
+        role (int): User.CUSTOMER or User.VENDOR.
+        **fields: Other fields of the user.
+
+    Returns:
+        User: The user.
+    """
+    user = User.objects.create_user(
+        first_name=username.title(), last_name='Test', username=username,
+        email=f'{username}@example.com', password=PASSWORD,
+    )
+    user.role = role
+    user.is_active = True
+    for name, value in fields.items():
+        setattr(user, name, value)
+    user.save()
+    return user
+
+
+def create_vendor(username, latitude='42.6977', longitude='23.3219', is_approved=True):
+    """
+    Creates a vendor, its user and its profile at the given location.
+
+    Returns:
+        Vendor: The vendor.
+    """
+    user = create_user(username, role=User.VENDOR)
+    profile = user.userprofile
+    profile.address = f'1 {username.title()} Street'
+    profile.city = 'Sofia'
+    profile.latitude = latitude
+    profile.longitude = longitude
+    profile.save()
+    return Vendor.objects.create(
+        user=user, user_profile=profile, vendor_name=username.title(),
+        vendor_slug=slugify(username), vendor_license='vendor/license/license.jpg',
+        is_approved=is_approved,
+    )
+
+
+def create_food(vendor, food_title, price, category_name='Main'):
+    """
+    Creates a food item of a vendor, and its category if needed.
+
+    Returns:
+        FoodItem: The food item.
+    """
+    category, _ = Category.objects.get_or_create(
+        vendor=vendor, category_name=category_name,
+        defaults={'slug': slugify(f'{vendor.vendor_slug}-{category_name}')},
+    )
+    return FoodItem.objects.create(
+        vendor=vendor, category=category, food_title=food_title,
+        slug=slugify(food_title), price=price, image='foodimages/food.jpg',
+    )
+
+
+def place_paid_order(client, customer, items, transaction_id='PAYID-TEST'):
+    """
+    Orders food items the way the checkout page does: fills the customer's cart,
+    posts the order form to place_order and the PayPal result to payments.
+
+    Args:
+        client (Client): A test client logged in as the customer.
+        customer (User): The customer.
+        items (list): (FoodItem, quantity) pairs.
+        transaction_id (str): The transaction id of the payment.
+
+    Returns:
+        Order: The paid order.
+    """
+    for fooditem, quantity in items:
+        Cart.objects.create(user=customer, fooditem=fooditem, quantity=quantity)
+    client.post(reverse('place_order'), {
+        'first_name': customer.first_name, 'last_name': customer.last_name, 'phone': '0888123456',
+        'email': customer.email, 'address': '1 Test Street', 'country': 'Bulgaria', 'city': 'Sofia',
+        'pin_code': '1000', 'payment_method': 'PayPal',
+    })
+    order = Order.objects.filter(user=customer, is_ordered=False).latest('id')
+    client.post(reverse('payments'), {
+        'order_number': order.order_number, 'transaction_id': transaction_id,
+        'payment_method': 'PayPal', 'status': 'COMPLETED',
+    }, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+    order.refresh_from_db()
+    return order
+
+
+@override_settings(QUERY_BUDGET_RAISE=True)
+class QueryBudgetTestCase(TestCase):
+    """
+    Test case of the views with a query budget (settings.QUERY_BUDGETS). The
+    instrumentation middleware raises QueryBudgetExceeded through the test client
+    when a request runs more queries than the budget of its view.
+    """
+
+    def assertWithinBudget(self, response, view_name):
+        """
+        Asserts that the response is a page of the view, so its budget was checked.
+        """
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.resolver_match.view_name, view_name)
+        self.assertIn(view_name, settings.QUERY_BUDGETS)
@@ -0,0 +1,129 @@
+from django.db import connections, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from vendor.models import Vendor
+from .db_router import READ_AFTER_WRITE_COOKIE, ReplicaPinningMiddleware, ReplicaRouter, use_primary, use_replica
+from .lazy_context import (
+    UNRESOLVED, evaluated_context, lazy_context, lazy_context_report, reset_lazy_context_report,
+)
+from .testing import create_user, create_vendor
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRouterTests(TransactionTestCase):
+    """
+    A TransactionTestCase, since reads inside the transaction of a TestCase always go to the primary.
+    """
+    databases = {'default', 'replica1'}
+
+    def routed_request(self, write=False, **cookies):
+        """
+        Runs a request through ReplicaPinningMiddleware whose view reads inside use_replica(),
+        optionally after a write.
+
+        Returns:
+            tuple: The response and the databases of the reads before and after the write.
+        """
+        reads = []
+
+        def view(request):
+            with use_replica():
+                reads.append(Vendor.objects.all().db)
+                if write:
+                    create_user('maria')
+                reads.append(Vendor.objects.all().db)
+            return HttpResponse()
+
+        request = RequestFactory().get('/')
+        request.COOKIES.update(cookies)
+        return ReplicaPinningMiddleware(view)(request), reads
+
+    def test_reads_inside_use_replica_go_to_the_replica(self):
+        with use_replica():
+            self.assertEqual(Vendor.objects.all().db, 'replica1')
+            with use_primary():
+                self.assertEqual(Vendor.objects.all().db, 'default')
+        self.assertEqual(Vendor.objects.all().db, 'default')
+
+    def test_a_replica_view_queries_the_replica(self):
+        create_vendor('pizzeria')
+
+        with CaptureQueriesContext(connections['replica1']) as replica_queries:
+            response = self.client.get(reverse('marketplace'))
+
+        self.assertContains(response, 'Pizzeria')
+        self.assertTrue(replica_queries.captured_queries)
+
+    def test_reads_inside_a_transaction_go_to_the_primary(self):
+        with use_replica(), transaction.atomic():
+            self.assertEqual(Vendor.objects.all().db, 'default')
+
+    def test_a_write_pins_the_rest_of_the_request_and_sets_the_cookie(self):
+        response, reads = self.routed_request(write=True)
+
+        self.assertEqual(reads, ['replica1', 'default'])
+        self.assertIn(READ_AFTER_WRITE_COOKIE, response.cookies)
+
+    def test_the_cookie_pins_the_reads(self):
+        _, reads = self.routed_request(**{READ_AFTER_WRITE_COOKIE: '1'})
+
+        self.assertEqual(reads, ['default', 'default'])
+
+    def test_no_cookie_without_a_write(self):
+        response, reads = self.routed_request()
+
+        self.assertEqual(reads, ['replica1', 'replica1'])
+        self.assertNotIn(READ_AFTER_WRITE_COOKIE, response.cookies)
+
+    def test_no_migrations_on_the_replicas(self):
+        router = ReplicaRouter()
+        self.assertIs(router.allow_migrate('replica1', 'vendor', 'vendor'), False)
+        self.assertIsNone(router.allow_migrate('default', 'vendor', 'vendor'))
+
+
+class LazyContextTests(SimpleTestCase):
+
+    def test_a_value_is_computed_once_when_first_used(self):
+        request = RequestFactory().get('/')
+        calls = []
+
+        def count():
+            calls.append(1)
+            return 3
+
+        first = lazy_context(request, 'cart_count', count)
+        second = lazy_context(request, 'cart_count', count)
+        self.assertEqual(calls, [])
+        self.assertEqual(evaluated_context(request), [])
+
+        self.assertEqual(f'{first:d} {second + 1}', '3 4')
+        self.assertEqual(calls, [1])
+        self.assertEqual(evaluated_context(request), ['cart_count'])
+
+
+class LazyContextReportTests(TestCase):
+
+    def setUp(self):
+        reset_lazy_context_report()
+        self.addCleanup(reset_lazy_context_report)
+        self.client.force_login(create_user('maria'))
+
+    def test_a_page_evaluates_only_the_globals_its_templates_use(self):
+        response = self.client.get(reverse('home'))
+
+        evaluated = evaluated_context(response.wsgi_request)
+        self.assertIn('cart_count', evaluated)
+        self.assertNotIn('subtotal', evaluated)
+        self.assertNotIn('tax_dict', evaluated)
+        self.assertEqual(lazy_context_report()['home']['requests'], 1)
+
+    def test_unresolved_paths_share_one_report_entry(self):
+        for path in ('/no/such/page/', '/wp-admin/setup-config.php/x/'):
+            self.assertEqual(self.client.get(path).status_code, 404)
+
+        report = lazy_context_report()
+        self.assertEqual(report[UNRESOLVED]['requests'], 2)
+        self.assertEqual(list(report), [UNRESOLVED])
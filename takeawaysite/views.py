@@ -1,10 +1,9 @@
 from django.http import HttpResponse
 from django.shortcuts import render
-from django.contrib.gis.geos import GEOSGeometry
-from django.contrib.gis.measure import D  # ``D`` is a shortcut for ``Distance``
-from django.contrib.gis.db.models.functions import Distance
 
-from vendor.models import Vendor
+from marketplace.nearby import HOME_VENDORS, listed_vendors, nearby_vendors
+from vendor.schedule import annotate_is_open
+from .db_router import use_replica
 
 def get_or_set_current_location(request):
     if 'lat' in request.session:
@@ -20,16 +19,20 @@ def get_or_set_current_location(request):
     else:
         return None
 
+@use_replica
 def home(request):
-    if get_or_set_current_location(request) is not None:
+    location = get_or_set_current_location(request)
+    if location is not None:
+        try:
+            lng, lat = float(location[0]), float(location[1])
+        except (TypeError, ValueError):
+            location = None
 
-        pnt = GEOSGeometry('POINT(%s %s)' % (get_or_set_current_location(request)))
-        vendors = Vendor.objects.filter(user_profile__location__distance_lte=(pnt, D(km=1000))).annotate(distance=Distance("user_profile__location", pnt)).order_by("distance")
-
-        for v in vendors:
-            v.kms = round(v.distance.km, 1)
+    if location is not None:
+        # the nearest vendors come from the cached candidates of the visitor's grid cell
+        vendors = nearby_vendors(lng, lat)
     else:
-        vendors = Vendor.objects.filter(is_approved=True, user__is_active=True)[:8]
+        vendors = annotate_is_open(listed_vendors().select_related('user_profile')[:HOME_VENDORS])
     context = {
         'vendors': vendors,
     }